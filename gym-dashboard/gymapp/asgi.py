@@ -2,6 +2,8 @@
 ASGI config for gymapp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the site through it (e.g. ``uvicorn gymapp.asgi:application``) for the
+plan_job_events stream; under WSGI the dashboard polls plan_job_status instead.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
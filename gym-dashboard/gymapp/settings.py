@@ -19,6 +19,47 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 
+# LLM client used for plan generation (main/llm.py).
+# 'openai' (needs OPENAI_API_KEY) or 'local' (deterministic, offline — for load tests/benchmarks)
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'openai')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4o-mini')
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', 5))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', 60))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 20))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_LOCAL_LATENCY = float(os.getenv('LLM_LOCAL_LATENCY', 0))
+# Circuit breaker: after this many consecutive provider failures, skip the LLM
+# and serve the fallback plan; probe again after the reset timeout (seconds).
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+LLM_BREAKER_RESET_TIMEOUT = int(os.getenv('LLM_BREAKER_RESET_TIMEOUT', 30))
+# Cache holding the breaker state. With a local-memory cache every process keeps
+# its own breaker (ops/llm-status/ says so); use a shared one to trip them together.
+LLM_BREAKER_CACHE_ALIAS = os.getenv('LLM_BREAKER_CACHE_ALIAS', 'default')
+# Provider limits across all web and worker processes (0 = unlimited). The
+# buckets live in this cache, so it must be a shared one for the limits to hold.
+LLM_RPM = int(os.getenv('LLM_RPM', 0))
+LLM_TPM = int(os.getenv('LLM_TPM', 0))
+LLM_RATE_LIMIT_CACHE_ALIAS = os.getenv('LLM_RATE_LIMIT_CACHE_ALIAS', 'default')
+PLAN_MAX_TOKENS = 1200
+# 'llm' (rule-based engine only as fallback) or 'rules' (main/plan_engine.py for everyone, no LLM calls)
+PLAN_ENGINE = os.getenv('PLAN_ENGINE', 'llm')
+# Stream completions and save each day's WorkoutPlan as soon as it arrives
+PLAN_STREAMING = os.getenv('PLAN_STREAMING', '1') == '1'
+# If set, raw outputs that needed truncation repair are saved here (corpus for `manage.py bench_json_repair`)
+PLAN_REPAIR_CORPUS_DIR = os.getenv('PLAN_REPAIR_CORPUS_DIR', '')
+
+# Run queued plan jobs inline instead of on `manage.py run_plan_workers` (dev/tests only)
+PLAN_JOBS_EAGER = os.getenv('PLAN_JOBS_EAGER', '') == '1'
+# A job 'running' for longer than this (seconds) is taken to have lost its worker and is requeued
+PLAN_JOB_STALE_AFTER = int(os.getenv('PLAN_JOB_STALE_AFTER', 600))
+# Open plan_job_events streams allowed per user; past this the dashboard polls instead
+PLAN_EVENTS_MAX_STREAMS = int(os.getenv('PLAN_EVENTS_MAX_STREAMS', 3))
+
+# Render progress photo thumbnails right after upload instead of on `manage.py run_photo_workers` (dev/tests only)
+PHOTO_RENDITIONS_EAGER = os.getenv('PHOTO_RENDITIONS_EAGER', '') == '1'
+# A photo 'processing' for longer than this (seconds) is taken to have lost its worker and is requeued
+PHOTO_RENDITIONS_STALE_AFTER = int(os.getenv('PHOTO_RENDITIONS_STALE_AFTER', 300))
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -88,6 +129,52 @@ DATABASES = {
 }
 # gymapp/settings.py
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Generated plans are reused between members with equivalent profiles (main/plan_cache.py).
+# PLAN_CACHE_TTL = 0 disables the plan cache.
+PLAN_CACHE_ALIAS = 'plans'
+PLAN_CACHE_TTL = int(os.getenv('PLAN_CACHE_TTL', 60 * 60 * 24 * 7))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # locmem evicts least-recently-used entries past MAX_ENTRIES. Point this at
+    # FileBasedCache/DatabaseCache to share plans between web and worker processes.
+    'plans': {
+        'BACKEND': os.getenv('PLAN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('PLAN_CACHE_LOCATION', 'gym-plans'),
+        'TIMEOUT': PLAN_CACHE_TTL,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('PLAN_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+
+# Dashboard fragment cache (main/dashboard_cache.py); DASHBOARD_CACHE_TTL = 0 disables it
+DASHBOARD_CACHE_ALIAS = 'default'
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 60 * 60 * 24))
+
+# Largest file accepted by the progress import endpoint (main/progress_import.py)
+PROGRESS_IMPORT_MAX_BYTES = int(os.getenv('PROGRESS_IMPORT_MAX_BYTES', 100 * 1024 * 1024))
+
+# Chunked progress photo uploads (main/chunked_uploads.py). Partial files live outside MEDIA_ROOT
+# and sessions idle for PHOTO_UPLOAD_TTL_HOURS are removed by `manage.py gc_photo_uploads`.
+PHOTO_UPLOAD_DIR = os.getenv('PHOTO_UPLOAD_DIR', str(BASE_DIR / 'upload_sessions'))
+PHOTO_UPLOAD_MAX_BYTES = int(os.getenv('PHOTO_UPLOAD_MAX_BYTES', 50 * 1024 * 1024))
+PHOTO_UPLOAD_CHUNK_BYTES = int(os.getenv('PHOTO_UPLOAD_CHUNK_BYTES', 4 * 1024 * 1024))
+PHOTO_UPLOAD_TTL_HOURS = int(os.getenv('PHOTO_UPLOAD_TTL_HOURS', 24))
+
+# How photo files are sent after the access check (main/file_serving.py):
+#   'django'    stream from Python (runserver / dev)
+#   'nginx'     X-Accel-Redirect to FILE_SERVING_ACCEL_PREFIX, an `internal` location aliased to MEDIA_ROOT:
+#                   location /protected-media/ { internal; alias /srv/gym/media/; }
+#   'xsendfile' X-Sendfile with the absolute path (Apache mod_xsendfile, lighttpd)
+FILE_SERVING_BACKEND = os.getenv('FILE_SERVING_BACKEND', 'django' if DEBUG else 'nginx')
+FILE_SERVING_ACCEL_PREFIX = os.getenv('FILE_SERVING_ACCEL_PREFIX', '/protected-media/')
+
 # URL where @login_required redirects when user is not authenticated
 LOGIN_URL = '/login/'
 
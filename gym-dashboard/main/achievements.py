@@ -0,0 +1,141 @@
+# main/achievements.py
+"""
+Declarative achievement rules, evaluated against MemberStats when one of
+their events fires (main/signals.py, plan_generations.promote_generation):
+
+    progress   a Progress row was written or deleted
+    plans      a plan generation became current / a plan was deleted
+    profile    the member edited their profile (height moves the BMI)
+
+Earned badges are stored as MemberAchievement rows, so the dashboard only
+reads them. After adding or changing rules run
+`manage.py reevaluate_achievements` to apply them to existing members.
+"""
+from dataclasses import dataclass
+from typing import Callable
+
+from django.db import transaction
+
+from . import dashboard_cache
+from .models import MemberAchievement, MemberStats
+
+
+@dataclass(frozen=True)
+class Rule:
+    code: str
+    label: str
+    events: frozenset
+    test: Callable[[MemberStats], bool]
+    # badges for a state the member can leave again (e.g. a BMI range) are
+    # taken away when the test stops passing; milestones are kept for good
+    revocable: bool = False
+
+
+RULES = (
+    Rule('first_step', "First Step: Logged your progress", frozenset({'progress'}),
+         lambda s: s.entry_count >= 1),
+    Rule('consistency_7', "Consistency: 7+ progress updates", frozenset({'progress'}),
+         lambda s: s.entry_count >= 7),
+    Rule('committed_30', "Committed: 30+ progress logs", frozenset({'progress'}),
+         lambda s: s.entry_count >= 30),
+    Rule('ai_explorer', "AI Explorer: Generated workout plan", frozenset({'plans'}),
+         lambda s: s.has_plan),
+    Rule('healthy_bmi', "Healthy BMI Range", frozenset({'progress', 'profile'}),
+         lambda s: s.bmi is not None and 18.5 <= s.bmi <= 24.9, revocable=True),
+)
+RULES_BY_CODE = {rule.code: rule for rule in RULES}
+
+
+def _diff(stats, rules, held):
+    earned = [rule.code for rule in rules if rule.code not in held and rule.test(stats)]
+    revoked = [rule.code for rule in rules if rule.revocable and rule.code in held and not rule.test(stats)]
+    return earned, revoked
+
+
+def evaluate(stats, event=None):
+    """
+    Apply the rules listening to `event` (all rules if None) to one member's
+    MemberStats. Returns (earned_codes, revoked_codes).
+    """
+    rules = [rule for rule in RULES if event is None or event in rule.events]
+    if not rules:
+        return [], []
+    held = set(MemberAchievement.objects.filter(member_id=stats.member_id).values_list('code', flat=True))
+    earned, revoked = _diff(stats, rules, held)
+    if earned or revoked:
+        with transaction.atomic():
+            MemberAchievement.objects.bulk_create(
+                [MemberAchievement(member_id=stats.member_id, code=code) for code in earned],
+                ignore_conflicts=True,
+            )
+            if revoked:
+                MemberAchievement.objects.filter(member_id=stats.member_id, code__in=revoked).delete()
+        dashboard_cache.bump(stats.member_id, 'achievements')
+    return earned, revoked
+
+
+def member_event(member_id, event):
+    """
+    evaluate() for callers that don't hold the member's MemberStats.
+    """
+    stats = MemberStats.objects.filter(member_id=member_id).first()
+    if stats is None:
+        return [], []
+    return evaluate(stats, event)
+
+
+def badges_for(member_id):
+    """
+    Labels of the member's badges in the order they were earned (one indexed read).
+    """
+    codes = (MemberAchievement.objects.filter(member_id=member_id)
+             .order_by('earned_at', 'id').values_list('code', flat=True))
+    # codes of rules that have since been removed are not shown
+    return [RULES_BY_CODE[code].label for code in codes if code in RULES_BY_CODE]
+
+
+def reevaluate_achievements(member_ids=None, batch_size=500, prune=False):
+    """
+    Run every rule for all (or the given) members in batches: one read of
+    the batch's badges, one bulk insert and one delete per batch. With
+    `prune`, badges whose rule no longer exists are deleted too.
+    Returns (earned, revoked) totals.
+    """
+    stats_rows = MemberStats.objects.order_by('pk')
+    if member_ids is not None:
+        stats_rows = stats_rows.filter(pk__in=member_ids)
+    total_earned = total_revoked = 0
+    batch = []
+
+    def flush():
+        held = {}   # member_id -> {code: MemberAchievement id}
+        for pk, member_id, code in (MemberAchievement.objects.filter(member_id__in=[s.member_id for s in batch])
+                                    .values_list('id', 'member_id', 'code')):
+            held.setdefault(member_id, {})[code] = pk
+        new, gone, changed = [], [], set()
+        for stats in batch:
+            codes = held.get(stats.member_id, {})
+            earned, revoked = _diff(stats, RULES, codes)
+            if prune:
+                revoked += [code for code in codes if code not in RULES_BY_CODE]
+            new.extend(MemberAchievement(member_id=stats.member_id, code=code) for code in earned)
+            gone.extend(codes[code] for code in revoked)
+            if earned or revoked:
+                changed.add(stats.member_id)
+        with transaction.atomic():
+            MemberAchievement.objects.bulk_create(new, ignore_conflicts=True)
+            if gone:
+                MemberAchievement.objects.filter(id__in=gone).delete()
+        dashboard_cache.bump_many(changed, 'achievements')
+        return len(new), len(gone)
+
+    for stats in stats_rows.iterator(chunk_size=batch_size):
+        batch.append(stats)
+        if len(batch) >= batch_size:
+            earned, revoked = flush()
+            total_earned, total_revoked = total_earned + earned, total_revoked + revoked
+            batch = []
+    if batch:
+        earned, revoked = flush()
+        total_earned, total_revoked = total_earned + earned, total_revoked + revoked
+    return total_earned, total_revoked
@@ -1,37 +1,49 @@
 # main/admin.py
 from django.contrib import admin
+from django.contrib.admin.models import CHANGE, LogEntry
 from django.db import transaction
+from django.db.models import Count, Q
 from django.core.mail import send_mail
-from .models import MemberProfile, WorkoutPlan, DietPlan, Progress, Payment
+from django.utils import timezone
+from . import dashboard_cache
+from .models import MemberProfile, WorkoutPlan, DietPlan, Progress, Payment, PlanJob, PlanGeneration, Exercise, MemberStats, MemberAchievement, PhotoUpload, PhotoBlob
 
 
 @admin.action(description='Approve selected payments and activate member')
 def approve_payments(modeladmin, request, queryset):
-    approved = 0
     with transaction.atomic():
-        for payment in queryset.select_for_update():
-            if payment.status != 'Approved':
-                payment.status = 'Approved'
-                payment.save()  # save payment status
-                member = payment.member
-                member.is_payment_approved = True
-                member.save()   # persist profile change
-                approved += 1
-                # Optional: send email (uncomment after you configure EMAIL settings)
-                # if member.user.email:
-                #     send_mail(
-                #         subject="Payment Approved",
-                #         message="Your payment has been approved. You can now access your plan.",
-                #         from_email="noreply@example.com",
-                #         recipient_list=[member.user.email],
-                #         fail_silently=True,
-                #     )
-    modeladmin.message_user(request, f"{approved} payment(s) approved and member(s) activated.")
+        # lock the payments being approved; member/user come along for the log entries
+        pending = list(queryset.exclude(status='Approved').select_for_update(of=('self',))
+                       .select_related('member__user'))
+        Payment.objects.filter(pk__in=[p.pk for p in pending]).update(status='Approved')
+        activated = {p.member_id for p in pending if not p.member.is_payment_approved}
+        MemberProfile.objects.filter(pk__in=activated, is_payment_approved=False).update(is_payment_approved=True)
+        for payment in pending:
+            payment.status = 'Approved'
+        # one admin history entry per payment, as if each had been edited by hand
+        LogEntry.objects.log_actions(request.user.pk, pending, CHANGE,
+                                     [{'changed': {'fields': ['Status']}}])
+        # .update() skips post_save; refresh what the profile signal would have
+        dashboard_cache.bump_many(activated, 'profile')
+        # Optional: send email (uncomment after you configure EMAIL settings)
+        # for payment in pending:
+        #     if payment.member.user.email:
+        #         send_mail(
+        #             subject="Payment Approved",
+        #             message="Your payment has been approved. You can now access your plan.",
+        #             from_email="noreply@example.com",
+        #             recipient_list=[payment.member.user.email],
+        #             fail_silently=True,
+        #         )
+    modeladmin.message_user(request, f"{len(pending)} payment(s) approved and {len(activated)} member(s) activated.")
 
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('id','member','amount','status','tx_id','created_at')
     list_filter = ('status','created_at')
     search_fields = ('member__user__username','tx_id')
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member',)
+    show_full_result_count = False
     actions = [approve_payments]
 
     def save_model(self, request, obj, form, change):
@@ -49,9 +61,116 @@ class PaymentAdmin(admin.ModelAdmin):
                     # if member.user.email:
                     #     send_mail("Payment Approved", "Your payment has been approved.", "noreply@example.com", [member.user.email], fail_silently=True)
 
+@admin.action(description='Regenerate AI plans for selected approved members')
+def regenerate_plans(modeladmin, request, queryset):
+    from .plan_jobs import enqueue_batch
+    # processed concurrently by `manage.py run_plan_workers` (rate limits: settings.LLM_RPM / LLM_TPM)
+    batch = timezone.now().strftime('admin-%Y%m%d-%H%M%S')
+    counts = queryset.aggregate(selected=Count('pk'), approved=Count('pk', filter=Q(is_payment_approved=True)))
+    # the changelist's list_select_related('user') comes along with the queryset; .only() can't defer it
+    queued = enqueue_batch(batch, queryset.filter(is_payment_approved=True).select_related(None).only('id'))
+    skipped = []
+    if counts['approved'] > queued:
+        # enqueue_batch leaves members alone whose plan is already being generated
+        skipped.append(f"{counts['approved'] - queued} member(s) with a plan job already in progress")
+    if counts['selected'] > counts['approved']:
+        skipped.append(f"{counts['selected'] - counts['approved']} unapproved member(s)")
+    modeladmin.message_user(request, f"{queued} plan job(s) queued in batch {batch}"
+                                     + (f"; skipped {' and '.join(skipped)}." if skipped else "."))
+
+class MemberProfileAdmin(admin.ModelAdmin):
+    list_display = ('user','goal','experience_level','is_payment_approved')
+    list_filter = ('is_payment_approved','experience_level')
+    search_fields = ('user__username','user__email')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    show_full_result_count = False
+    actions = [regenerate_plans]
+
+class PlanJobAdmin(admin.ModelAdmin):
+    list_display = ('id','member','batch','status','created_count','tokens','attempts','created_at','finished_at')
+    list_filter = ('status','batch','created_at')
+    search_fields = ('member__user__username',)
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member','generation')
+    show_full_result_count = False
+
+class PlanGenerationAdmin(admin.ModelAdmin):
+    list_display = ('id','member','status','source','created_at','superseded_at')
+    list_filter = ('status','source')
+    search_fields = ('member__user__username',)
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member',)
+    show_full_result_count = False
+
+class ExerciseAdmin(admin.ModelAdmin):
+    list_display = ('name','muscle_group')
+    list_filter = ('muscle_group',)
+    search_fields = ('name',)
+    show_full_result_count = False
+
+class MemberStatsAdmin(admin.ModelAdmin):
+    list_display = ('member','entry_count','last_entry_date','current_streak','bmi','has_plan','updated_at')
+    search_fields = ('member__user__username',)
+    readonly_fields = ('updated_at',)
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member',)
+    show_full_result_count = False
+
+class MemberAchievementAdmin(admin.ModelAdmin):
+    list_display = ('member','code','earned_at')
+    list_filter = ('code',)
+    search_fields = ('member__user__username',)
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member',)
+    show_full_result_count = False
+
+class PhotoUploadAdmin(admin.ModelAdmin):
+    list_display = ('id','member','filename','received','size','status','updated_at')
+    list_filter = ('status',)
+    search_fields = ('member__user__username','filename')
+    readonly_fields = ('photo','created_at','updated_at')
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member',)
+    show_full_result_count = False
+
+class PhotoBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256','file','size','ref_count','created_at')
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256','file','size','ref_count','created_at')
+    show_full_result_count = False
+
+class WorkoutPlanAdmin(admin.ModelAdmin):
+    list_display = ('id','member','title','created_at')
+    search_fields = ('member__user__username','title')
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member','generation')
+    show_full_result_count = False
+
+class DietPlanAdmin(admin.ModelAdmin):
+    list_display = ('id','member','title','created_at')
+    search_fields = ('member__user__username','title')
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member','generation')
+    show_full_result_count = False
+
+class ProgressAdmin(admin.ModelAdmin):
+    list_display = ('member','date','weight_kg','body_fat_pct','updated_at')
+    search_fields = ('member__user__username',)
+    list_select_related = ('member__user',)
+    autocomplete_fields = ('member',)
+    show_full_result_count = False
+
 # register other models
-admin.site.register(MemberProfile)
-admin.site.register(WorkoutPlan)
-admin.site.register(DietPlan)
-admin.site.register(Progress)
+admin.site.register(MemberProfile, MemberProfileAdmin)
+admin.site.register(WorkoutPlan, WorkoutPlanAdmin)
+admin.site.register(DietPlan, DietPlanAdmin)
+admin.site.register(Progress, ProgressAdmin)
 admin.site.register(Payment, PaymentAdmin)
+admin.site.register(PlanJob, PlanJobAdmin)
+admin.site.register(PlanGeneration, PlanGenerationAdmin)
+admin.site.register(Exercise, ExerciseAdmin)
+admin.site.register(MemberStats, MemberStatsAdmin)
+admin.site.register(MemberAchievement, MemberAchievementAdmin)
+admin.site.register(PhotoUpload, PhotoUploadAdmin)
+admin.site.register(PhotoBlob, PhotoBlobAdmin)
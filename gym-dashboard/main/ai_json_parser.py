@@ -1,7 +1,11 @@
 # main/ai_json_parser.py
-from .models import WorkoutPlan, DietPlan
+from django.db import transaction
+from .models import WorkoutPlan, DietPlan, Exercise, PlanDay, ExerciseEntry, MealEntry
+from .plan_generations import start_generation, promote_generation
+from .exercise_catalog import normalize_exercise_name, muscle_group_for
 from datetime import datetime
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -18,67 +22,169 @@ def validate_plan_json(parsed):
         return False, "'plan' must be a list"
     return True, "ok"
 
-def save_json_plan(profile, parsed):
+def format_plan_day(item, fallback_day):
+    """
+    Turn one `plan[i]` object into (day, workout_text, diet_text).
+    """
+    # Accept either 'day' or numeric key index fallback
+    day = item.get('day') or item.get('Day') or None
+    if day is None:
+        # generate from sequence if day missing
+        day = fallback_day
+
+    workout = item.get('workout') or []
+    # Create a readable text for the workout
+    workout_text_lines = []
+    for ex in workout:
+        name = ex.get('name') or ex.get('exercise') or 'Exercise'
+        sets = ex.get('sets')
+        reps = ex.get('reps') or ex.get('repetition') or ''
+        notes = ex.get('notes') or ''
+        parts = [name]
+        if sets is not None:
+            parts.append(f"sets: {sets}")
+        if reps:
+            parts.append(f"reps: {reps}")
+        if notes:
+            parts.append(f"({notes})")
+        workout_text_lines.append(" — ".join(parts))
+    workout_text = "\n".join(workout_text_lines) if workout_text_lines else (item.get('workout','') or '')
+
+    # diet may be dict with breakfast/lunch/dinner/snacks
+    diet = item.get('diet') or {}
+    diet_text = ""
+    if isinstance(diet, dict):
+        lines = []
+        for k in ('breakfast','lunch','dinner','snacks'):
+            if k in diet and diet[k]:
+                lines.append(f"{k.capitalize()}: {diet[k]}")
+        diet_text = "\n".join(lines)
+    else:
+        diet_text = str(diet)
+
+    return day, workout_text, diet_text
+
+
+def _workout_plan(profile, generation, item, fallback_day):
+    day, workout_text, _ = format_plan_day(item, fallback_day)
+    title = f"Day {day} - AI Workout"
+    return WorkoutPlan(member=profile, generation=generation, title=title, content=workout_text)
+
+
+def _diet_summary(profile, generation, items):
+    diet_summary_lines = []
+    for index, item in enumerate(items, start=1):
+        day, _, diet_text = format_plan_day(item, index)
+        if diet_text:
+            diet_summary_lines.append(f"Day {day}:\n{diet_text}")
+    diet_content = "\n\n".join(diet_summary_lines) if diet_summary_lines else "Refer to workouts for diet."
+    return DietPlan(member=profile, generation=generation, title='AI Diet (parsed JSON)', content=diet_content)
+
+
+def _leading_int(value):
+    match = re.search(r'\d+', str(value)) if value is not None else None
+    return min(int(match.group()), 32767) if match else None
+
+
+def _workout_items(item):
+    workout = item.get('workout') or []
+    return [ex for ex in workout if isinstance(ex, dict)] if isinstance(workout, list) else []
+
+
+def _exercise_ids(items):
+    """
+    Exercise catalog id for every exercise in `items`, adding missing names to the catalog.
+    """
+    groups = {}
+    for item in items:
+        for ex in _workout_items(item):
+            name = normalize_exercise_name(ex.get('name') or ex.get('exercise'))
+            groups.setdefault(name, ex.get('muscle_group') or muscle_group_for(name))
+    if not groups:
+        return {}
+    # ignore_conflicts: names already in the catalog (or added by a concurrent save) are kept as-is
+    Exercise.objects.bulk_create([Exercise(name=name, muscle_group=group or '') for name, group in groups.items()],
+                                 ignore_conflicts=True)
+    return dict(Exercise.objects.filter(name__in=groups).values_list('name', 'id'))
+
+
+def _save_plan_days(profile, generation, items, workouts, first_day=1):
+    """
+    Store the structured form of `items` (PlanDay + ExerciseEntry + MealEntry rows)
+    next to their WorkoutPlan rows, with one bulk insert per table.
+    """
+    exercise_ids = _exercise_ids(items)
+    days = PlanDay.objects.bulk_create([
+        PlanDay(generation=generation, member=profile, workout=wp,
+                day_number=_leading_int(format_plan_day(item, index)[0]) or index)
+        for index, (item, wp) in enumerate(zip(items, workouts), start=first_day)
+    ])
+    exercises, meals = [], []
+    for plan_day, item in zip(days, items):
+        for position, ex in enumerate(_workout_items(item), start=1):
+            name = normalize_exercise_name(ex.get('name') or ex.get('exercise'))
+            exercises.append(ExerciseEntry(
+                plan_day=plan_day,
+                exercise_id=exercise_ids[name],
+                position=position,
+                sets=_leading_int(ex.get('sets')),
+                reps=str(ex.get('reps') or ex.get('repetition') or '')[:40],
+                notes=str(ex.get('notes') or '')[:255],
+            ))
+        diet = item.get('diet')
+        if isinstance(diet, dict):
+            meals.extend(
+                MealEntry(plan_day=plan_day, slot=slot, description=str(diet[slot])[:255])
+                for slot, _ in MealEntry.SLOT_CHOICES if diet.get(slot)
+            )
+    ExerciseEntry.objects.bulk_create(exercises)
+    MealEntry.objects.bulk_create(meals)
+    return days
+
+
+def save_plan_day(profile, item, fallback_day, generation):
+    """
+    Save the WorkoutPlan (and structured PlanDay) for a single `plan[i]` object
+    into a 'building' generation (used while streaming; see finish_streamed_plan).
+    """
+    with transaction.atomic():
+        wp = _workout_plan(profile, generation, item, fallback_day)
+        wp.save()
+        _save_plan_days(profile, generation, [item], [wp], first_day=fallback_day)
+    return wp
+
+
+def finish_streamed_plan(profile, generation, items):
+    """
+    Add the diet summary to a streamed generation and make it current, atomically.
+    """
+    with transaction.atomic():
+        _diet_summary(profile, generation, items).save()
+        promote_generation(generation)
+
+
+def save_json_plan(profile, parsed, source='llm'):
     """
     parsed is a dict matching the schema returned by the LLM.
-    Save WorkoutPlan entries (one per day) and one DietPlan summary.
+    Save WorkoutPlan entries (one per day), their structured PlanDay /
+    ExerciseEntry / MealEntry rows and one DietPlan summary as a new
+    PlanGeneration, in one transaction, superseding the previous generation.
     Returns list of created WorkoutPlan objects.
     """
     ok, msg = validate_plan_json(parsed)
     if not ok:
         raise ValueError(f"Invalid plan JSON: {msg}")
 
-    created = []
-    diet_summary_lines = []
-
-    for item in parsed.get('plan', []):
-        # Accept either 'day' or numeric key index fallback
-        day = item.get('day') or item.get('Day') or None
-        if day is None:
-            # generate from sequence if day missing
-            day = len(created) + 1
-
-        workout = item.get('workout') or []
-        # Create a readable text for the workout
-        workout_text_lines = []
-        for ex in workout:
-            name = ex.get('name') or ex.get('exercise') or 'Exercise'
-            sets = ex.get('sets')
-            reps = ex.get('reps') or ex.get('repetition') or ''
-            notes = ex.get('notes') or ''
-            parts = [name]
-            if sets is not None:
-                parts.append(f"sets: {sets}")
-            if reps:
-                parts.append(f"reps: {reps}")
-            if notes:
-                parts.append(f"({notes})")
-            workout_text_lines.append(" — ".join(parts))
-        workout_text = "\n".join(workout_text_lines) if workout_text_lines else (item.get('workout','') or '')
-
-        # diet may be dict with breakfast/lunch/dinner/snacks
-        diet = item.get('diet') or {}
-        diet_text = ""
-        if isinstance(diet, dict):
-            lines = []
-            for k in ('breakfast','lunch','dinner','snacks'):
-                if k in diet and diet[k]:
-                    lines.append(f"{k.capitalize()}: {diet[k]}")
-            diet_text = "\n".join(lines)
-        else:
-            diet_text = str(diet)
-
-        # Save workout for this day
-        title = f"Day {day} - AI Workout"
-        wp = WorkoutPlan.objects.create(member=profile, title=title, content=workout_text)
-        created.append(wp)
-
-        # Append diet lines to summary
-        if diet_text:
-            diet_summary_lines.append(f"Day {day}:\n{diet_text}")
-
-    # Create a diet plan summary
-    diet_content = "\n\n".join(diet_summary_lines) if diet_summary_lines else "Refer to workouts for diet."
-    DietPlan.objects.create(member=profile, title='AI Diet (parsed JSON)', content=diet_content)
+    items = parsed.get('plan', [])
+    with transaction.atomic():
+        generation = start_generation(profile, source=source)
+        created = WorkoutPlan.objects.bulk_create([
+            _workout_plan(profile, generation, item, index)
+            for index, item in enumerate(items, start=1)
+        ])
+        _save_plan_days(profile, generation, items, created)
+        # Create a diet plan summary
+        _diet_summary(profile, generation, items).save()
+        promote_generation(generation)
 
     return created
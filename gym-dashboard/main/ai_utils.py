@@ -1,106 +1,183 @@
 # main/ai_utils.py
 from django.conf import settings
 import json
+import logging
+import os
+import uuid
+from . import llm, plan_cache
+from .json_repair import parse_plan_output, validate_day
+from .plan_engine import synthesize_plan
+from .stream_parser import PlanStreamParser
 
-def _fallback_plan(profile):
-    # Keep your existing fallback text (short)
-    goal = profile.goal or "General Fitness"
-    experience = profile.experience_level or "Beginner"
-    age = profile.age or "N/A"
-    height = f"{profile.height_cm} cm" if profile.height_cm else "N/A"
-    weight = f"{profile.weight_kg} kg" if profile.weight_kg else "N/A"
+logger = logging.getLogger(__name__)
 
-    return {
-        "type": "fallback",
-        "text": (
-            f"AI Unavailable — fallback plan generated.\n\n"
-            f"Profile — Goal: {goal}, Experience: {experience}, Age: {age}, Height: {height}, Weight: {weight}\n\n"
-            "7-day sample workout overview:\n"
-            "Day 1: Full-body (squats, push-ups, bent-over rows, planks) — 3 sets each.\n"
-            "Day 2: Cardio (30 min brisk walk or bike).\n"
-            "Day 3: Upper body (dumbbell press, rows, shoulder press) — 3 sets.\n"
-            "Day 4: Rest or light stretching.\n"
-            "Day 5: Lower body (lunges, deadlifts, calf raises) — 3 sets.\n"
-            "Day 6: HIIT 20 minutes (work/rest intervals).\n"
-            "Day 7: Mobility and active recovery.\n\n"
-            "Sample diet tips:\n"
-            "- Breakfast: Oats / eggs / fruits.\n"
-            "- Lunch: Protein + veg + complex carbs.\n"
-            "- Dinner: Lighter protein + veg.\n"
-            "- Snacks: Nuts, yogurt, fruit.\n\n"
-            "Note: This is a generic fallback — integrate OpenAI later for richer plans."
-        )
-    }
+def _fallback_plan(profile, source="fallback", error=None):
+    """
+    Structured plan from the rule-based engine (main.plan_engine), used when
+    the LLM is unavailable or its output is unusable.
+    """
+    resp = {"type": "json", "data": synthesize_plan(profile), "source": source}
+    if error:
+        resp["error"] = error
+    return resp
+
+def build_plan_messages(profile):
+    """
+    Chat messages asking for the JSON plan schema that save_json_plan consumes.
+    """
+    # JSON schema we expect — keep it simple and forgiving.
+    system_instructions = (
+        "You are a fitness coach. Output ONLY valid JSON (no explanatory text) "
+        "matching the schema described. If you cannot provide the full fields, "
+        "include them where possible but keep valid JSON.\n\n"
+        "Schema:\n"
+        "{\n"
+        '  "member": {"age": int, "height_cm": int|null, "weight_kg": number|null, "goal": string},\n'
+        '  "plan": [\n'
+        '    { "day": 1, "workout": [{"name":"Squat","sets":3,"reps":"8-12","notes":"..."}], "diet": {"breakfast":"...","lunch":"...","dinner":"...","snacks":"..."} },\n'
+        '    ... up to 7 items\n'
+        '  ]\n'
+        "}\n\n"
+        "Important: ALWAYS return a JSON object with top-level keys 'member' and 'plan'. "
+        "Do not return markdown or any surrounding text. Use simple strings and numbers."
+    )
+
+    equipment = dict(profile.EQUIPMENT_CHOICES).get(profile.equipment or 'gym', profile.equipment)
+    prompt = (
+        f"Generate a 7-day structured workout+diet plan for a user with the following profile:\n"
+        f"Age: {profile.age}\nHeight_cm: {profile.height_cm}\nWeight_kg: {profile.weight_kg}\n"
+        f"Goal: {profile.goal}\nExperience: {profile.experience_level}\nEquipment: {equipment}\n\n"
+        "Only use exercises that can be done with that equipment. "
+        "Follow the schema exactly and output valid JSON only."
+    )
+    return [
+        {"role":"system","content": system_instructions},
+        {"role":"user","content": prompt}
+    ]
+
+def _save_repair_sample(raw):
+    corpus_dir = getattr(settings, 'PLAN_REPAIR_CORPUS_DIR', '')
+    if not corpus_dir:
+        return
+    try:
+        os.makedirs(corpus_dir, exist_ok=True)
+        with open(os.path.join(corpus_dir, f"{uuid.uuid4().hex}.txt"), 'w', encoding='utf-8') as f:
+            f.write(raw)
+    except OSError:
+        logger.exception("Could not save repair sample to %s", corpus_dir)
+
+def _parse_plan_text(profile, raw, tokens):
+    """
+    Turn raw model output into the generate_plans() response dict.
+    Output cut off by max_tokens is repaired by main.json_repair: the days that
+    were complete are kept ("repaired": True, "recovered_days": [...]) instead
+    of paying for a second generation.
+    """
+    result = parse_plan_output(raw)
+    if not result.ok:
+        # If parsing fails, log the text for debugging and serve the rule-based plan
+        logger.warning("AI returned unusable JSON for member %s (%s): %.500s", profile.id, result.error, raw)
+        return dict(_fallback_plan(profile, error=f"AI returned non-JSON ({result.error})."), tokens=tokens)
+    resp = {"type":"json", "data": result.data, "tokens": tokens}
+    if result.truncated:
+        _save_repair_sample(raw)
+    if result.truncated or result.dropped_days:
+        logger.info("Recovered days %s of AI plan for member %s (dropped %s)",
+                    result.recovered_days, profile.id, result.dropped_days)
+        resp.update(repaired=True, recovered_days=result.recovered_days, dropped_days=result.dropped_days)
+    else:
+        # only complete plans are worth serving to other members
+        plan_cache.store_plan(profile, result.data)
+    return resp
 
 def generate_plans(profile):
     """
-    Attempt to get a structured JSON plan from OpenAI.
+    Attempt to get a structured JSON plan from the configured LLM backend (main.llm).
     Returns a dict:
-      - if successful: {"type":"json","data": parsed_json}
-      - if fallback: {"type":"fallback","text": "..."}
+      - if successful: {"type":"json","data": parsed_json, "tokens": N}
+      - if fallback: {"type":"json","data": rule_based_plan, "source": "fallback", "error": "..."}
+    Plans for equivalent profiles are served from main.plan_cache when available.
+    With settings.PLAN_ENGINE = 'rules' every member gets the rule-based plan.
     """
-    key = getattr(settings, 'OPENAI_API_KEY', '') or None
-    if not key:
+    if getattr(settings, 'PLAN_ENGINE', 'llm') == 'rules':
+        return _fallback_plan(profile, source="rules")
+
+    cached = plan_cache.get_plan(profile)
+    if cached is not None:
+        return {"type":"json", "data": cached, "cached": True}
+
+    client = llm.get_client()
+    if client is None:
         return _fallback_plan(profile)
+    if not llm.breaker.allow():
+        # provider has been failing; don't make the member wait for another timeout
+        return dict(_fallback_plan(profile), circuit=llm.breaker.OPEN)
 
     try:
-        import openai
-        openai.api_key = key
-
-        # JSON schema we expect — keep it simple and forgiving.
-        system_instructions = (
-            "You are a fitness coach. Output ONLY valid JSON (no explanatory text) "
-            "matching the schema described. If you cannot provide the full fields, "
-            "include them where possible but keep valid JSON.\n\n"
-            "Schema:\n"
-            "{\n"
-            '  "member": {"age": int, "height_cm": int|null, "weight_kg": number|null, "goal": string},\n'
-            '  "plan": [\n'
-            '    { "day": 1, "workout": [{"name":"Squat","sets":3,"reps":"8-12","notes":"..."}], "diet": {"breakfast":"...","lunch":"...","dinner":"...","snacks":"..."} },\n'
-            '    ... up to 7 items\n'
-            '  ]\n'
-            "}\n\n"
-            "Important: ALWAYS return a JSON object with top-level keys 'member' and 'plan'. "
-            "Do not return markdown or any surrounding text. Use simple strings and numbers."
+        completion = client.complete(
+            build_plan_messages(profile),
+            max_tokens=getattr(settings, 'PLAN_MAX_TOKENS', 1200),
+            temperature=0.2,
         )
+    except Exception as e:
+        # network/model error => fallback
+        llm.breaker.record_failure()
+        return _fallback_plan(profile, error=f"AI backend error: {e}")
+    llm.breaker.record_success()
+    return _parse_plan_text(profile, completion.text.strip(), completion.total_tokens)
 
-        prompt = (
-            f"Generate a 7-day structured workout+diet plan for a user with the following profile:\n"
-            f"Age: {profile.age}\nHeight_cm: {profile.height_cm}\nWeight_kg: {profile.weight_kg}\n"
-            f"Goal: {profile.goal}\nExperience: {profile.experience_level}\n\n"
-            "Follow the schema exactly and output valid JSON only."
-        )
+def stream_plans(profile, on_day):
+    """
+    Streaming variant of generate_plans(). on_day(item) is called with each
+    complete `plan[i]` object as soon as it closes in the token stream.
+    Returns the same dict as generate_plans() plus "streamed_days": N, the
+    number of days already handed to on_day (the caller must not save those again).
+    Days that fail main.json_repair's day schema are not handed to on_day.
+    """
+    if getattr(settings, 'PLAN_ENGINE', 'llm') == 'rules':
+        return dict(_fallback_plan(profile, source="rules"), streamed_days=0)
 
-        # Use ChatCompletion (works for both gpt-3.5/gpt-4 style). Modify model name if needed.
-        resp = openai.ChatCompletion.create(
-            model="gpt-4o-mini",  # change if unavailable
-            messages=[
-                {"role":"system","content": system_instructions},
-                {"role":"user","content": prompt}
-            ],
-            max_tokens=1200,
-            temperature=0.2,
-        )
+    cached = plan_cache.get_plan(profile)
+    if cached is not None:
+        return {"type":"json", "data": cached, "cached": True, "streamed_days": 0}
 
-        raw = resp['choices'][0]['message']['content'].strip()
+    client = llm.get_client()
+    if client is None:
+        return dict(_fallback_plan(profile), streamed_days=0)
+    if not llm.breaker.allow():
+        return dict(_fallback_plan(profile), circuit=llm.breaker.OPEN, streamed_days=0)
 
-        # Attempt to parse JSON from the response. Sometimes model returns extra whitespace/newlines.
+    parser = PlanStreamParser()
+    streamed = []
+    chunks = client.stream(
+        build_plan_messages(profile),
+        max_tokens=getattr(settings, 'PLAN_MAX_TOKENS', 1200),
+        temperature=0.2,
+    )
+    while True:
+        # only errors from the provider count against the breaker, not on_day() save errors
         try:
-            parsed = json.loads(raw)
-            return {"type":"json", "data": parsed}
-        except json.JSONDecodeError:
-            # Try to extract JSON substring (simple heuristic)
-            start = raw.find('{')
-            end = raw.rfind('}')
-            if start != -1 and end != -1 and end > start:
-                try:
-                    snippet = raw[start:end+1]
-                    parsed = json.loads(snippet)
-                    return {"type":"json", "data": parsed}
-                except Exception:
-                    pass
-            # If parsing fails, return fallback with the text for debugging
-            return {"type":"fallback", "text": f"OpenAI returned non-JSON. Raw output:\n{raw}"}
-    except Exception as e:
-        # network/model error => fallback
-        return {"type":"fallback", "text": f"OpenAI error: {str(e)}\n\n" + _fallback_plan(profile)['text']}
+            chunk = next(chunks)
+        except StopIteration:
+            llm.breaker.record_success()
+            break
+        except Exception as e:
+            llm.breaker.record_failure()
+            if not streamed:
+                # network/model error before anything arrived => fallback
+                return dict(_fallback_plan(profile, error=f"AI backend error: {e}"), streamed_days=0)
+            break
+        for item in parser.feed(chunk):
+            if validate_day(item)[0]:
+                streamed.append(item)
+                on_day(item)
+
+    raw = parser.text.strip()
+    # rough token estimate (~4 chars per token); streamed responses carry no usage block
+    resp = _parse_plan_text(profile, raw, len(raw) // 4)
+    if resp.get('source') == 'fallback' and streamed:
+        # stream cut off mid-document: keep the days that did arrive
+        resp = {"type":"json", "data": {"member": {}, "plan": streamed}, "tokens": resp.get('tokens', 0),
+                "repaired": True, "recovered_days": [item.get('day') for item in streamed]}
+    resp['streamed_days'] = len(streamed)
+    return resp
@@ -0,0 +1,214 @@
+# main/analytics.py
+"""
+Progress analytics: weekly/monthly rollups, rolling averages and a trend with
+a projected goal date, for weight and body fat.
+
+A series is loaded with one query into NumPy arrays (day ordinals + values)
+and everything after that is vectorized: grouping uses np.unique +
+ufunc.reduceat, rolling windows use cumulative sums + searchsorted, and the
+trend is a weighted least-squares fit. `manage.py bench_analytics` times it
+on 100k-point series.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+METRICS = {
+    'weight': 'weight_kg',
+    'body_fat': 'body_fat_pct',
+}
+
+# ordinal of 1970-01-01, to move between date.toordinal() and datetime64[D]
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# projections further out than this are noise, not a goal date
+MAX_PROJECTION_DAYS = 5 * 365
+
+
+def series_from_rows(rows):
+    """
+    (days, values) arrays from (date, value) pairs sorted by date; several
+    entries on the same day are averaged into one point.
+    """
+    rows = list(rows)
+    days = np.fromiter((d.toordinal() for d, _ in rows), dtype=np.int64, count=len(rows))
+    values = np.fromiter((v for _, v in rows), dtype=np.float64, count=len(rows))
+    return daily(days, values)
+
+
+def load_series(profile, metric, since=None):
+    """
+    The member's daily series for `metric` ('weight' or 'body_fat'), optionally from `since` on.
+    """
+    field = METRICS[metric]
+    entries = profile.progress.exclude(**{f'{field}__isnull': True})
+    if since is not None:
+        entries = entries.filter(date__gte=since)
+    return series_from_rows(entries.order_by('date', 'id').values_list('date', field))
+
+
+def daily(days, values):
+    if not len(days):
+        return days, values
+    unique_days, inverse, counts = np.unique(days, return_inverse=True, return_counts=True)
+    if len(unique_days) == len(days):
+        return days, values
+    return unique_days, np.bincount(inverse, weights=values) / counts
+
+
+def _period_starts(days, period):
+    """
+    Ordinal of the first day of each point's week (Monday) or month.
+    """
+    if period == 'week':
+        # date.fromordinal(1) is a Monday
+        return (days - 1) // 7 * 7 + 1
+    if period == 'month':
+        months = (days - EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]')
+        return months.astype('datetime64[D]').astype(np.int64) + EPOCH_ORDINAL
+    raise ValueError(f"unknown period {period!r}")
+
+
+def rollup(days, values, period='week'):
+    """
+    Per week/month: start date, mean, min, max, point count and change (last - first).
+    `days` must be sorted (as load_series returns them).
+    """
+    if not len(days):
+        return []
+    keys = _period_starts(days, period)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(days)] - 1
+    counts = ends - starts + 1
+    means = np.add.reduceat(values, starts) / counts
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+    changes = values[ends] - values[starts]
+    # tolist() converts whole columns at once instead of per-element numpy scalars
+    columns = zip(keys[starts].tolist(), means.round(2).tolist(), mins.round(2).tolist(),
+                  maxs.round(2).tolist(), counts.tolist(), changes.round(2).tolist())
+    return [
+        {'start': date.fromordinal(key).isoformat(), 'mean': mean, 'min': low, 'max': high,
+         'count': count, 'change': change}
+        for key, mean, low, high, count, change in columns
+    ]
+
+
+def rolling_mean(days, values, window_days=7):
+    """
+    Mean over the trailing `window_days` calendar days at each point (gaps
+    shrink the window instead of stretching it over missing days).
+    """
+    if not len(days):
+        return values
+    sums = np.r_[0.0, np.cumsum(values)]
+    lo = np.searchsorted(days, days - window_days + 1, side='left')
+    hi = np.arange(1, len(days) + 1)
+    return (sums[hi] - sums[lo]) / (hi - lo)
+
+
+def trend(days, values, lookback_days=90, halflife_days=30):
+    """
+    Least-squares line through the last `lookback_days`, with weights halving
+    every `halflife_days` into the past so recent weeks dominate.
+    Returns {"slope_per_day", "slope_per_week", "current", "r2", "points",
+    "last_date"} or None if there is too little data.
+    """
+    if len(days) < 3:
+        return None
+    recent = days >= days[-1] - lookback_days
+    x = (days[recent] - days[-1]).astype(np.float64)
+    y = values[recent]
+    if len(x) < 3 or np.ptp(x) == 0:
+        return None
+    w = 0.5 ** (-x / halflife_days) if halflife_days else np.ones_like(x)
+    # polyfit squares the weights, so pass the square root
+    slope, intercept = np.polyfit(x, y, 1, w=np.sqrt(w))
+    fitted = slope * x + intercept
+    ss_res = np.sum(w * (y - fitted) ** 2)
+    ss_tot = np.sum(w * (y - np.average(y, weights=w)) ** 2)
+    return {
+        'slope_per_day': float(slope),
+        'slope_per_week': round(float(slope) * 7, 3),
+        'current': round(float(intercept), 2),
+        'r2': round(float(1 - ss_res / ss_tot), 3) if ss_tot else 1.0,
+        'points': int(len(x)),
+        'last_date': date.fromordinal(int(days[-1])),
+    }
+
+
+def project_goal_date(fit, target):
+    """
+    Date the trend line reaches `target`: None if it moves away from it (or
+    is too flat to get there within MAX_PROJECTION_DAYS), the last entry date
+    if the target is already reached.
+    """
+    if fit is None or target is None:
+        return None
+    remaining = target - fit['current']
+    slope = fit['slope_per_day']
+    if remaining == 0:
+        return fit['last_date']
+    if slope == 0 or (remaining > 0) != (slope > 0):
+        return None
+    days_needed = remaining / slope
+    if days_needed > MAX_PROJECTION_DAYS:
+        return None
+    return fit['last_date'] + timedelta(days=int(np.ceil(days_needed)))
+
+
+def default_target(profile, metric, days, values):
+    """
+    Goal-based default target: weight at BMI 24.9 (or -8 kg) for fat loss,
+    +5 kg for muscle gain; body fat -5 points for fat loss. None otherwise.
+    """
+    if not len(values):
+        return None
+    goal = (profile.goal or '').lower()
+    losing = 'loss' in goal or 'fat' in goal
+    gaining = 'gain' in goal or 'muscle' in goal
+    if metric == 'weight':
+        if losing:
+            if profile.height_cm:
+                healthy = round(24.9 * (profile.height_cm / 100.0) ** 2, 1)
+                if healthy < values[-1]:
+                    return healthy
+            return round(float(values[0]) - 8.0, 1)
+        if gaining:
+            return round(float(values[0]) + 5.0, 1)
+    elif metric == 'body_fat' and losing:
+        return round(float(values[-1]) - 5.0, 1)
+    return None
+
+
+def summarize(profile, metric='weight', target=None, window_days=7, rolling_since_days=180):
+    """
+    Everything the analytics endpoint returns for one metric.
+    """
+    days, values = load_series(profile, metric)
+    if target is None:
+        target = default_target(profile, metric, days, values)
+    fit = trend(days, values)
+    goal_date = project_goal_date(fit, target)
+    if fit:
+        fit['last_date'] = fit['last_date'].isoformat()
+    rolling = rolling_mean(days, values, window_days)
+    tail = days >= days[-1] - rolling_since_days if len(days) else days.astype(bool)
+
+    def point(day, value):
+        return {'date': date.fromordinal(int(day)).isoformat(), 'value': round(float(value), 2)}
+
+    return {
+        'metric': metric,
+        'points': int(len(days)),
+        'first': point(days[0], values[0]) if len(days) else None,
+        'last': point(days[-1], values[-1]) if len(days) else None,
+        'weekly': rollup(days, values, 'week'),
+        'monthly': rollup(days, values, 'month'),
+        'rolling': {
+            'window_days': window_days,
+            'series': [point(d, v) for d, v in zip(days[tail], rolling[tail])],
+        },
+        'trend': fit,
+        'target': target,
+        'projected_goal_date': goal_date.isoformat() if goal_date else None,
+    }
@@ -7,3 +7,6 @@ class MainConfig(AppConfig):
     def ready(self):
         # import signals so they are registered
         import main.signals  # noqa
+        # one long-lived, pooled LLM client shared by all requests/workers
+        from . import llm
+        llm.configure()
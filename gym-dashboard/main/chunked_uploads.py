@@ -0,0 +1,246 @@
+# main/chunked_uploads.py
+"""
+Resumable progress photo uploads: init, put chunk at offset, complete.
+
+`start_upload` records the expected size and SHA-256 and creates an empty
+part file under settings.PHOTO_UPLOAD_DIR. Every chunk is copied from the
+request stream to that file in small blocks (never more than BLOCK_BYTES
+in memory) and acknowledged by moving `received` forward. Chunk writes
+to one upload are serialized (an exclusive lock on the part file plus the
+session row locked FOR UPDATE), so a retried PUT racing the original can't
+interleave with it. A client that lost its connection asks for the upload
+and carries on from `received`. `finish_upload` checks the size and the
+digest and only then saves a ProgressPhoto the usual way (form validation,
+storage, renditions). `gc_uploads` removes abandoned sessions and their
+part files.
+"""
+import hashlib
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+
+from .forms import ProgressPhotoForm
+from .models import PhotoUpload
+from .photo_renditions import photo_uploaded
+
+try:
+    import fcntl
+except ImportError:   # Windows: only the row lock serializes writers there
+    fcntl = None
+
+BLOCK_BYTES = 64 * 1024
+SHA256_HEX = re.compile(r'[0-9a-f]{64}')
+
+
+class UploadError(ValueError):
+    """A request the upload can't accept; `status` is the HTTP status to answer with."""
+    status = 400
+
+    def __init__(self, message, status=None, offset=None):
+        super().__init__(message)
+        if status is not None:
+            self.status = status
+        self.offset = offset   # set when the client should resume from somewhere else
+
+
+def part_path(upload):
+    return os.path.join(settings.PHOTO_UPLOAD_DIR, f'{upload.pk}.part')
+
+
+def start_upload(member, filename, size, sha256, caption=''):
+    """
+    Open an upload session for `size` bytes with the given hex SHA-256.
+    Raises UploadError.
+    """
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError("'size' must be an integer")
+    if size <= 0:
+        raise UploadError("'size' must be positive")
+    if size > settings.PHOTO_UPLOAD_MAX_BYTES:
+        raise UploadError(f"Photo is larger than {settings.PHOTO_UPLOAD_MAX_BYTES} bytes.", status=413)
+    sha256 = (sha256 or '').strip().lower()
+    if not SHA256_HEX.fullmatch(sha256):
+        raise UploadError("'sha256' must be the hex SHA-256 of the whole file")
+    filename = os.path.basename((filename or '').strip())[:255]
+    if not filename:
+        raise UploadError("'filename' is required")
+
+    upload = PhotoUpload.objects.create(member=member, filename=filename, size=size, sha256=sha256,
+                                        caption=(caption or '')[:200])
+    os.makedirs(settings.PHOTO_UPLOAD_DIR, exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length, chunk_sha256=None):
+    """
+    Append `length` bytes read from `stream` at `offset`, which must be the
+    acknowledged size so far. With `chunk_sha256` the chunk is checked
+    before it is acknowledged. Returns the new offset. Raises UploadError;
+    nothing is acknowledged then, and the client re-sends from `offset`.
+    """
+    if length is None:
+        raise UploadError("Content-Length is required.", status=411)
+    if length > settings.PHOTO_UPLOAD_CHUNK_BYTES:
+        raise UploadError(f"Chunks may be at most {settings.PHOTO_UPLOAD_CHUNK_BYTES} bytes.", status=413)
+
+    try:
+        part = open(part_path(upload), 'r+b')
+    except FileNotFoundError:
+        upload.refresh_from_db()
+        raise UploadError(f"Upload is {upload.status}.", status=409)
+    with part:
+        # One writer at a time from here until the acknowledgement is committed: the
+        # flock covers writers on this host (sqlite ignores FOR UPDATE), the row lock
+        # the rest. Both are released only after commit, so the next writer reads the
+        # offset this one acknowledged.
+        if fcntl is not None:
+            fcntl.flock(part.fileno(), fcntl.LOCK_EX)
+        with transaction.atomic():
+            current = PhotoUpload.objects.select_for_update().get(pk=upload.pk)
+            upload.status, upload.received = current.status, current.received
+            if current.status != PhotoUpload.STATUS_OPEN:
+                raise UploadError(f"Upload is {current.status}.", status=409)
+            if offset != current.received:
+                raise UploadError(f"Expected offset {current.received}.", status=409, offset=current.received)
+            if offset + length > current.size:
+                raise UploadError(f"Chunk goes past the announced size of {current.size} bytes.")
+
+            digest = hashlib.sha256()
+            written = 0
+            part.seek(offset)
+            part.truncate()   # drop whatever an interrupted earlier attempt left past the acknowledged bytes
+            while written < length:
+                block = stream.read(min(BLOCK_BYTES, length - written))
+                if not block:
+                    break
+                part.write(block)
+                digest.update(block)
+                written += len(block)
+            if written < length:
+                part.truncate(offset)
+                raise UploadError(f"Chunk ended after {written} of {length} bytes.", offset=offset)
+            if chunk_sha256 and digest.hexdigest() != chunk_sha256.strip().lower():
+                part.truncate(offset)
+                raise UploadError("Chunk checksum mismatch.", offset=offset)
+            part.flush()
+            os.fsync(part.fileno())
+
+            new_offset = offset + written
+            PhotoUpload.objects.filter(pk=upload.pk).update(received=new_offset, updated_at=timezone.now())
+    upload.received = new_offset
+    return new_offset
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PartFile(UploadedFile):
+    """
+    The finished part file as an upload. Like TemporaryUploadedFile it has a
+    path, so image validation reads it from disk and FileSystemStorage moves
+    it into MEDIA_ROOT instead of loading it into memory.
+    """
+    def __init__(self, path, name, size, sha256=None):
+        super().__init__(open(path, 'rb'), name=name, size=size)
+        self.path = path
+        self.sha256 = sha256   # verified digest; the photo store uses it instead of re-hashing
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def finish_upload(upload):
+    """
+    Verify the assembled file and turn it into a ProgressPhoto. Returns the
+    photo; completing an already completed upload returns the same photo.
+    Raises UploadError.
+    """
+    if upload.status == PhotoUpload.STATUS_COMPLETE and upload.photo_id:
+        return upload.photo
+    if upload.status != PhotoUpload.STATUS_OPEN:
+        raise UploadError(f"Upload is {upload.status}.", status=409)
+    if upload.received != upload.size:
+        raise UploadError(f"Only {upload.received} of {upload.size} bytes received.",
+                          status=409, offset=upload.received)
+
+    path = part_path(upload)
+    if file_sha256(path) != upload.sha256:
+        _fail(upload)
+        raise UploadError("File checksum mismatch; start a new upload.")
+
+    with PartFile(path, upload.filename, upload.size, upload.sha256) as image:
+        form = ProgressPhotoForm({'caption': upload.caption}, {'image': image})
+        if not form.is_valid():
+            _fail(upload)
+            raise UploadError(' '.join(m for errors in form.errors.values() for m in errors))
+        with transaction.atomic():
+            # claim the session so a retried complete can't save the photo twice
+            claimed = PhotoUpload.objects.filter(pk=upload.pk, status=PhotoUpload.STATUS_OPEN).update(
+                status=PhotoUpload.STATUS_COMPLETE, updated_at=timezone.now())
+            if not claimed:
+                upload.refresh_from_db()
+                if upload.photo_id:
+                    return upload.photo
+                raise UploadError(f"Upload is {upload.status}.", status=409)
+            photo = form.save(commit=False)
+            photo.member_id = upload.member_id
+            photo.save()
+            upload.status = PhotoUpload.STATUS_COMPLETE
+            upload.photo = photo
+            upload.save(update_fields=['status', 'photo', 'updated_at'])
+    photo_uploaded(photo)
+    _remove_part(path)   # already gone if the storage moved it
+    return photo
+
+
+def _fail(upload):
+    PhotoUpload.objects.filter(pk=upload.pk).update(status=PhotoUpload.STATUS_FAILED, updated_at=timezone.now())
+    upload.status = PhotoUpload.STATUS_FAILED
+    _remove_part(part_path(upload))
+
+
+def _remove_part(path):
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def gc_uploads(older_than_hours=None):
+    """
+    Delete upload sessions untouched for `older_than_hours` (default
+    settings.PHOTO_UPLOAD_TTL_HOURS) together with their part files, and part
+    files no session knows about. Returns (sessions removed, bytes freed).
+    """
+    hours = settings.PHOTO_UPLOAD_TTL_HOURS if older_than_hours is None else older_than_hours
+    cutoff = timezone.now() - timedelta(hours=hours)
+    stale = PhotoUpload.objects.filter(updated_at__lt=cutoff)
+    freed = 0
+    removed = 0
+    for upload in stale.iterator():
+        freed += _remove_part(part_path(upload))
+        removed += 1
+    stale.delete()
+
+    if os.path.isdir(settings.PHOTO_UPLOAD_DIR):
+        known = {f'{pk}.part' for pk in PhotoUpload.objects.values_list('pk', flat=True)}
+        for entry in os.scandir(settings.PHOTO_UPLOAD_DIR):
+            if (entry.name.endswith('.part') and entry.name not in known
+                    and entry.stat().st_mtime < cutoff.timestamp()):
+                freed += _remove_part(entry.path)
+    return removed, freed
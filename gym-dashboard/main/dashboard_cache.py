@@ -0,0 +1,165 @@
+# main/dashboard_cache.py
+"""
+Versioned fragment cache for the member dashboard (and progress_data).
+
+Every member has one version counter per data source, stored on their
+MemberStats row. Signals bump the counter whenever a row of that source is
+written or deleted (main/signals.py), with an UPDATE in the writer's own
+transaction. A fragment's cache key embeds the versions of the sources it is
+rendered from, so a write makes old fragments unreachable rather than
+deleting them; they age out through the TTL / LRU eviction.
+
+Because the counters live in the database, a write from any process (another
+web worker, run_plan_workers) is seen by the next render everywhere, whatever
+DASHBOARD_CACHE_ALIAS points at. A per-process cache only costs hit rate.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.template.loader import render_to_string
+
+from .models import MemberStats
+
+SOURCES = ('progress', 'plans', 'photos', 'profile', 'achievements')
+VERSION_FIELDS = {source: f'dash_{source}_version' for source in SOURCES}
+
+# section -> (partial template, sources it is rendered from)
+SECTIONS = {
+    'metrics': ('main/partials/dashboard_metrics.html', ('progress', 'profile')),
+    # bumped by main.achievements only when a badge is earned or revoked
+    'achievements': ('main/partials/dashboard_achievements.html', ('achievements',)),
+    'photos': ('main/partials/dashboard_photos.html', ('photos',)),
+    'plans': ('main/partials/dashboard_plans.html', ('plans',)),
+    'progress_data': (None, ('progress',)),
+    'analytics': (None, ('progress', 'profile')),
+}
+
+
+def _cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', 0)
+
+
+def _stats_key(section, outcome):
+    return f'dash:stats:{section}:{outcome}'
+
+
+def _count(key):
+    cache = _cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def bump(member_id, *sources):
+    """
+    Invalidate the member's fragments rendered from `sources`.
+    """
+    bump_many([member_id], *sources)
+
+
+def bump_many(member_ids, *sources):
+    """
+    bump() for several members in one UPDATE. Runs in the caller's
+    transaction, so the new versions become visible with the write itself.
+    """
+    if not _ttl() or not member_ids:
+        return
+    MemberStats.objects.filter(member_id__in=member_ids).update(
+        **{VERSION_FIELDS[source]: F(VERSION_FIELDS[source]) + 1 for source in sources})
+
+
+def versions(member_id, stats=None):
+    """
+    {source: version} for the member, read from `stats` if the caller has
+    already loaded the MemberStats row. None if the member has no row yet
+    (nothing can be cached for them then).
+    """
+    if stats is None:
+        row = (MemberStats.objects.filter(member_id=member_id)
+               .values_list(*VERSION_FIELDS.values()).first())
+        if row is None:
+            return None
+        return dict(zip(VERSION_FIELDS, row))
+    return {source: getattr(stats, field) for source, field in VERSION_FIELDS.items()}
+
+
+def fragment_key(member_id, section, member_versions, extra=''):
+    stamp = '.'.join(str(member_versions[source]) for source in SECTIONS[section][1])
+    return f'dash:frag:{section}:{member_id}:{stamp}:{extra}'
+
+
+def render_sections(request, member_id, builders, extra=None, stats=None):
+    """
+    {section: html} for each section in `builders`. Cached fragments are
+    fetched in one get_many; for the rest builders[section]() returns the
+    template context, which is rendered and cached. Pass the member's
+    MemberStats as `stats` if it is loaded already.
+    """
+    extra = extra or {}
+    ttl = _ttl()
+    member_versions = versions(member_id, stats) if ttl else None
+    if member_versions is None:
+        return {section: render_to_string(SECTIONS[section][0], build(), request=request)
+                for section, build in builders.items()}
+
+    cache = _cache()
+    keys = {section: fragment_key(member_id, section, member_versions, extra.get(section, ''))
+            for section in builders}
+    cached = cache.get_many(keys.values())
+    html, fresh = {}, {}
+    for section, key in keys.items():
+        if key in cached:
+            html[section] = cached[key]
+            _count(_stats_key(section, 'hits'))
+            continue
+        html[section] = fresh[key] = render_to_string(SECTIONS[section][0], builders[section](), request=request)
+        _count(_stats_key(section, 'misses'))
+    if fresh:
+        cache.set_many(fresh, timeout=ttl)
+    return html
+
+
+def cached_value(member_id, section, build, extra=''):
+    """
+    Non-template variant of render_sections() for one section (e.g. JSON
+    payloads); `extra` distinguishes variants such as query strings.
+    """
+    ttl = _ttl()
+    member_versions = versions(member_id) if ttl else None
+    if member_versions is None:
+        return build()
+    cache = _cache()
+    key = fragment_key(member_id, section, member_versions, hashlib.sha1(extra.encode('utf-8')).hexdigest())
+    value = cache.get(key)
+    if value is not None:
+        _count(_stats_key(section, 'hits'))
+        return value
+    _count(_stats_key(section, 'misses'))
+    value = build()
+    cache.set(key, value, timeout=ttl)
+    return value
+
+
+def dashboard_cache_stats():
+    """
+    Returns {section: {"hits": N, "misses": N, "hit_rate": float}}, as counted
+    in DASHBOARD_CACHE_ALIAS (per process for a local-memory cache).
+    """
+    keys = [_stats_key(section, outcome) for section in SECTIONS for outcome in ('hits', 'misses')]
+    values = _cache().get_many(keys)
+    stats = {}
+    for section in SECTIONS:
+        hits = values.get(_stats_key(section, 'hits'), 0)
+        misses = values.get(_stats_key(section, 'misses'), 0)
+        total = hits + misses
+        stats[section] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 3) if total else 0.0}
+    return stats
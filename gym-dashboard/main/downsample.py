@@ -0,0 +1,38 @@
+# main/downsample.py
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling (Steinarsson, 2013).
+
+    `points` is a sequence of (x, y) sorted by x. Returns the indices of the
+    points to keep, at most `threshold` of them, always including the first
+    and last. Peaks and dips survive because each bucket keeps the point that
+    spans the largest triangle with its neighbours.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # average of the next bucket is the third triangle corner
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = next_end - next_start
+        avg_x = sum(points[j][0] for j in range(next_start, next_end)) / span
+        avg_y = sum(points[j][1] for j in range(next_start, next_end)) / span
+
+        ax, ay = points[a]
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, next_start):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
@@ -0,0 +1,49 @@
+# main/exercise_catalog.py
+import re
+
+from .plan_engine import EXERCISES, MUSCLE_GROUPS
+
+# exact names the rule-based engine uses
+_ENGINE_GROUPS = {
+    name.lower(): MUSCLE_GROUPS[pattern]
+    for patterns in EXERCISES.values()
+    for pattern, names in patterns.items()
+    for name in names
+}
+
+# (keyword, muscle group) checked in order against free-form LLM names
+_KEYWORD_GROUPS = [
+    ('calf', 'calves'),
+    ('shoulder', 'shoulders'), ('overhead', 'shoulders'), ('lateral raise', 'shoulders'), ('pike', 'shoulders'),
+    ('bench', 'chest'), ('push-up', 'chest'), ('pushup', 'chest'), ('push up', 'chest'), ('chest', 'chest'),
+    ('fly', 'chest'),
+    ('pulldown', 'back'), ('pull-up', 'back'), ('pullup', 'back'), ('chin', 'back'), ('row', 'back'),
+    ('deadlift', 'hamstrings'), ('rdl', 'hamstrings'), ('hamstring', 'hamstrings'), ('good morning', 'hamstrings'),
+    ('lunge', 'glutes'), ('bridge', 'glutes'), ('hip thrust', 'glutes'), ('step-up', 'glutes'),
+    ('squat', 'quads'), ('leg press', 'quads'), ('leg extension', 'quads'),
+    ('curl', 'arms'), ('tricep', 'arms'), ('dip', 'arms'),
+    ('plank', 'core'), ('crunch', 'core'), ('sit-up', 'core'), ('dead bug', 'core'), ('mountain climber', 'core'),
+    ('twist', 'core'),
+    ('walk', 'cardio'), ('run', 'cardio'), ('jog', 'cardio'), ('bike', 'cardio'), ('cycl', 'cardio'),
+    ('cardio', 'cardio'), ('hiit', 'cardio'), ('interval', 'cardio'), ('burpee', 'cardio'), ('rope', 'cardio'),
+    ('stretch', 'mobility'), ('mobility', 'mobility'), ('yoga', 'mobility'), ('foam', 'mobility'),
+    ('press', 'chest'),
+]
+
+
+def normalize_exercise_name(name):
+    """
+    'barbell  back squat ' -> 'Barbell Back Squat' (one catalog row per exercise).
+    """
+    words = re.sub(r'\s+', ' ', (name or '').strip())[:120]
+    return ' '.join(w if w.isupper() else w[:1].upper() + w[1:] for w in words.split(' ')) or 'Exercise'
+
+
+def muscle_group_for(name):
+    lowered = (name or '').lower()
+    if lowered in _ENGINE_GROUPS:
+        return _ENGINE_GROUPS[lowered]
+    for keyword, group in _KEYWORD_GROUPS:
+        if keyword in lowered:
+            return group
+    return ''
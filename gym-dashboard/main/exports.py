@@ -0,0 +1,112 @@
+# main/exports.py
+"""
+Streaming CSV / NDJSON exports of Progress, WorkoutPlan and Payment rows.
+
+Rows are read with .iterator(chunk_size=...) and written out a batch at a
+time, so memory stays flat however big the table is. Output can be gzipped
+on the fly. Used by the export_data view and `manage.py export_data`.
+"""
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Payment, Progress, WorkoutPlan
+
+FORMATS = ('csv', 'ndjson')
+CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500   # rows rendered per yielded piece of output
+
+
+# dataset -> (model, [(column, field path)]); username is joined through member__user
+DATASETS = {
+    'progress': (Progress, [
+        ('id', 'id'), ('member_id', 'member_id'), ('username', 'member__user__username'),
+        ('date', 'date'), ('weight_kg', 'weight_kg'), ('body_fat_pct', 'body_fat_pct'),
+        ('notes', 'notes'), ('updated_at', 'updated_at'),
+    ]),
+    'plans': (WorkoutPlan, [
+        ('id', 'id'), ('member_id', 'member_id'), ('username', 'member__user__username'),
+        ('generation_id', 'generation_id'), ('title', 'title'), ('content', 'content'),
+        ('created_at', 'created_at'),
+    ]),
+    'payments': (Payment, [
+        ('id', 'id'), ('member_id', 'member_id'), ('username', 'member__user__username'),
+        ('amount', 'amount'), ('status', 'status'), ('tx_id', 'tx_id'), ('created_at', 'created_at'),
+    ]),
+}
+
+
+def export_rows(dataset, member_id=None, chunk_size=CHUNK_SIZE):
+    """
+    Yields one tuple of column values per row, in primary key order. The
+    member/user join happens in the same query (as select_related would do),
+    but rows come back as tuples: no model instances to build per row.
+    """
+    model, columns = DATASETS[dataset]
+    rows = model.objects.order_by('pk')
+    if member_id is not None:
+        rows = rows.filter(member_id=member_id)
+    return rows.values_list(*[path for _, path in columns]).iterator(chunk_size=chunk_size)
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in _batched(rows, ROWS_PER_WRITE):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def render_ndjson(columns, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for batch in _batched(rows, ROWS_PER_WRITE):
+        yield ''.join(encoder.encode(dict(zip(columns, row))) + '\n' for row in batch)
+
+
+def gzip_stream(pieces):
+    """
+    Gzip a stream of str pieces incrementally (yields bytes).
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)   # gzip container
+    for piece in pieces:
+        data = compressor.compress(piece.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(dataset, fmt='csv', member_id=None, compress=False, chunk_size=CHUNK_SIZE):
+    """
+    The export as an iterator of str pieces (bytes if `compress`).
+    Raises ValueError for an unknown dataset or format.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"unknown dataset {dataset!r}; expected one of: {', '.join(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of: {', '.join(FORMATS)}")
+    columns = [name for name, _ in DATASETS[dataset][1]]
+    render = render_csv if fmt == 'csv' else render_ndjson
+    pieces = render(columns, export_rows(dataset, member_id, chunk_size))
+    return gzip_stream(pieces) if compress else pieces
+
+
+def export_filename(dataset, fmt, compress=False, suffix=''):
+    return f"{dataset}{suffix}.{fmt}" + ('.gz' if compress else '')
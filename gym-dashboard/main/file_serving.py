@@ -0,0 +1,51 @@
+# main/file_serving.py
+"""
+Sending media files that need an access check.
+
+Views decide whether the user may have a file; send_file() decides how the
+bytes go out. With FILE_SERVING_BACKEND 'nginx' or 'xsendfile' Django
+answers with an empty response carrying X-Accel-Redirect / X-Sendfile and
+the front proxy streams the file from disk, so no worker is tied up for the
+transfer. 'django' streams it from Python, for runserver.
+"""
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import patch_cache_control
+
+BACKENDS = ('django', 'nginx', 'xsendfile')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def accel_path(name):
+    return settings.FILE_SERVING_ACCEL_PREFIX.rstrip('/') + '/' + quote(name)
+
+
+def send_file(field_file, immutable=False):
+    """
+    Response for a stored file. `immutable` marks URLs whose file never
+    changes: browsers keep them for a year without revalidating (private,
+    as the file is only for this user).
+    """
+    name, storage = field_file.name, field_file.storage
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    backend = settings.FILE_SERVING_BACKEND
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_path(name)
+    elif backend == 'xsendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = storage.path(name)
+    elif backend == 'django':
+        try:
+            response = FileResponse(storage.open(name, 'rb'), content_type=content_type)
+        except FileNotFoundError:
+            raise Http404("File not found")
+    else:
+        raise ImproperlyConfigured(f"FILE_SERVING_BACKEND must be one of: {', '.join(BACKENDS)}")
+    if immutable:
+        patch_cache_control(response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
@@ -33,7 +33,7 @@ class UserRegistrationForm(forms.ModelForm):
 class MemberProfileForm(forms.ModelForm):
     class Meta:
         model = MemberProfile
-        fields = ['phone', 'age', 'height_cm', 'weight_kg', 'gender', 'goal', 'experience_level']
+        fields = ['phone', 'age', 'height_cm', 'weight_kg', 'gender', 'goal', 'experience_level', 'equipment']
 
 
 class PaymentForm(forms.ModelForm):
@@ -0,0 +1,261 @@
+# main/json_repair.py
+"""
+Recovery of plan JSON that the model cut off mid-document (max_tokens hit).
+
+parse_plan_output() finds the JSON object in the raw output; if it does not
+parse, trailing commas (`[1, 2,]`) are dropped and, if that isn't enough,
+close_json() cuts the text back to the last complete value, closes the
+open strings/arrays/objects and reports how many `plan[i]` days had already
+closed. Only those days are kept. Every day is then checked against a
+compiled pydantic schema (stricter than ai_json_parser.validate_plan_json);
+days that fail are dropped and reported instead of failing the whole plan.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+
+
+class ExerciseSchema(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    name: str = Field(min_length=1, validation_alias=AliasChoices('name', 'exercise'))
+    sets: Union[int, str, None] = None
+    reps: Union[str, int, None] = None
+    notes: Optional[str] = None
+
+
+class PlanDaySchema(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    day: Union[int, str, None] = None
+    workout: list[ExerciseSchema]
+    diet: Union[dict[str, Optional[str]], str] = Field(default_factory=dict)
+
+
+class PlanDocumentSchema(BaseModel):
+    model_config = ConfigDict(extra='allow')
+
+    member: dict
+    plan: list  # days are validated one by one so a bad day doesn't sink the rest
+
+
+PARTIAL_UNICODE_ESCAPE_REGEX = re.compile(r'\\u[0-9a-fA-F]{0,3}$')
+
+# compiled once at import; validate_python() runs in pydantic-core
+_DOCUMENT = TypeAdapter(PlanDocumentSchema)
+_DAY = TypeAdapter(PlanDaySchema)
+
+
+@dataclass
+class RepairResult:
+    data: Optional[dict] = None
+    truncated: bool = False
+    recovered_days: list = field(default_factory=list)   # day numbers kept
+    dropped_days: list = field(default_factory=list)     # (day, reason)
+    error: str = ''
+
+    @property
+    def ok(self):
+        return self.data is not None
+
+
+def _first_error(exc):
+    err = exc.errors()[0]
+    loc = '.'.join(str(part) for part in err['loc'])
+    return f"{loc}: {err['msg']}" if loc else err['msg']
+
+
+def validate_day(item):
+    """
+    Returns (ok, reason) for one `plan[i]` object.
+    """
+    try:
+        _DAY.validate_python(item)
+    except ValidationError as e:
+        return False, _first_error(e)
+    return True, 'ok'
+
+
+def close_json(text):
+    """
+    Cut a truncated JSON document back to its last complete value and close
+    everything still open. Returns (repaired_text, complete_plan_days), where
+    complete_plan_days counts the top-level "plan" array items that closed
+    before the cut. Raises ValueError if no object was ever opened.
+    """
+    stack = []        # open containers: [kind, expecting_key, last_key]
+    safe = None       # (end index, closers) of the last point we can cut at
+    plan_depth = None
+    complete_days = 0
+    in_string = escape = string_is_key = False
+    string_start = 0
+    i, n = 0, len(text)
+
+    def closers():
+        return ''.join('}' if frame[0] == '{' else ']' for frame in reversed(stack))
+
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if string_is_key:
+                    stack[-1][1] = False
+                    stack[-1][2] = text[string_start + 1:i]
+                else:
+                    safe = (i + 1, closers())
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_start = i
+            string_is_key = bool(stack) and stack[-1][0] == '{' and stack[-1][1]
+        elif ch in '{[':
+            if ch == '[' and len(stack) == 1 and stack[0][2] == 'plan' and plan_depth is None:
+                plan_depth = 2
+            stack.append([ch, ch == '{', None])
+            safe = (i + 1, closers())
+        elif ch in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return text[:i + 1], complete_days
+            if ch == '}' and len(stack) == plan_depth:
+                complete_days += 1
+            safe = (i + 1, closers())
+        elif ch == ',':
+            if stack and stack[-1][0] == '{':
+                stack[-1][1] = True
+        elif ch == ':' or ch.isspace():
+            pass
+        else:
+            # number / true / false / null: complete only if a delimiter follows
+            j = i
+            while j < n and text[j] not in ',]}' and not text[j].isspace():
+                j += 1
+            if j < n:
+                safe = (j, closers())
+            i = j
+            continue
+        i += 1
+
+    if in_string and not string_is_key:
+        # truncated inside a value string: keep what arrived and close it
+        body = text[:-1] if escape else PARTIAL_UNICODE_ESCAPE_REGEX.sub('', text)
+        return body + '"' + closers(), complete_days
+    if safe is None:
+        raise ValueError("no JSON object found")
+    end, tail = safe
+    return text[:end] + tail, complete_days
+
+
+def strip_trailing_commas(text):
+    """
+    Drop commas that are directly followed (whitespace aside) by } or ],
+    outside strings.
+    """
+    out = []
+    comma = None      # index in `out` of a comma that may turn out to be trailing
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            comma = None
+        elif ch == ',':
+            comma = len(out)
+        elif ch in '}]':
+            if comma is not None:
+                out[comma] = ''
+                comma = None
+        elif not ch.isspace():
+            comma = None
+        out.append(ch)
+    return ''.join(out)
+
+
+def _loads(text):
+    end = text.rfind('}')
+    if end == -1:
+        return None
+    try:
+        return json.loads(text[:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+
+def _extract(raw):
+    start = raw.find('{')
+    if start == -1:
+        return None
+    return raw[start:]
+
+
+def parse_plan_output(raw):
+    """
+    Parse (and if needed repair) raw model output into a validated plan document.
+    Returns a RepairResult; result.ok is False when nothing usable was found.
+    """
+    result = RepairResult()
+    text = _extract(raw or '')
+    if text is None:
+        result.error = "no JSON object in output"
+        return result
+
+    parsed = _loads(text)
+    if parsed is None:
+        text = strip_trailing_commas(text)
+        parsed = _loads(text)
+    complete_days = None
+    if parsed is None:
+        try:
+            repaired, complete_days = close_json(text)
+            parsed = json.loads(repaired)
+        except ValueError as e:   # JSONDecodeError is a ValueError
+            result.error = f"unrepairable JSON: {e}"
+            return result
+        result.truncated = True
+
+    try:
+        document = _DOCUMENT.validate_python(parsed)
+    except ValidationError as e:
+        result.error = _first_error(e)
+        return result
+
+    days = document.plan
+    if complete_days is not None and len(days) > complete_days:
+        # the last day was still being written when the output stopped
+        result.dropped_days.append((days[complete_days].get('day') if isinstance(days[complete_days], dict)
+                                    else None, 'truncated'))
+        days = days[:complete_days]
+
+    kept = []
+    for index, item in enumerate(days, start=1):
+        ok, reason = validate_day(item)
+        day = item.get('day', index) if isinstance(item, dict) else index
+        if ok:
+            kept.append(item)
+            result.recovered_days.append(day)
+        else:
+            result.dropped_days.append((day, reason))
+    if not kept:
+        result.error = "no valid days in plan"
+        return result
+
+    result.data = dict(parsed, plan=kept)
+    return result
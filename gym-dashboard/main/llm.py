@@ -0,0 +1,252 @@
+# main/llm.py
+"""
+LLM backends used for plan generation.
+
+One long-lived client is created by MainConfig.ready() (see configure()) and
+shared by every request/worker thread, so HTTP connections are pooled and kept
+alive between generations. settings.LLM_BACKEND selects the backend:
+
+  - 'openai': OpenAI chat completions over a pooled httpx client
+  - 'local':  deterministic offline backend (same prompt -> same plan), for
+              load tests and benchmarks without network or API key
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .rate_limit import RateLimiter
+from .resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# Trips after repeated provider failures so generation goes straight to the
+# fallback plan instead of waiting on a dead provider (see main.resilience).
+breaker = CircuitBreaker('llm')
+# Provider RPM/TPM budget (settings.LLM_RPM / LLM_TPM), shared by every process
+# through the cache. Charged only right before a real provider call, so plan
+# cache hits and the rule-based/local paths don't use it up.
+limiter = RateLimiter('llm')
+
+
+@dataclass
+class Completion:
+    text: str
+    total_tokens: int = 0
+
+
+class LLMBackend:
+    name = 'base'
+
+    def complete(self, messages, max_tokens, temperature):
+        """
+        messages: list of {"role": ..., "content": ...}. Returns a Completion.
+        """
+        raise NotImplementedError
+
+    def stream(self, messages, max_tokens, temperature):
+        """
+        Yield the completion text in chunks as it is generated.
+        Backends without native streaming yield the whole completion at once.
+        """
+        yield self.complete(messages, max_tokens, temperature).text
+
+    def close(self):
+        pass
+
+
+def estimated_tokens(messages, max_tokens):
+    """
+    Tokens to reserve for a call before its real usage is known (~4 chars per prompt token).
+    """
+    return sum(len(m.get('content', '')) for m in messages) // 4 + max_tokens
+
+
+class OpenAIBackend(LLMBackend):
+    name = 'openai'
+
+    def __init__(self, api_key, model, connect_timeout, read_timeout, max_connections, max_retries):
+        import httpx
+        import openai
+
+        self.model = model
+        self._http = httpx.Client(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60,
+            ),
+        )
+        self._client = openai.OpenAI(api_key=api_key, http_client=self._http, max_retries=max_retries)
+
+    def complete(self, messages, max_tokens, temperature):
+        limiter.acquire(estimated_tokens(messages, max_tokens))
+        resp = self._client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+        )
+        usage = resp.usage
+        return Completion(
+            text=resp.choices[0].message.content or '',
+            total_tokens=usage.total_tokens if usage else 0,
+        )
+
+    def stream(self, messages, max_tokens, temperature):
+        limiter.acquire(estimated_tokens(messages, max_tokens))
+        events = self._client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+        )
+        try:
+            for event in events:
+                if event.choices and event.choices[0].delta.content:
+                    yield event.choices[0].delta.content
+        finally:
+            events.close()
+
+    def close(self):
+        self._http.close()
+
+
+class LocalBackend(LLMBackend):
+    """
+    Deterministic offline backend. Builds a schema-valid 7-day plan seeded by
+    the prompt, optionally sleeping `latency` seconds to mimic a real model.
+    """
+    name = 'local'
+
+    EXERCISES = [
+        ("Squat", "8-12"), ("Push-up", "10-15"), ("Bent-over Row", "8-12"),
+        ("Lunge", "10 each leg"), ("Deadlift", "6-8"), ("Shoulder Press", "8-12"),
+        ("Plank", "45 sec"), ("Glute Bridge", "12-15"), ("Lat Pulldown", "10-12"),
+        ("Bench Press", "6-10"), ("Burpee", "10"), ("Mountain Climber", "30 sec"),
+    ]
+    MEALS = {
+        "breakfast": ["Oats with berries", "Eggs and wholegrain toast", "Greek yogurt and fruit"],
+        "lunch": ["Chicken, rice and vegetables", "Lentil salad", "Tuna wrap with greens"],
+        "dinner": ["Salmon with potatoes", "Tofu stir-fry", "Lean beef and vegetables"],
+        "snacks": ["Nuts", "Protein shake", "Apple and peanut butter"],
+    }
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def _member(self, prompt):
+        def field(label):
+            m = re.search(rf'^{label}:\s*(.*)$', prompt, re.MULTILINE)
+            value = m.group(1).strip() if m else ''
+            return None if value in ('', 'None') else value
+
+        def number(label, cast):
+            try:
+                return cast(field(label))
+            except (TypeError, ValueError):
+                return None
+
+        return {
+            "age": number('Age', int),
+            "height_cm": number('Height_cm', int),
+            "weight_kg": number('Weight_kg', float),
+            "goal": field('Goal') or "General Fitness",
+        }
+
+    def _render(self, messages):
+        prompt = "\n".join(m.get('content', '') for m in messages)
+        seed = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        rng = random.Random(seed)
+
+        plan = []
+        for day in range(1, 8):
+            workout = [
+                {"name": name, "sets": rng.choice([3, 4]), "reps": reps, "notes": ""}
+                for name, reps in rng.sample(self.EXERCISES, 4)
+            ]
+            diet = {slot: rng.choice(options) for slot, options in self.MEALS.items()}
+            plan.append({"day": day, "workout": workout, "diet": diet})
+
+        text = json.dumps({"member": self._member(prompt), "plan": plan})
+        # rough token estimate (~4 chars per token)
+        return Completion(text=text, total_tokens=(len(prompt) + len(text)) // 4)
+
+    def complete(self, messages, max_tokens, temperature):
+        completion = self._render(messages)
+        if self.latency:
+            time.sleep(self.latency)
+        return completion
+
+    def stream(self, messages, max_tokens, temperature):
+        text = self._render(messages).text
+        # ~4-token chunks with the simulated latency spread across them
+        step = 16
+        delay = self.latency * step / max(len(text), 1)
+        for i in range(0, len(text), step):
+            if delay:
+                time.sleep(delay)
+            yield text[i:i + step]
+
+
+_client = None
+_lock = threading.Lock()
+
+
+def _build_backend():
+    backend = getattr(settings, 'LLM_BACKEND', 'openai')
+    if backend == 'local':
+        return LocalBackend(latency=getattr(settings, 'LLM_LOCAL_LATENCY', 0.0))
+    if backend == 'openai':
+        key = getattr(settings, 'OPENAI_API_KEY', '') or None
+        if not key:
+            return None
+        try:
+            return OpenAIBackend(
+                api_key=key,
+                model=getattr(settings, 'LLM_MODEL', 'gpt-4o-mini'),
+                connect_timeout=getattr(settings, 'LLM_CONNECT_TIMEOUT', 5.0),
+                read_timeout=getattr(settings, 'LLM_READ_TIMEOUT', 60.0),
+                max_connections=getattr(settings, 'LLM_MAX_CONNECTIONS', 20),
+                max_retries=getattr(settings, 'LLM_MAX_RETRIES', 2),
+            )
+        except ImportError:
+            logger.warning("openai/httpx not installed; AI plan generation will use the fallback plan.")
+            return None
+    raise ValueError(f"Unknown LLM_BACKEND: {backend!r}")
+
+
+def configure():
+    """
+    (Re)create the shared client from settings. Called once from MainConfig.ready().
+    """
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = _build_backend()
+    return _client
+
+
+def get_client():
+    """
+    Shared LLMBackend, or None when no backend is available (e.g. no API key).
+    """
+    return _client
+
+
+@receiver(setting_changed)
+def _reconfigure_on_setting_change(setting, **kwargs):
+    # keeps override_settings(LLM_BACKEND=...) working in tests
+    if setting.startswith('LLM_') or setting == 'OPENAI_API_KEY':
+        configure()
@@ -0,0 +1,42 @@
+# main/management/commands/backfill_photo_renditions.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.models import ProgressPhoto
+from main.photo_renditions import process_pending
+
+
+class Command(BaseCommand):
+    help = "Create renditions for progress photos that don't have them yet (e.g. uploaded before renditions existed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Photos per batch (default 100).')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="Also retry photos marked 'failed' or stuck in 'processing'.")
+        parser.add_argument('--regenerate', action='store_true',
+                            help='Re-render every photo, e.g. after changing sizes or quality.')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        photos = ProgressPhoto.objects.exclude(renditions_status=ProgressPhoto.RENDITIONS_PENDING)
+        if options['regenerate']:
+            photos.update(renditions_status=ProgressPhoto.RENDITIONS_PENDING)
+        elif options['retry_failed']:
+            photos.filter(renditions_status__in=[ProgressPhoto.RENDITIONS_FAILED,
+                                                 ProgressPhoto.RENDITIONS_PROCESSING]).update(
+                renditions_status=ProgressPhoto.RENDITIONS_PENDING)
+
+        rendered = failed = 0
+        while True:
+            # every processed photo leaves 'pending' (ready or failed), so this terminates
+            done, errors = process_pending(limit=max(1, options['batch_size']))
+            if not done and not errors:
+                break
+            rendered += done
+            failed += errors
+            self.stdout.write(f"  {rendered} rendered, {failed} failed so far...")
+        self.stdout.write(self.style.SUCCESS(
+            f"{rendered} photo(s) rendered, {failed} failed in {time.monotonic() - start:.1f}s."
+        ))
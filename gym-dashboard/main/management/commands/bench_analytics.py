@@ -0,0 +1,74 @@
+# main/management/commands/bench_analytics.py
+import time
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from main.analytics import rolling_mean, rollup, trend
+
+
+def _loop_weekly(days, values):
+    """
+    Per-row Python rollup, i.e. what the analytics would cost without NumPy.
+    """
+    groups = defaultdict(list)
+    for day, value in zip(days.tolist(), values.tolist()):
+        groups[(day - 1) // 7 * 7 + 1].append(value)
+    return [
+        {'start': date.fromordinal(key).isoformat(), 'mean': round(sum(v) / len(v), 2), 'min': round(min(v), 2),
+         'max': round(max(v), 2), 'count': len(v), 'change': round(v[-1] - v[0], 2)}
+        for key, v in sorted(groups.items())
+    ]
+
+
+def _loop_rolling(days, values, window_days):
+    out, lo, total = [], 0, 0.0
+    days, values = days.tolist(), values.tolist()
+    for i, day in enumerate(days):
+        total += values[i]
+        while days[lo] <= day - window_days:
+            total -= values[lo]
+            lo += 1
+        out.append(total / (i - lo + 1))
+    return out
+
+
+class Command(BaseCommand):
+    help = "Time main.analytics rollups, rolling averages and trend fit on long synthetic series."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=100_000, help='Daily points per series (default 100k).')
+        parser.add_argument('--repeat', type=int, default=5, help='Best of N runs (default 5).')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def _best(self, fn, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    def handle(self, *args, **options):
+        n, repeat = options['points'], options['repeat']
+        rng = np.random.default_rng(options['seed'])
+        # a random walk with ~10% of days skipped, starting in 1900 so 100k days fit before today
+        days = date(1900, 1, 1).toordinal() + np.flatnonzero(rng.random(int(n * 1.12)) > 0.1)[:n]
+        values = 90 + np.cumsum(rng.normal(-0.001, 0.2, len(days)))
+
+        timings = [
+            ('weekly rollup', lambda: rollup(days, values, 'week'), lambda: _loop_weekly(days, values)),
+            ('monthly rollup', lambda: rollup(days, values, 'month'), None),
+            ('7-day rolling mean', lambda: rolling_mean(days, values, 7), lambda: _loop_rolling(days, values, 7)),
+            ('90-day trend fit', lambda: trend(days, values), None),
+        ]
+        self.stdout.write(f"Series: {len(days)} points, best of {repeat}.")
+        for label, vectorized, loop in timings:
+            fast = self._best(vectorized, repeat)
+            line = f"  {label:<20} {fast * 1e3:8.2f} ms"
+            if loop:
+                slow = self._best(loop, repeat)
+                line += f"   (python loop {slow * 1e3:8.2f} ms, {slow / fast:5.1f}x)"
+            self.stdout.write(line)
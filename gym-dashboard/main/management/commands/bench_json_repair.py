@@ -0,0 +1,84 @@
+# main/management/commands/bench_json_repair.py
+import json
+import random
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from main.json_repair import parse_plan_output
+from main.plan_engine import _PLANS
+from main.stream_parser import PlanStreamParser
+
+
+def _old_heuristic(raw):
+    """
+    What ai_utils did before main.json_repair: json.loads, then the outermost {...} substring.
+    """
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        start, end = raw.find('{'), raw.rfind('}')
+        if start != -1 and end > start:
+            try:
+                return json.loads(raw[start:end + 1])
+            except json.JSONDecodeError:
+                pass
+    return None
+
+
+class Command(BaseCommand):
+    help = "Measure how many days main.json_repair recovers from truncated plan outputs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', help='Directory of raw model outputs (one per file), e.g. '
+                                             'settings.PLAN_REPAIR_CORPUS_DIR. Default: synthetic corpus.')
+        parser.add_argument('--samples', type=int, default=500,
+                            help='Synthetic samples: engine plans cut at random offsets (default 500).')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def _synthetic(self, samples, seed):
+        rng = random.Random(seed)
+        plans = list(_PLANS.values())
+        corpus = []
+        for _ in range(samples):
+            doc = {'member': {'age': 30, 'height_cm': 175, 'weight_kg': 80, 'goal': 'Fat Loss'},
+                   'plan': json.loads(rng.choice(plans))}
+            text = json.dumps(doc, indent=rng.choice((None, 2)))
+            # cut anywhere after the member block, as max_tokens would
+            corpus.append(text[:rng.randint(len(text) // 10, len(text))])
+        return corpus
+
+    def handle(self, *args, **options):
+        if options['corpus']:
+            corpus = [p.read_text(encoding='utf-8') for p in sorted(Path(options['corpus']).iterdir()) if p.is_file()]
+            label = options['corpus']
+        else:
+            corpus = self._synthetic(options['samples'], options['seed'])
+            label = 'synthetic'
+        if not corpus:
+            self.stdout.write("Corpus is empty.")
+            return
+
+        old_ok = new_ok = days_available = days_recovered = 0
+        elapsed = 0.0
+        for raw in corpus:
+            old = _old_heuristic(raw)
+            old_ok += isinstance(old, dict) and isinstance(old.get('plan'), list) and bool(old['plan'])
+            # upper bound: days whose closing brace made it into the output
+            days_available += len(PlanStreamParser().feed(raw))
+            start = time.perf_counter()
+            result = parse_plan_output(raw)
+            elapsed += time.perf_counter() - start
+            if result.ok:
+                new_ok += 1
+                days_recovered += len(result.recovered_days)
+
+        n = len(corpus)
+        self.stdout.write(f"Corpus: {label}, {n} output(s).")
+        self.stdout.write(f"  old heuristic usable: {old_ok}/{n} ({100.0 * old_ok / n:.1f}%)")
+        self.stdout.write(f"  repaired usable:      {new_ok}/{n} ({100.0 * new_ok / n:.1f}%)")
+        if days_available:
+            self.stdout.write(f"  complete days recovered: {days_recovered}/{days_available} "
+                              f"({100.0 * days_recovered / days_available:.1f}%)")
+        self.stdout.write(f"  mean parse time: {elapsed / n * 1e6:.0f} µs")
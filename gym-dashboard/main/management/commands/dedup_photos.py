@@ -0,0 +1,28 @@
+# main/management/commands/dedup_photos.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.photo_store import dedup_existing
+
+
+class Command(BaseCommand):
+    help = "Move progress photos stored before content addressing onto shared blobs and delete duplicate files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only hash the files and report what would be reclaimed.')
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help='Photos loaded per query (default 200).')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        result = dedup_existing(dry_run=options['dry_run'], batch_size=max(1, options['batch_size']))
+        if result.missing:
+            self.stdout.write(self.style.WARNING(f"{result.missing} photo(s) point at missing files; skipped."))
+        verb = "Would reclaim" if options['dry_run'] else "Reclaimed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.photos} photo(s) checked: {result.blobs_created} unique, {result.duplicates} duplicate(s). "
+            f"{verb} {result.bytes_reclaimed / (1024 * 1024):.1f} MB ({result.files_removed} file(s)) "
+            f"in {time.monotonic() - start:.1f}s."
+        ))
@@ -0,0 +1,45 @@
+# main/management/commands/export_data.py
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.exports import CHUNK_SIZE, DATASETS, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV/NDJSON dump of progress, plans or payments (optionally gzipped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+        parser.add_argument('--member', type=int, help='Only this MemberProfile id. Default: everyone.')
+        parser.add_argument('--output', '-o', default='-', help="Output file (default '-' for stdout).")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f'Rows fetched per database round trip (default {CHUNK_SIZE}).')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        stream = stream_export(options['dataset'], options['format'], member_id=options['member'],
+                               compress=options['gzip'], chunk_size=max(1, options['chunk_size']))
+        to_stdout = options['output'] == '-'
+        try:
+            out = sys.stdout.buffer if to_stdout else open(options['output'], 'wb')
+        except OSError as e:
+            raise CommandError(str(e))
+        written = 0
+        try:
+            for piece in stream:
+                data = piece if isinstance(piece, bytes) else piece.encode('utf-8')
+                out.write(data)
+                written += len(data)
+        finally:
+            if to_stdout:
+                out.flush()
+            else:
+                out.close()
+        if not to_stdout:
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {written} bytes to {options['output']} in {time.monotonic() - start:.1f}s."
+            ))
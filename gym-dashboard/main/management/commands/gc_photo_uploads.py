@@ -0,0 +1,19 @@
+# main/management/commands/gc_photo_uploads.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.chunked_uploads import gc_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete chunked photo upload sessions that were abandoned, and their partial files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=int, default=settings.PHOTO_UPLOAD_TTL_HOURS,
+                            help=f'Remove sessions untouched for this long (default {settings.PHOTO_UPLOAD_TTL_HOURS}).')
+
+    def handle(self, *args, **options):
+        removed, freed = gc_uploads(max(0, options['older_than_hours']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {removed} upload session(s), freed {freed / (1024 * 1024):.1f} MB."
+        ))
@@ -0,0 +1,86 @@
+# main/management/commands/generate_all_plans.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from main.models import MemberProfile, PlanJob
+from main.plan_jobs import ACTIVE_STATUSES, claim_next_job, enqueue_batch, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenerate AI plans for every approved member concurrently. Progress is tracked "
+        "as PlanJobs in a named batch, so re-running the same --batch resumes where it stopped. "
+        "LLM calls draw on the RPM/TPM budget in settings.LLM_RPM / LLM_TPM, shared with run_plan_workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', default=None,
+                            help="Batch name (default: current month, e.g. 2026-10).")
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Concurrent generations (default 8).')
+        parser.add_argument('--stale-after', type=int, default=settings.PLAN_JOB_STALE_AFTER,
+                            help='Requeue running jobs of this batch started more than this many seconds ago '
+                                 '(default settings.PLAN_JOB_STALE_AFTER).')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Requeue jobs of this batch that failed on a previous run.')
+
+    def handle(self, *args, **options):
+        batch = options['batch'] or timezone.now().strftime('%Y-%m')
+
+        members = MemberProfile.objects.filter(is_payment_approved=True).only('id')
+        created = enqueue_batch(batch, members)
+        # jobs left 'running' by an interrupted run of this batch; younger ones may still be
+        # in flight on run_plan_workers, which claims batch jobs too
+        requeued = requeue_stale_jobs(options['stale_after'], batch=batch)
+        if options['retry_failed']:
+            busy = PlanJob.objects.filter(status__in=ACTIVE_STATUSES).values('member_id')
+            requeued += PlanJob.objects.filter(batch=batch, status=PlanJob.STATUS_FAILED).exclude(
+                member_id__in=busy,
+            ).update(
+                status=PlanJob.STATUS_QUEUED, started_at=None, error='',
+            )
+        pending = PlanJob.objects.filter(batch=batch, status=PlanJob.STATUS_QUEUED).count()
+        self.stdout.write(f"Batch {batch}: {created} new job(s), {requeued} resumed, {pending} to run.")
+
+        def worker():
+            results = []
+            try:
+                while True:
+                    close_old_connections()
+                    job = claim_next_job(batch=batch)
+                    if job is None:
+                        return results
+                    started = time.monotonic()
+                    job = run_job(job)
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f"  {job.member.user.username:<20} {job.status:<7} "
+                        f"{job.created_count:>2} day(s) {job.tokens:>6} tokens {elapsed:6.2f}s"
+                        + (f"  {job.error}" if job.error else "")
+                    )
+                    results.append(job)
+            finally:
+                connection.close()
+
+        started = time.monotonic()
+        workers = max(1, options['workers'])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(worker) for _ in range(workers)]
+            jobs = [job for f in futures for job in f.result()]
+        elapsed = max(time.monotonic() - started, 1e-9)
+
+        done = sum(1 for j in jobs if j.status == PlanJob.STATUS_DONE)
+        failed = len(jobs) - done
+        tokens = sum(j.tokens for j in jobs)
+        remaining = PlanJob.objects.filter(batch=batch).exclude(status=PlanJob.STATUS_DONE).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(jobs)} member(s) in {elapsed:.1f}s: {done} done, {failed} failed. "
+            f"Throughput {len(jobs) / elapsed * 60:.1f} members/min, {tokens / elapsed * 60:.0f} tokens/min."
+        ))
+        if remaining:
+            self.stdout.write(f"{remaining} job(s) in batch {batch} not done; re-run to resume.")
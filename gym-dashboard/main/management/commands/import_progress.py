@@ -0,0 +1,50 @@
+# main/management/commands/import_progress.py
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.models import MemberProfile
+from main.progress_import import CHUNK_SIZE, FORMATS, detect_format, import_progress
+
+
+class Command(BaseCommand):
+    help = "Import a member's progress history from a CSV or NDJSON file (rows are upserted by date)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        member = parser.add_mutually_exclusive_group(required=True)
+        member.add_argument('--member', type=int, help='MemberProfile id.')
+        member.add_argument('--username', help="The member's username.")
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Input format. Default: from the file extension (.ndjson/.jsonl/.json), else csv.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f'Rows per upsert (default {CHUNK_SIZE}).')
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['member']} if options['member'] else {'user__username': options['username']}
+        try:
+            member_id = MemberProfile.objects.values_list('pk', flat=True).get(**lookup)
+        except MemberProfile.DoesNotExist:
+            raise CommandError(f"No member matching {lookup}.")
+
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        start = time.monotonic()
+        try:
+            if path == '-':
+                result = import_progress(member_id, sys.stdin.buffer, fmt, max(1, options['chunk_size']))
+            else:
+                with open(path, 'rb') as f:
+                    result = import_progress(member_id, f, fmt, max(1, options['chunk_size']))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"... and {result.error_count - len(result.errors)} more error(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {result.rows_read} row(s), wrote {result.rows_written} day(s), "
+            f"{result.error_count} error(s) in {time.monotonic() - start:.1f}s."
+        ))
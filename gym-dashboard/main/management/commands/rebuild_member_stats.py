@@ -0,0 +1,23 @@
+# main/management/commands/rebuild_member_stats.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.member_stats import rebuild_member_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the MemberStats snapshot for every member (or --member ids) in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--member', type=int, action='append', dest='members',
+                            help='MemberProfile id to rebuild (repeatable). Default: all members.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows per upsert (default 500).')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        written = rebuild_member_stats(member_ids=options['members'], batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {written} member(s) in {time.monotonic() - start:.1f}s."
+        ))
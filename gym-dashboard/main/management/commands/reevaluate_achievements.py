@@ -0,0 +1,27 @@
+# main/management/commands/reevaluate_achievements.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.achievements import reevaluate_achievements
+
+
+class Command(BaseCommand):
+    help = "Apply the current achievement rules to every member (or --member ids) in bulk, e.g. after rules change."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--member', type=int, action='append', dest='members',
+                            help='MemberProfile id to re-evaluate (repeatable). Default: all members.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Members per batch (default 500).')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete badges whose rule no longer exists.')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        earned, revoked = reevaluate_achievements(member_ids=options['members'],
+                                                  batch_size=max(1, options['batch_size']),
+                                                  prune=options['prune'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{earned} badge(s) awarded, {revoked} removed in {time.monotonic() - start:.1f}s."
+        ))
@@ -0,0 +1,56 @@
+# main/management/commands/run_photo_workers.py
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.photo_renditions import process_pending, requeue_stale_photos
+
+
+class Command(BaseCommand):
+    help = "Render thumbnails and medium copies (JPEG + WebP) of newly uploaded progress photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when nothing is pending (default 2.0).')
+        parser.add_argument('--batch', type=int, default=20,
+                            help='Photos claimed per pass (default 20).')
+        parser.add_argument('--stale-after', type=int, default=settings.PHOTO_RENDITIONS_STALE_AFTER,
+                            help="Requeue photos left 'processing' for more than this many seconds "
+                                 '(default settings.PHOTO_RENDITIONS_STALE_AFTER).')
+        parser.add_argument('--once', action='store_true',
+                            help='Render what is pending and exit instead of polling forever.')
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        requeued = requeue_stale_photos(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale photo(s).")
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self._request_stop)
+            signal.signal(signal.SIGTERM, self._request_stop)
+
+        rendered = failed = 0
+        start = time.monotonic()
+        while not self.stop.is_set():
+            close_old_connections()
+            done, errors = process_pending(limit=max(1, options['batch']))
+            rendered += done
+            failed += errors
+            if done or errors:
+                self.stdout.write(f"{done} photo(s) rendered, {errors} failed.")
+                continue
+            if options['once']:
+                break
+            self.stop.wait(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Photo worker stopped. {rendered} rendered, {failed} failed in {time.monotonic() - start:.1f}s."
+        ))
+
+    def _request_stop(self, signum, frame):
+        self.stdout.write("Stopping after the current batch...")
+        self.stop.set()
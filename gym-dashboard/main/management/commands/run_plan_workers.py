@@ -0,0 +1,84 @@
+# main/management/commands/run_plan_workers.py
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from main.plan_jobs import claim_next_job, run_job, requeue_stale_jobs
+from main.plan_cache import plan_cache_stats
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run worker threads that process queued AI plan generation jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of worker threads (default 4).')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty (default 1.0).')
+        parser.add_argument('--stale-after', type=int, default=settings.PLAN_JOB_STALE_AFTER,
+                            help='Requeue running jobs started more than this many seconds ago '
+                                 '(default settings.PLAN_JOB_STALE_AFTER).')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling forever.')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        self.poll_interval = options['poll_interval']
+        self.once = options['once']
+        self.stop = threading.Event()
+        self.processed = 0
+        self.lock = threading.Lock()
+
+        requeued = requeue_stale_jobs(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self._request_stop)
+            signal.signal(signal.SIGTERM, self._request_stop)
+
+        self.stdout.write(f"Starting {concurrency} plan worker(s).")
+        threads = [
+            threading.Thread(target=self._worker, name=f'plan-worker-{i}', daemon=True)
+            for i in range(concurrency)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            while t.is_alive():
+                t.join(timeout=0.5)
+        self.stdout.write(self.style.SUCCESS(f"Workers stopped. {self.processed} job(s) processed."))
+        stats = plan_cache_stats()
+        self.stdout.write(f"Plan cache: {stats['hits']} hit(s), {stats['misses']} miss(es), "
+                          f"hit rate {stats['hit_rate']:.0%}.")
+
+    def _request_stop(self, signum, frame):
+        self.stdout.write("Stopping after current jobs finish...")
+        self.stop.set()
+
+    def _worker(self):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if self.once:
+                        return
+                    self.stop.wait(self.poll_interval)
+                    continue
+                job = run_job(job)
+                with self.lock:
+                    self.processed += 1
+                self.stdout.write(f"[{threading.current_thread().name}] job {job.id} "
+                                  f"({job.member.user.username}): {job.status}")
+        except Exception:
+            logger.exception("Plan worker crashed")
+        finally:
+            # each thread owns its own DB connection
+            connection.close()
@@ -0,0 +1,223 @@
+# main/member_stats.py
+"""
+Keeps MemberStats in step with a member's Progress, plans and profile.
+
+Signal handlers (main/signals.py) call into here. A new entry at or after
+the end of the member's history (the usual "log today's weight") is applied
+to the snapshot directly; edits, deletes and back-dated entries refresh
+that member from a few indexed queries.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.utils import timezone
+
+from . import dashboard_cache
+from .achievements import reevaluate_achievements
+from .models import MemberProfile, MemberStats, PlanGeneration, Progress, WorkoutPlan
+
+
+# everything except the change marker, which only progress_changed() writes
+SNAPSHOT_FIELDS = ['entry_count', 'first_entry_date', 'first_weight_kg', 'last_entry_date', 'last_weight_kg',
+                   'current_streak', 'bmi', 'has_plan', 'updated_at']
+
+
+def compute_bmi(height_cm, weight_kg):
+    if not height_cm or not weight_kg:
+        return None
+    h_m = height_cm / 100.0
+    return round(weight_kg / (h_m * h_m), 1)
+
+
+def _current_plan_exists(member_id):
+    return WorkoutPlan.objects.filter(
+        generation__member_id=member_id, generation__status=PlanGeneration.STATUS_CURRENT,
+    ).exists()
+
+
+def _streak_ending(member_id, last_date):
+    """
+    Consecutive logged days ending at last_date; reads only the streak's own rows.
+    """
+    streak = 0
+    expected = last_date
+    dates = (Progress.objects.filter(member_id=member_id, date__lte=last_date)
+             .order_by('-date').values_list('date', flat=True).distinct())
+    for day in dates.iterator(chunk_size=500):
+        if day != expected:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak
+
+
+def refresh_member_stats(member_id):
+    """
+    Recompute one member's snapshot from the database. Returns the MemberStats.
+    """
+    entries = Progress.objects.filter(member_id=member_id).order_by()
+    first = entries.order_by('date', 'id').values('date', 'weight_kg').first()
+    last = entries.order_by('-date', '-id').values('date', 'weight_kg').first()
+    height_cm, weight_kg = MemberProfile.objects.values_list('height_cm', 'weight_kg').get(pk=member_id)
+    stats, _ = MemberStats.objects.update_or_create(member_id=member_id, defaults={
+        'entry_count': entries.count(),
+        'first_entry_date': first and first['date'],
+        'first_weight_kg': first and first['weight_kg'],
+        'last_entry_date': last and last['date'],
+        'last_weight_kg': last and last['weight_kg'],
+        'current_streak': _streak_ending(member_id, last['date']) if last else 0,
+        'bmi': compute_bmi(height_cm, (last and last['weight_kg']) or weight_kg),
+        'has_plan': _current_plan_exists(member_id),
+    })
+    return stats
+
+
+def progress_added(entry):
+    """
+    Apply a newly created Progress row to its member's snapshot.
+    """
+    with transaction.atomic():
+        stats = MemberStats.objects.select_for_update().filter(member_id=entry.member_id).first()
+        if stats is None:
+            return refresh_member_stats(entry.member_id)
+        day = entry.date
+        if stats.entry_count == 0:
+            stats.first_entry_date, stats.first_weight_kg = day, entry.weight_kg
+            stats.last_entry_date, stats.last_weight_kg = day, entry.weight_kg
+            stats.current_streak = 1
+        elif day >= stats.last_entry_date:
+            if day == stats.last_entry_date + timedelta(days=1):
+                stats.current_streak += 1
+            elif day > stats.last_entry_date:
+                stats.current_streak = 1
+            stats.last_entry_date, stats.last_weight_kg = day, entry.weight_kg
+        elif day < stats.first_entry_date:
+            stats.first_entry_date, stats.first_weight_kg = day, entry.weight_kg
+            if day == stats.last_entry_date - timedelta(days=stats.current_streak):
+                # only possible when the streak covers the whole history
+                stats.current_streak += 1
+        else:
+            # back-dated into the middle of the history: may join streaks
+            return refresh_member_stats(entry.member_id)
+        stats.entry_count += 1
+        if stats.last_entry_date == day:
+            stats.bmi = compute_bmi(entry.member.height_cm, entry.weight_kg or entry.member.weight_kg)
+        stats.save(update_fields=SNAPSHOT_FIELDS)
+        return stats
+
+
+def progress_changed(member_ids):
+    """
+    Bump the progress change marker (ETag/Last-Modified of the progress APIs).
+    """
+    MemberStats.objects.filter(member_id__in=member_ids).update(
+        progress_version=F('progress_version') + 1,
+        progress_changed_at=timezone.now(),
+    )
+
+
+def progress_marker(user):
+    """
+    (member_id, progress_version, progress_changed_at) for a user, read by
+    primary key without touching Progress; None if there is no snapshot yet.
+    """
+    return (MemberStats.objects.filter(member__user=user)
+            .values_list('member_id', 'progress_version', 'progress_changed_at').first())
+
+
+def profile_changed(profile):
+    """
+    Height/weight edits only move the BMI; everything else is untouched.
+    """
+    stats = MemberStats.objects.filter(member_id=profile.pk).first()
+    if stats is None:
+        return refresh_member_stats(profile.pk)
+    bmi = compute_bmi(profile.height_cm, stats.last_weight_kg or profile.weight_kg)
+    if bmi != stats.bmi:
+        stats.bmi = bmi
+        stats.save(update_fields=['bmi', 'updated_at'])
+    return stats
+
+
+def plans_changed(member_id):
+    MemberStats.objects.filter(member_id=member_id).update(has_plan=_current_plan_exists(member_id))
+
+
+def plan_promoted(member_id):
+    # a generation just became current, so there is a plan; no need to query for it
+    MemberStats.objects.filter(member_id=member_id).update(has_plan=True)
+
+
+def rebuild_member_stats(member_ids=None, batch_size=500):
+    """
+    Recompute MemberStats for all (or the given) members in bulk: one
+    aggregate query for counts/first/last/plans, one ordered pass over
+    Progress dates for streaks, then batched upserts; achievements are
+    re-evaluated against the new snapshots. Returns rows written.
+    """
+    profiles = MemberProfile.objects.order_by('pk')
+    if member_ids is not None:
+        profiles = profiles.filter(pk__in=member_ids)
+    entries = Progress.objects.filter(member=OuterRef('pk')).order_by()
+    rows = profiles.annotate(
+        entry_count=Subquery(entries.values('member').annotate(n=Count('id')).values('n')),
+        first_entry_date=Subquery(entries.order_by('date', 'id').values('date')[:1]),
+        first_weight=Subquery(entries.order_by('date', 'id').values('weight_kg')[:1]),
+        last_entry_date=Subquery(entries.order_by('-date', '-id').values('date')[:1]),
+        last_weight=Subquery(entries.order_by('-date', '-id').values('weight_kg')[:1]),
+        has_plan=Exists(WorkoutPlan.objects.filter(
+            generation__member=OuterRef('pk'), generation__status=PlanGeneration.STATUS_CURRENT,
+        )),
+    ).values('pk', 'height_cm', 'weight_kg', 'entry_count', 'first_entry_date', 'first_weight',
+             'last_entry_date', 'last_weight', 'has_plan')
+
+    streaks = {}
+    dates = Progress.objects.order_by('member_id', '-date').values_list('member_id', 'date').distinct()
+    if member_ids is not None:
+        dates = dates.filter(member_id__in=member_ids)
+    expected = {}
+    for member_id, day in dates.iterator(chunk_size=2000):
+        if member_id not in expected:
+            expected[member_id] = day
+            streaks[member_id] = 0
+        if expected[member_id] == day:
+            streaks[member_id] += 1
+            expected[member_id] = day - timedelta(days=1)
+        else:
+            expected[member_id] = None   # gap reached; skip the rest of this member
+
+    written = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(MemberStats(
+            member_id=row['pk'],
+            entry_count=row['entry_count'] or 0,
+            first_entry_date=row['first_entry_date'],
+            first_weight_kg=row['first_weight'],
+            last_entry_date=row['last_entry_date'],
+            last_weight_kg=row['last_weight'],
+            current_streak=streaks.get(row['pk'], 0),
+            bmi=compute_bmi(row['height_cm'], row['last_weight'] or row['weight_kg']),
+            has_plan=row['has_plan'],
+        ))
+        if len(batch) >= batch_size:
+            written += _upsert(batch)
+            batch = []
+    if batch:
+        written += _upsert(batch)
+    reevaluate_achievements(member_ids, batch_size=batch_size)
+    return written
+
+
+def _upsert(batch):
+    MemberStats.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['member'],
+        update_fields=SNAPSHOT_FIELDS,
+    )
+    dashboard_cache.bump_many([stats.member_id for stats in batch], 'progress')
+    # history may have been bulk-written behind our back; clients must refetch
+    progress_changed([stats.member_id for stats in batch])
+    return len(batch)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_planjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planjob',
+            name='days_completed',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
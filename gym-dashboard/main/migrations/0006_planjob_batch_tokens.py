@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_planjob_days_completed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planjob',
+            name='batch',
+            field=models.CharField(blank=True, db_index=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='planjob',
+            name='tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_planjob_batch_tokens'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='planjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('member',), name='planjob_one_active_per_member'),
+        ),
+    ]
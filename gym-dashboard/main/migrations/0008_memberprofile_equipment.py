@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_planjob_one_active_per_member'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberprofile',
+            name='equipment',
+            field=models.CharField(blank=True, choices=[('gym', 'Full gym'), ('home', 'Home (dumbbells/bands)'), ('none', 'No equipment')], default='gym', max_length=10),
+        ),
+    ]
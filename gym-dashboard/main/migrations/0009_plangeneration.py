@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_memberprofile_equipment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('building', 'Building'), ('current', 'Current'), ('superseded', 'Superseded')], default='building', max_length=12)),
+                ('source', models.CharField(blank=True, max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('superseded_at', models.DateTimeField(blank=True, null=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plan_generations', to='main.memberprofile')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dietplan',
+            name='generation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='diets', to='main.plangeneration'),
+        ),
+        migrations.AddField(
+            model_name='planjob',
+            name='generation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.plangeneration'),
+        ),
+        migrations.AddField(
+            model_name='workoutplan',
+            name='generation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='workouts', to='main.plangeneration'),
+        ),
+        migrations.AddConstraint(
+            model_name='plangeneration',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'current')), fields=('member',), name='plangeneration_one_current_per_member'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def group_legacy_plans(apps, schema_editor):
+    """
+    Put each member's existing plan rows into one 'legacy' generation marked
+    current, so the dashboard keeps showing them.
+    """
+    PlanGeneration = apps.get_model('main', 'PlanGeneration')
+    WorkoutPlan = apps.get_model('main', 'WorkoutPlan')
+    DietPlan = apps.get_model('main', 'DietPlan')
+
+    member_ids = set(WorkoutPlan.objects.filter(generation__isnull=True).values_list('member_id', flat=True))
+    member_ids |= set(DietPlan.objects.filter(generation__isnull=True).values_list('member_id', flat=True))
+    for member_id in sorted(member_ids):
+        generation = PlanGeneration.objects.create(member_id=member_id, status='current', source='legacy')
+        WorkoutPlan.objects.filter(member_id=member_id, generation__isnull=True).update(generation=generation)
+        DietPlan.objects.filter(member_id=member_id, generation__isnull=True).update(generation=generation)
+
+
+def ungroup_legacy_plans(apps, schema_editor):
+    PlanGeneration = apps.get_model('main', 'PlanGeneration')
+    WorkoutPlan = apps.get_model('main', 'WorkoutPlan')
+    DietPlan = apps.get_model('main', 'DietPlan')
+    legacy = PlanGeneration.objects.filter(source='legacy')
+    WorkoutPlan.objects.filter(generation__in=legacy).update(generation=None)
+    DietPlan.objects.filter(generation__in=legacy).update(generation=None)
+    legacy.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_plangeneration'),
+    ]
+
+    operations = [
+        migrations.RunPython(group_legacy_plans, ungroup_legacy_plans),
+    ]
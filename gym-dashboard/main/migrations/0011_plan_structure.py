@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_plangeneration_legacy_rows'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Exercise',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=120, unique=True)),
+                ('muscle_group', models.CharField(blank=True, db_index=True, max_length=30)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlanDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_number', models.PositiveSmallIntegerField()),
+                ('generation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='main.plangeneration')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plan_days', to='main.memberprofile')),
+                ('workout', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='plan_day', to='main.workoutplan')),
+            ],
+            options={
+                'ordering': ['generation', 'day_number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MealEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.CharField(choices=[('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner'), ('snacks', 'Snacks')], max_length=10)),
+                ('description', models.CharField(max_length=255)),
+                ('plan_day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meals', to='main.planday')),
+            ],
+            options={
+                'ordering': ['plan_day', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExerciseEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('sets', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('reps', models.CharField(blank=True, max_length=40)),
+                ('notes', models.CharField(blank=True, max_length=255)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='main.exercise')),
+                ('plan_day', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exercises', to='main.planday')),
+            ],
+            options={
+                'ordering': ['plan_day', 'position'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='planday',
+            index=models.Index(fields=['generation', 'day_number'], name='planday_generation_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciseentry',
+            index=models.Index(fields=['exercise', 'plan_day'], name='exerciseentry_exercise_day_idx'),
+        ),
+    ]
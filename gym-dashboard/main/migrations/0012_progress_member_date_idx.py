@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_plan_structure'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='progress',
+            index=models.Index(fields=['member', 'date'], name='progress_member_date_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_progress_member_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberStats',
+            fields=[
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='main.memberprofile')),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('first_entry_date', models.DateField(blank=True, null=True)),
+                ('first_weight_kg', models.FloatField(blank=True, null=True)),
+                ('last_entry_date', models.DateField(blank=True, null=True)),
+                ('last_weight_kg', models.FloatField(blank=True, null=True)),
+                ('current_streak', models.PositiveIntegerField(default=0)),
+                ('bmi', models.FloatField(blank=True, null=True)),
+                ('has_plan', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_memberstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progress',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='memberstats',
+            name='progress_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='memberstats',
+            name='progress_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_progress_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberAchievement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50)),
+                ('earned_at', models.DateTimeField(auto_now_add=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='achievements', to='main.memberprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['member', 'earned_at'], name='memberachievement_member_idx')],
+                'constraints': [models.UniqueConstraint(fields=('member', 'code'), name='memberachievement_member_code_uniq')],
+            },
+        ),
+    ]
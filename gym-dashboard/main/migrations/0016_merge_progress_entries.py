@@ -0,0 +1,63 @@
+from django.db import migrations
+from django.db.models import Count
+
+MERGED_FIELDS = ('weight_kg', 'body_fat_pct')
+
+
+def _merge(keeper, others):
+    """
+    Fill the keeper's empty measurements from the other rows (in priority
+    order) and keep every distinct note. Returns True if keeper changed.
+    """
+    changed = False
+    for other in others:
+        for field in MERGED_FIELDS:
+            if getattr(keeper, field) is None and getattr(other, field) is not None:
+                setattr(keeper, field, getattr(other, field))
+                changed = True
+        if other.notes and other.notes not in keeper.notes:
+            keeper.notes = f"{keeper.notes}\n{other.notes}" if keeper.notes else other.notes
+            changed = True
+    return changed
+
+
+def merge_progress_entries(apps, schema_editor):
+    """
+    Fold ProgressEntry into Progress and leave one Progress row per (member, date).
+    The most recently written Progress row wins; gaps are filled from older
+    duplicates, then from ProgressEntry.
+    """
+    Progress = apps.get_model('main', 'Progress')
+    ProgressEntry = apps.get_model('main', 'ProgressEntry')
+
+    duplicated = (Progress.objects.values('member_id', 'date').annotate(n=Count('id'))
+                  .filter(n__gt=1).values_list('member_id', 'date'))
+    for member_id, day in duplicated.iterator():
+        rows = list(Progress.objects.filter(member_id=member_id, date=day).order_by('-updated_at', '-id'))
+        keeper, others = rows[0], rows[1:]
+        if _merge(keeper, others):
+            keeper.save(update_fields=['weight_kg', 'body_fat_pct', 'notes'])
+        Progress.objects.filter(id__in=[row.id for row in others]).delete()
+
+    new = {}
+    for entry in ProgressEntry.objects.order_by('-id').iterator():
+        key = (entry.member_id, entry.date)
+        existing = new.get(key) or Progress.objects.filter(member_id=entry.member_id, date=entry.date).first()
+        if existing is None:
+            new[key] = Progress(member_id=entry.member_id, date=entry.date, weight_kg=entry.weight_kg,
+                                body_fat_pct=entry.body_fat_pct, notes=entry.notes)
+        elif _merge(existing, [entry]) and existing.pk:
+            existing.save(update_fields=['weight_kg', 'body_fat_pct', 'notes'])
+    Progress.objects.bulk_create(new.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_memberachievement'),
+    ]
+
+    operations = [
+        # deduplicated rows can't be split again; reversing only restores the schema
+        migrations.RunPython(merge_progress_entries, migrations.RunPython.noop),
+    ]
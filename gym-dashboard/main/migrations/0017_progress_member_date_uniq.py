@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0016_merge_progress_entries'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='progressentry',
+            name='member',
+        ),
+        migrations.AddConstraint(
+            model_name='progress',
+            constraint=models.UniqueConstraint(fields=('member', 'date'), name='progress_member_date_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='progress',
+            name='progress_member_date_idx',
+        ),
+        migrations.DeleteModel(
+            name='ProgressEntry',
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_progress_member_date_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progressphoto',
+            name='medium',
+            field=models.ImageField(blank=True, upload_to='progress_photos/renditions/'),
+        ),
+        migrations.AddField(
+            model_name='progressphoto',
+            name='medium_webp',
+            field=models.ImageField(blank=True, upload_to='progress_photos/renditions/'),
+        ),
+        migrations.AddField(
+            model_name='progressphoto',
+            name='renditions_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='progressphoto',
+            name='thumb',
+            field=models.ImageField(blank=True, height_field='thumb_height', upload_to='progress_photos/renditions/', width_field='thumb_width'),
+        ),
+        migrations.AddField(
+            model_name='progressphoto',
+            name='thumb_height',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='progressphoto',
+            name='thumb_webp',
+            field=models.ImageField(blank=True, upload_to='progress_photos/renditions/'),
+        ),
+        migrations.AddField(
+            model_name='progressphoto',
+            name='thumb_width',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_photoblob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='progressphoto',
+            index=models.Index(fields=['member', 'created_at'], name='progressphoto_member_time_idx'),
+        ),
+    ]
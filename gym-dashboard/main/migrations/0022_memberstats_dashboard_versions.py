@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:20
+
+import time
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_progressphoto_member_time_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberstats',
+            name='dash_achievements_version',
+            field=models.PositiveBigIntegerField(default=time.time_ns),
+        ),
+        migrations.AddField(
+            model_name='memberstats',
+            name='dash_photos_version',
+            field=models.PositiveBigIntegerField(default=time.time_ns),
+        ),
+        migrations.AddField(
+            model_name='memberstats',
+            name='dash_plans_version',
+            field=models.PositiveBigIntegerField(default=time.time_ns),
+        ),
+        migrations.AddField(
+            model_name='memberstats',
+            name='dash_profile_version',
+            field=models.PositiveBigIntegerField(default=time.time_ns),
+        ),
+        migrations.AddField(
+            model_name='memberstats',
+            name='dash_progress_version',
+            field=models.PositiveBigIntegerField(default=time.time_ns),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_memberstats_dashboard_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='progressphoto',
+            name='renditions_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,15 @@
+import time
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
 class MemberProfile(models.Model):
+    EQUIPMENT_CHOICES = [
+        ('gym', 'Full gym'),
+        ('home', 'Home (dumbbells/bands)'),
+        ('none', 'No equipment'),
+    ]
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='memberprofile')
     phone = models.CharField(max_length=20, blank=True)
     age = models.PositiveSmallIntegerField(null=True, blank=True)
@@ -10,13 +18,48 @@ class MemberProfile(models.Model):
     gender = models.CharField(max_length=10, blank=True)
     goal = models.CharField(max_length=50, blank=True)  # e.g., 'Fat Loss', 'Muscle Gain'
     experience_level = models.CharField(max_length=20, blank=True)  # Beginner/Intermediate/Advanced
+    equipment = models.CharField(max_length=10, choices=EQUIPMENT_CHOICES, default='gym', blank=True)
     is_payment_approved = models.BooleanField(default=False)
 
     def __str__(self):
         return self.user.username
 
+class PlanGeneration(models.Model):
+    """
+    One plan generation run. Its WorkoutPlan/DietPlan rows are written together;
+    only the member's 'current' generation is shown, older ones are superseded.
+    """
+    STATUS_BUILDING = 'building'
+    STATUS_CURRENT = 'current'
+    STATUS_SUPERSEDED = 'superseded'
+    STATUS_CHOICES = [
+        (STATUS_BUILDING, 'Building'),
+        (STATUS_CURRENT, 'Current'),
+        (STATUS_SUPERSEDED, 'Superseded'),
+    ]
+    member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name='plan_generations')
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=STATUS_BUILDING)
+    source = models.CharField(max_length=20, blank=True)  # llm / cached / rules / fallback / text / legacy
+    created_at = models.DateTimeField(auto_now_add=True)
+    superseded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # also the index behind the dashboard's "current plan" lookup
+            models.UniqueConstraint(
+                fields=['member'],
+                condition=models.Q(status='current'),
+                name='plangeneration_one_current_per_member',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.member.user.username} - generation {self.id} - {self.status}"
+
+
 class WorkoutPlan(models.Model):
     member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name='workouts')
+    generation = models.ForeignKey(PlanGeneration, on_delete=models.CASCADE, null=True, blank=True, related_name='workouts')
     title = models.CharField(max_length=120)
     content = models.TextField()  # AI-generated plan or manual
     created_at = models.DateTimeField(auto_now_add=True)
@@ -26,6 +69,7 @@ class WorkoutPlan(models.Model):
 
 class DietPlan(models.Model):
     member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name='diets')
+    generation = models.ForeignKey(PlanGeneration, on_delete=models.CASCADE, null=True, blank=True, related_name='diets')
     title = models.CharField(max_length=120)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
@@ -33,18 +77,69 @@ class DietPlan(models.Model):
     def __str__(self):
         return f"{self.member.user.username} - {self.title}"
 
-class ProgressEntry(models.Model):
-    member = models.ForeignKey('MemberProfile', on_delete=models.CASCADE, related_name='progress_entries')
-    date = models.DateField()
-    weight_kg = models.FloatField(null=True, blank=True)
-    body_fat_pct = models.FloatField(null=True, blank=True)
-    notes = models.TextField(blank=True)
+class Exercise(models.Model):
+    """
+    Exercise catalog shared by all plans (names normalized by main.exercise_catalog).
+    """
+    name = models.CharField(max_length=120, unique=True)
+    muscle_group = models.CharField(max_length=30, blank=True, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+
+class PlanDay(models.Model):
+    generation = models.ForeignKey(PlanGeneration, on_delete=models.CASCADE, related_name='days')
+    member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name='plan_days')
+    day_number = models.PositiveSmallIntegerField()
+    # the readable WorkoutPlan row for the same day; deleting it removes the structured day too
+    workout = models.OneToOneField(WorkoutPlan, on_delete=models.CASCADE, null=True, blank=True, related_name='plan_day')
 
     class Meta:
-        ordering = ['-date']
+        ordering = ['generation', 'day_number']
+        indexes = [
+            models.Index(fields=['generation', 'day_number'], name='planday_generation_day_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.member.user.username} - {self.date}"
+        return f"{self.member.user.username} - day {self.day_number}"
+
+
+class ExerciseEntry(models.Model):
+    plan_day = models.ForeignKey(PlanDay, on_delete=models.CASCADE, related_name='exercises')
+    exercise = models.ForeignKey(Exercise, on_delete=models.PROTECT, related_name='entries')
+    position = models.PositiveSmallIntegerField()
+    sets = models.PositiveSmallIntegerField(null=True, blank=True)
+    reps = models.CharField(max_length=40, blank=True)
+    notes = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['plan_day', 'position']
+        indexes = [
+            # "who is programmed exercise X" scans only that exercise's entries
+            models.Index(fields=['exercise', 'plan_day'], name='exerciseentry_exercise_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.exercise.name} {self.sets}x{self.reps}"
+
+
+class MealEntry(models.Model):
+    SLOT_CHOICES = [
+        ('breakfast', 'Breakfast'),
+        ('lunch', 'Lunch'),
+        ('dinner', 'Dinner'),
+        ('snacks', 'Snacks'),
+    ]
+    plan_day = models.ForeignKey(PlanDay, on_delete=models.CASCADE, related_name='meals')
+    slot = models.CharField(max_length=10, choices=SLOT_CHOICES)
+    description = models.CharField(max_length=255)
+
+    class Meta:
+        ordering = ['plan_day', 'id']
+
+    def __str__(self):
+        return f"{self.slot}: {self.description}"
 
 
 class Progress(models.Model):
@@ -53,24 +148,163 @@ class Progress(models.Model):
     weight_kg = models.FloatField(null=True, blank=True)
     body_fat_pct = models.FloatField(null=True, blank=True)
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-date']
+        constraints = [
+            # one entry per member and day (add_progress upserts). Its index also
+            # serves the per-member date scans, ascending (chart) and descending (recent)
+            models.UniqueConstraint(fields=['member', 'date'], name='progress_member_date_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.member.user.username} - {self.date}"
 
 
+class MemberStats(models.Model):
+    """
+    Per-member progress snapshot read by the dashboard, maintained by
+    main.member_stats from Progress / WorkoutPlan / MemberProfile signals.
+    `current_streak` counts consecutive logged days ending at `last_entry_date`.
+    """
+    member = models.OneToOneField(MemberProfile, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    entry_count = models.PositiveIntegerField(default=0)
+    first_entry_date = models.DateField(null=True, blank=True)
+    first_weight_kg = models.FloatField(null=True, blank=True)
+    last_entry_date = models.DateField(null=True, blank=True)
+    last_weight_kg = models.FloatField(null=True, blank=True)
+    current_streak = models.PositiveIntegerField(default=0)
+    bmi = models.FloatField(null=True, blank=True)
+    has_plan = models.BooleanField(default=False)
+    # change marker for conditional GETs of the progress history: bumped on every Progress write/delete
+    progress_version = models.PositiveIntegerField(default=0)
+    progress_changed_at = models.DateTimeField(null=True, blank=True)
+    # dashboard fragment versions, one per data source (main/dashboard_cache.py); kept here
+    # rather than in the cache so every process and worker sees the same counters. They start
+    # from the creation time, so a recreated row never reuses keys still sitting in the cache.
+    dash_progress_version = models.PositiveBigIntegerField(default=time.time_ns)
+    dash_plans_version = models.PositiveBigIntegerField(default=time.time_ns)
+    dash_photos_version = models.PositiveBigIntegerField(default=time.time_ns)
+    dash_profile_version = models.PositiveBigIntegerField(default=time.time_ns)
+    dash_achievements_version = models.PositiveBigIntegerField(default=time.time_ns)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.member_id}"
+
+
+class MemberAchievement(models.Model):
+    """
+    A badge a member has earned; `code` names a rule in main.achievements.RULES.
+    """
+    member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name='achievements')
+    code = models.CharField(max_length=50)
+    earned_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['member', 'code'], name='memberachievement_member_code_uniq'),
+        ]
+        indexes = [
+            # the dashboard's badge read: WHERE member_id = ? ORDER BY earned_at
+            models.Index(fields=['member', 'earned_at'], name='memberachievement_member_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.code} ({self.member_id})"
+
+
+class PhotoBlob(models.Model):
+    """
+    One stored photo file, keyed by the SHA-256 of its bytes and shared by
+    every ProgressPhoto with that content (main/photo_store.py).
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='progress_photos/blobs/', max_length=200)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)   # ProgressPhotos using it; the file goes at 0
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} ref(s))"
+
+
 class ProgressPhoto(models.Model):
+    RENDITIONS_PENDING = 'pending'
+    RENDITIONS_PROCESSING = 'processing'
+    RENDITIONS_READY = 'ready'
+    RENDITIONS_FAILED = 'failed'
+    RENDITIONS_CHOICES = [
+        (RENDITIONS_PENDING, 'Pending'),
+        (RENDITIONS_PROCESSING, 'Processing'),
+        (RENDITIONS_READY, 'Ready'),
+        (RENDITIONS_FAILED, 'Failed'),
+    ]
     member = models.ForeignKey('MemberProfile', related_name='photos', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='progress_photos/')
     caption = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # the content-addressed file behind `image`; null for files not deduplicated yet
+    blob = models.ForeignKey(PhotoBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='photos')
+    # downscaled copies written by main.photo_renditions after upload
+    renditions_status = models.CharField(max_length=12, choices=RENDITIONS_CHOICES, default=RENDITIONS_PENDING,
+                                         db_index=True)
+    # when a worker claimed it; a photo 'processing' long past this lost its worker
+    renditions_started_at = models.DateTimeField(null=True, blank=True)
+    thumb = models.ImageField(upload_to='progress_photos/renditions/', blank=True,
+                              width_field='thumb_width', height_field='thumb_height')
+    thumb_width = models.PositiveSmallIntegerField(null=True, blank=True)
+    thumb_height = models.PositiveSmallIntegerField(null=True, blank=True)
+    thumb_webp = models.ImageField(upload_to='progress_photos/renditions/', blank=True)
+    medium = models.ImageField(upload_to='progress_photos/renditions/', blank=True)
+    medium_webp = models.ImageField(upload_to='progress_photos/renditions/', blank=True)
+
+    class Meta:
+        indexes = [
+            # photo timeline: a member's photos in (created_at, id) order
+            models.Index(fields=['member', 'created_at'], name='progressphoto_member_time_idx'),
+        ]
 
     def __str__(self):
         return f"Photo of {self.member.user.username} - {self.created_at.date()}"
 
 
+class PhotoUpload(models.Model):
+    """
+    A resumable, chunked progress photo upload (main/chunked_uploads.py).
+    Bytes go to a temporary file until the upload is completed.
+    """
+    STATUS_OPEN = 'open'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_OPEN, 'Open'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # unguessable, goes in URLs
+    member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name='photo_uploads')
+    filename = models.CharField(max_length=255)
+    caption = models.CharField(max_length=200, blank=True)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)             # hex digest announced by the client
+    received = models.PositiveBigIntegerField(default=0)  # bytes acknowledged so far = next offset
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_OPEN)
+    photo = models.ForeignKey(ProgressPhoto, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # gc_photo_uploads looks for stale sessions
+            models.Index(fields=['status', 'updated_at'], name='photoupload_status_upd_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.member.user.username} - {self.filename} ({self.received}/{self.size})"
+
+
 class Payment(models.Model):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
@@ -85,3 +319,47 @@ class Payment(models.Model):
 
     def __str__(self):
         return f"{self.member.user.username} - {self.amount} - {self.status}"
+
+
+class PlanJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name='plan_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    batch = models.CharField(max_length=40, blank=True, db_index=True)  # e.g. '2026-10' for monthly bulk runs
+    message = models.CharField(max_length=255, blank=True)
+    created_count = models.PositiveIntegerField(default=0)
+    days_completed = models.PositiveSmallIntegerField(default=0)  # days saved so far while streaming
+    generation = models.ForeignKey(PlanGeneration, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    tokens = models.PositiveIntegerField(default=0)  # LLM tokens used (0 for cache hits/fallbacks)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # workers claim the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='planjob_status_created_idx'),
+        ]
+        constraints = [
+            # single-flight: concurrent generate requests for a member share one job
+            models.UniqueConstraint(
+                fields=['member'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='planjob_one_active_per_member',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.member.user.username} - job {self.id} - {self.status}"
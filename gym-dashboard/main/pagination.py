@@ -0,0 +1,58 @@
+# main/pagination.py
+"""
+Keyset (seek) pagination over (key, id), where key is `date` for progress
+and `created_at` for photos.
+
+A cursor encodes the (key, id) of the last row served; the next page is the
+rows strictly after it, read straight off the (member, key) index instead of
+skipping OFFSET rows, so page 500 costs the same as page 1.
+"""
+import base64
+from datetime import date, datetime
+
+from django.db import models
+
+
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat()}|{pk}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, parse=date.fromisoformat):
+    """
+    (key, id) from encode_cursor(); `parse` turns the key back into a value
+    (datetime.fromisoformat for datetime keys). Raises ValueError if the
+    cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        value, pk = raw.split('|')
+        return parse(value), int(pk)
+    except ValueError as e:   # binascii.Error / UnicodeDecodeError are ValueErrors too
+        raise ValueError('invalid cursor') from e
+
+
+def _row_key(row, key):
+    if isinstance(row, dict):
+        return row[key], row['id']
+    return getattr(row, key), row.pk
+
+
+def keyset_page(queryset, cursor=None, limit=100, key='date'):
+    """
+    One page of `queryset` in (key, id) order, strictly after `cursor`.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Works for model and .values() querysets (`key` and 'id' must be selected).
+    """
+    rows = queryset.order_by(key, 'id')
+    if cursor:
+        is_datetime = isinstance(queryset.model._meta.get_field(key), models.DateTimeField)
+        parse = datetime.fromisoformat if is_datetime else date.fromisoformat
+        value, pk = decode_cursor(cursor, parse)
+        # (key, id) > (value, pk), phrased as a range on key so the (member, key) index is used
+        rows = rows.filter(**{f'{key}__gte': value}).exclude(**{key: value, 'id__lte': pk})
+    rows = list(rows[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*_row_key(rows[-1], key))
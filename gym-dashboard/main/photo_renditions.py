@@ -0,0 +1,137 @@
+# main/photo_renditions.py
+"""
+Downscaled, re-encoded copies of progress photos.
+
+Uploads are saved as-is and marked 'pending'. `manage.py run_photo_workers`
+(or, with settings.PHOTO_RENDITIONS_EAGER, the upload request once it
+commits) claims them and writes a grid thumbnail and a medium copy, each as
+JPEG and WebP, into the ProgressPhoto's rendition fields. Templates serve
+them through srcset and fall back to the original until they exist.
+`manage.py backfill_photo_renditions` covers photos uploaded before this.
+"""
+import hashlib
+import io
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ProgressPhoto
+
+logger = logging.getLogger(__name__)
+
+# rendition -> (longest edge in px, JPEG field, WebP field)
+RENDITIONS = {
+    'thumb': (320, 'thumb', 'thumb_webp'),     # dashboard grid (~160 CSS px at 2x)
+    'medium': (960, 'medium', 'medium_webp'),  # lightbox / wide screens
+}
+JPEG_QUALITY = 80
+WEBP_QUALITY = 75
+RENDITION_FIELDS = [field for _, jpeg, webp in RENDITIONS.values() for field in (jpeg, webp)]
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def render_photo(photo):
+    """
+    Write all renditions of one photo and mark it ready. Metadata (EXIF, GPS)
+    is dropped; the orientation is applied to the pixels first.
+    """
+    with photo.image.open('rb') as f:
+        source = Image.open(f)
+        # let the JPEG decoder downscale (1/2..1/8) while reading; still >= the largest rendition
+        largest = max(edge for edge, _, _ in RENDITIONS.values())
+        source.draft('RGB', (largest, largest))
+        source = ImageOps.exif_transpose(source)
+        source = source.convert('RGB')   # drops alpha / palette; photos go out as JPEG/WebP
+    base = os.path.splitext(os.path.basename(photo.image.name))[0][:24]
+    for name, (edge, jpeg_field, webp_field) in RENDITIONS.items():
+        image = source.copy()
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS)   # never upscales
+        for field, fmt, ext in ((jpeg_field, 'JPEG', 'jpg'), (webp_field, 'WEBP', 'webp')):
+            old = getattr(photo, field)
+            if old:
+                old.delete(save=False)
+            data = _encode(image, fmt)
+            # a content hash in the name: a re-render gets a new URL, so URLs can be cached forever
+            digest = hashlib.sha256(data).hexdigest()[:10]
+            getattr(photo, field).save(f'{base}_{name}_{digest}.{ext}', ContentFile(data), save=False)
+    photo.renditions_status = ProgressPhoto.RENDITIONS_READY
+    # a plain save: post_save bumps the member's dashboard photo fragment
+    photo.save(update_fields=[*RENDITION_FIELDS, 'thumb_width', 'thumb_height', 'renditions_status'])
+    return photo
+
+
+def claim_photo(photo_id, statuses=(ProgressPhoto.RENDITIONS_PENDING,)):
+    """
+    Atomically move a photo to 'processing' (conditional UPDATE, as
+    plan_jobs.claim_job). Returns the photo, or None if someone else has it.
+    """
+    claimed = ProgressPhoto.objects.filter(id=photo_id, renditions_status__in=statuses).update(
+        renditions_status=ProgressPhoto.RENDITIONS_PROCESSING, renditions_started_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+    return ProgressPhoto.objects.get(id=photo_id)
+
+
+def requeue_stale_photos(older_than):
+    """
+    Put photos 'processing' since longer than `older_than` seconds ago (their
+    worker died mid-render) back to 'pending'. Returns number requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return ProgressPhoto.objects.filter(
+        renditions_status=ProgressPhoto.RENDITIONS_PROCESSING, renditions_started_at__lt=cutoff,
+    ).update(renditions_status=ProgressPhoto.RENDITIONS_PENDING, renditions_started_at=None)
+
+
+def process_photo(photo_id, statuses=(ProgressPhoto.RENDITIONS_PENDING,)):
+    """
+    Claim and render one photo. Returns the new status ('ready' / 'failed'),
+    or None if the photo wasn't claimable.
+    """
+    photo = claim_photo(photo_id, statuses)
+    if photo is None:
+        return None
+    try:
+        render_photo(photo)
+    except Exception:
+        logger.exception("Rendering photo %s failed", photo_id)
+        ProgressPhoto.objects.filter(id=photo_id).update(renditions_status=ProgressPhoto.RENDITIONS_FAILED)
+        return ProgressPhoto.RENDITIONS_FAILED
+    return ProgressPhoto.RENDITIONS_READY
+
+
+def process_pending(limit=50, statuses=(ProgressPhoto.RENDITIONS_PENDING,)):
+    """
+    Render up to `limit` photos in the given states, oldest first. Returns
+    (rendered, failed).
+    """
+    outcomes = []
+    ids = (ProgressPhoto.objects.filter(renditions_status__in=statuses)
+           .order_by('id').values_list('id', flat=True)[:limit])
+    for photo_id in list(ids):
+        outcomes.append(process_photo(photo_id, statuses))
+    return outcomes.count(ProgressPhoto.RENDITIONS_READY), outcomes.count(ProgressPhoto.RENDITIONS_FAILED)
+
+
+def photo_uploaded(photo):
+    """
+    Called after an upload is saved. With PHOTO_RENDITIONS_EAGER the
+    renditions are made once the upload commits; otherwise a worker does it.
+    """
+    if getattr(settings, 'PHOTO_RENDITIONS_EAGER', False):
+        transaction.on_commit(lambda: process_photo(photo.id))
@@ -0,0 +1,207 @@
+# main/photo_store.py
+"""
+Content-addressed storage for progress photos.
+
+Every new ProgressPhoto file is hashed before it is written. If a
+PhotoBlob with that SHA-256 exists, the photo points its `image` at the
+blob's file and bumps `ref_count`; nothing is written. Otherwise the file
+is stored once under progress_photos/blobs/<aa>/<sha256><ext>. Deleting a
+photo drops its reference (and its own renditions); the blob file is only
+removed with the last reference. Both hooks run from signals.py, so every
+way of creating a photo goes through them.
+
+`manage.py dedup_photos` moves photos stored before this onto blobs.
+"""
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from . import dashboard_cache
+from .models import PhotoBlob, ProgressPhoto
+from .photo_renditions import RENDITION_FIELDS
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = 'progress_photos/blobs'
+
+
+def content_sha256(content):
+    """
+    Hex SHA-256 of a File, read in chunks. Files that already know their
+    digest (chunked uploads verify it on completion) carry it as `.sha256`.
+    """
+    known = getattr(content, 'sha256', None)
+    if known:
+        return known
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(sha256, filename):
+    ext = os.path.splitext(filename)[1].lower()[:5]
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256}{ext}'
+
+
+def acquire_blob(content, sha256=None):
+    """
+    Take a reference on the blob holding `content`, storing it first if
+    this content is new. Returns the PhotoBlob.
+    """
+    sha256 = sha256 or content_sha256(content)
+    with transaction.atomic():
+        if PhotoBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1):
+            return PhotoBlob.objects.get(sha256=sha256)
+        try:
+            with transaction.atomic():
+                # the unique row goes in before the file, so a concurrent upload of the
+                # same bytes waits here and then takes the duplicate branch below
+                blob = PhotoBlob.objects.create(sha256=sha256, size=content.size, ref_count=1)
+                blob.file.save(blob_name(sha256, content.name), content, save=False)
+                blob.save(update_fields=['file'])
+        except IntegrityError:
+            PhotoBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+            return PhotoBlob.objects.get(sha256=sha256)
+    return blob
+
+
+def release_blob(blob_id):
+    """
+    Drop one reference; the last one deletes the blob and, after commit, its file.
+    """
+    with transaction.atomic():
+        PhotoBlob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        blob = PhotoBlob.objects.filter(pk=blob_id, ref_count=0).first()
+        if blob is None:
+            return False
+        if blob.photos.exists():
+            # the counter drifted (e.g. a failed save after acquire_blob); trust the rows
+            PhotoBlob.objects.filter(pk=blob_id).update(ref_count=blob.photos.count())
+            return False
+        name, storage = blob.file.name, blob.file.storage
+        blob.delete()
+        transaction.on_commit(lambda: storage.delete(name))
+    return True
+
+
+def store_photo_image(photo):
+    """
+    pre_save hook: route a newly assigned `image` through the blob store.
+    Already stored images (renditions updates, caption edits) are left alone.
+    """
+    image = photo.image
+    if not image or image._committed:
+        return
+    blob = acquire_blob(image.file)
+    photo.blob = blob
+    photo.image = blob.file.name   # committed name: FileField.pre_save won't write it again
+
+
+def photo_deleted(photo):
+    """
+    post_delete hook: remove the photo's own renditions and release its blob.
+    """
+    for field in RENDITION_FIELDS:
+        rendition = getattr(photo, field)
+        if rendition:
+            name, storage = rendition.name, rendition.storage
+            transaction.on_commit(lambda name=name, storage=storage: storage.delete(name))
+    if photo.blob_id:
+        release_blob(photo.blob_id)
+
+
+@dataclass
+class DedupResult:
+    photos: int = 0           # photos moved onto a blob
+    blobs_created: int = 0    # existing files adopted as blobs
+    duplicates: int = 0       # photos whose file duplicated an existing blob
+    files_removed: int = 0
+    bytes_reclaimed: int = 0
+    missing: int = 0          # photos whose file is gone from storage
+
+
+def dedup_existing(dry_run=False, batch_size=200):
+    """
+    Put photos stored before content addressing (blob is null) onto blobs,
+    in place: the first file seen with some content becomes its blob, later
+    copies point at it and their files are deleted once nothing uses them.
+    Finally ref counts are recounted from the photo rows.
+    """
+    result = DedupResult()
+    kept = {}        # sha256 -> PhotoBlob (a dry run keeps the first file name instead)
+    reclaimed = set()
+    members = set()  # dashboards showing a moved image URL
+    last_id = 0
+    while True:
+        photos = list(ProgressPhoto.objects.filter(blob__isnull=True, id__gt=last_id)
+                      .order_by('id')[:batch_size])
+        if not photos:
+            break
+        last_id = photos[-1].id
+        for photo in photos:
+            name, storage = photo.image.name, photo.image.storage
+            try:
+                with storage.open(name, 'rb') as f:
+                    digest = hashlib.sha256()
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+                size = storage.size(name)
+            except FileNotFoundError:
+                logger.warning("Photo %s: %s is missing from storage", photo.id, name)
+                result.missing += 1
+                continue
+            sha256 = digest.hexdigest()
+            result.photos += 1
+            if sha256 not in kept:
+                kept[sha256] = PhotoBlob.objects.filter(sha256=sha256).first()
+            blob = kept[sha256]
+
+            if dry_run:
+                if blob is None:
+                    kept[sha256] = name
+                    result.blobs_created += 1
+                    continue
+                result.duplicates += 1
+                kept_name = blob if isinstance(blob, str) else blob.file.name
+                if name != kept_name and name not in reclaimed:
+                    reclaimed.add(name)
+                    result.files_removed += 1
+                    result.bytes_reclaimed += size
+                continue
+
+            with transaction.atomic():
+                if blob is None:
+                    # adopt the file where it is as the blob for this content
+                    blob = kept[sha256] = PhotoBlob.objects.create(sha256=sha256, file=name, size=size)
+                    result.blobs_created += 1
+                else:
+                    result.duplicates += 1
+                ProgressPhoto.objects.filter(pk=photo.pk).update(blob=blob, image=blob.file.name)
+            if name != blob.file.name:
+                members.add(photo.member_id)
+            if name != blob.file.name and not ProgressPhoto.objects.filter(image=name).exists():
+                storage.delete(name)
+                result.files_removed += 1
+                result.bytes_reclaimed += size
+
+    if not dry_run:
+        recount_refs()
+        dashboard_cache.bump_many(members, 'photos')
+    return result
+
+
+def recount_refs():
+    """
+    Set every blob's ref_count from the photo rows. Returns how many were off.
+    """
+    fixed = 0
+    for blob in PhotoBlob.objects.annotate(refs=Count('photos')).exclude(ref_count=F('refs')):
+        PhotoBlob.objects.filter(pk=blob.pk).update(ref_count=blob.refs)
+        fixed += 1
+    return fixed
@@ -0,0 +1,115 @@
+# main/plan_cache.py
+import copy
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .ai_json_parser import validate_plan_json
+
+# Band widths used to bucket numeric profile fields. Members that land in the
+# same buckets (and share goal/experience) get the same generated plan.
+AGE_BAND = 5
+WEIGHT_BAND_KG = 5
+HEIGHT_BAND_CM = 5
+
+KEY_PREFIX = 'plan:v2:'   # v2: equipment is part of the fingerprint
+STATS_HITS_KEY = 'plan:stats:hits'
+STATS_MISSES_KEY = 'plan:stats:misses'
+
+
+def _cache():
+    return caches[getattr(settings, 'PLAN_CACHE_ALIAS', 'default')]
+
+
+def _ttl():
+    return getattr(settings, 'PLAN_CACHE_TTL', 0)
+
+
+def _band(value, width):
+    if value is None:
+        return 'na'
+    return str(int(value // width * width))
+
+
+def _norm(text):
+    # 'Fat  Loss' / 'fat-loss' / 'FAT LOSS' -> 'fat loss'
+    return ' '.join(re.findall(r'[a-z0-9]+', (text or '').lower())) or 'na'
+
+
+def profile_fingerprint(profile):
+    """
+    Normalized, bucketed view of the profile fields that go into the LLM prompt.
+    """
+    return '|'.join([
+        'age=' + _band(profile.age, AGE_BAND),
+        'h=' + _band(profile.height_cm, HEIGHT_BAND_CM),
+        'w=' + _band(profile.weight_kg, WEIGHT_BAND_KG),
+        'goal=' + _norm(profile.goal),
+        'exp=' + _norm(profile.experience_level),
+        'eq=' + _norm(profile.equipment or 'gym'),   # blank means the model default, a full gym
+    ])
+
+
+def cache_key(profile):
+    digest = hashlib.sha1(profile_fingerprint(profile).encode('utf-8')).hexdigest()
+    return KEY_PREFIX + digest
+
+
+def _count(key):
+    cache = _cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def get_plan(profile):
+    """
+    Return a cached plan (dict in the save_json_plan schema) for an equivalent profile, or None.
+    The 'member' block is rewritten with this member's own values.
+    """
+    ttl = _ttl()
+    if not ttl:
+        return None
+    cache = _cache()
+    key = cache_key(profile)
+    data = cache.get(key)
+    if data is None:
+        _count(STATS_MISSES_KEY)
+        return None
+    _count(STATS_HITS_KEY)
+    # sliding expiry: recently used plans outlive idle ones on backends that cull by expiry
+    cache.touch(key, ttl)
+    data = copy.deepcopy(data)
+    data['member'] = {
+        'age': profile.age,
+        'height_cm': profile.height_cm,
+        'weight_kg': profile.weight_kg,
+        'goal': profile.goal,
+    }
+    return data
+
+
+def store_plan(profile, data):
+    """
+    Cache a generated plan for every profile in the same buckets. Invalid plans are never cached.
+    """
+    ttl = _ttl()
+    if not ttl or not validate_plan_json(data)[0]:
+        return
+    _cache().set(cache_key(profile), data, timeout=ttl)
+
+
+def plan_cache_stats():
+    """
+    Returns {"hits": N, "misses": N, "hit_rate": float}
+    """
+    values = _cache().get_many([STATS_HITS_KEY, STATS_MISSES_KEY])
+    hits = values.get(STATS_HITS_KEY, 0)
+    misses = values.get(STATS_MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 3) if total else 0.0}
@@ -0,0 +1,224 @@
+# main/plan_engine.py
+"""
+Rule-based plan synthesizer.
+
+Builds a 7-day plan in the same {"member": ..., "plan": [...]} schema the LLM
+returns (and save_json_plan consumes) from template tables indexed by goal,
+experience and equipment. Every combination is rendered once at import time,
+so synthesize_plan() is a dict lookup plus one json.loads (tens of µs).
+"""
+import json
+from itertools import product
+
+GOALS = ('fat_loss', 'muscle_gain', 'general')
+LEVELS = ('beginner', 'intermediate', 'advanced')
+EQUIPMENT = ('gym', 'home', 'none')
+VARIANTS = (0, 1)
+
+# movement pattern -> muscle group it is programmed for
+MUSCLE_GROUPS = {
+    'squat': 'quads',
+    'hinge': 'hamstrings',
+    'lunge': 'glutes',
+    'push': 'chest',
+    'vpush': 'shoulders',
+    'pull': 'back',
+    'vpull': 'back',
+    'core': 'core',
+    'calf': 'calves',
+    'arms': 'arms',
+}
+
+# equipment -> movement pattern -> (variant A, variant B)
+EXERCISES = {
+    'gym': {
+        'squat': ('Back Squat', 'Leg Press'),
+        'hinge': ('Romanian Deadlift', 'Deadlift'),
+        'lunge': ('Walking Lunge', 'Bulgarian Split Squat'),
+        'push': ('Bench Press', 'Incline Dumbbell Press'),
+        'vpush': ('Overhead Press', 'Seated Dumbbell Press'),
+        'pull': ('Seated Cable Row', 'Bent-over Row'),
+        'vpull': ('Lat Pulldown', 'Pull-up'),
+        'core': ('Plank', 'Cable Crunch'),
+        'calf': ('Standing Calf Raise', 'Seated Calf Raise'),
+        'arms': ('Triceps Pushdown', 'Barbell Curl'),
+    },
+    'home': {
+        'squat': ('Goblet Squat', 'Dumbbell Front Squat'),
+        'hinge': ('Dumbbell Romanian Deadlift', 'Single-leg Romanian Deadlift'),
+        'lunge': ('Dumbbell Reverse Lunge', 'Split Squat'),
+        'push': ('Dumbbell Floor Press', 'Push-up'),
+        'vpush': ('Dumbbell Shoulder Press', 'Arnold Press'),
+        'pull': ('One-arm Dumbbell Row', 'Renegade Row'),
+        'vpull': ('Band Pulldown', 'Dumbbell Pullover'),
+        'core': ('Plank', 'Dead Bug'),
+        'calf': ('Single-leg Calf Raise', 'Calf Raise'),
+        'arms': ('Dumbbell Curl', 'Overhead Triceps Extension'),
+    },
+    'none': {
+        'squat': ('Bodyweight Squat', 'Jump Squat'),
+        'hinge': ('Glute Bridge', 'Single-leg Glute Bridge'),
+        'lunge': ('Reverse Lunge', 'Step-up'),
+        'push': ('Push-up', 'Incline Push-up'),
+        'vpush': ('Pike Push-up', 'Wall Handstand Hold'),
+        'pull': ('Towel Row', 'Superman'),
+        'vpull': ('Doorframe Row', 'Prone Y-T-W Raise'),
+        'core': ('Plank', 'Mountain Climber'),
+        'calf': ('Calf Raise', 'Pogo Hop'),
+        'arms': ('Bench Dip', 'Diamond Push-up'),
+    },
+}
+
+SESSIONS = {
+    'full_body': ('squat', 'push', 'pull', 'hinge', 'core'),
+    'upper': ('push', 'pull', 'vpush', 'vpull', 'arms'),
+    'lower': ('squat', 'hinge', 'lunge', 'calf', 'core'),
+    'push': ('push', 'vpush', 'arms', 'core'),
+    'pull': ('pull', 'vpull', 'hinge', 'arms'),
+    'legs': ('squat', 'lunge', 'hinge', 'calf'),
+}
+
+# experience -> 7-day split
+SPLITS = {
+    'beginner': ('full_body', 'cardio', 'full_body', 'rest', 'full_body', 'cardio', 'mobility'),
+    'intermediate': ('upper', 'lower', 'cardio', 'upper', 'lower', 'conditioning', 'rest'),
+    'advanced': ('push', 'pull', 'legs', 'conditioning', 'upper', 'lower', 'mobility'),
+}
+
+# (goal, experience) -> (sets, reps)
+VOLUME = {
+    ('fat_loss', 'beginner'): (3, '12-15'),
+    ('fat_loss', 'intermediate'): (3, '12-15'),
+    ('fat_loss', 'advanced'): (4, '10-15'),
+    ('muscle_gain', 'beginner'): (3, '8-12'),
+    ('muscle_gain', 'intermediate'): (4, '8-12'),
+    ('muscle_gain', 'advanced'): (4, '6-10'),
+    ('general', 'beginner'): (3, '10-12'),
+    ('general', 'intermediate'): (3, '10-12'),
+    ('general', 'advanced'): (4, '8-12'),
+}
+
+CARDIO_MINUTES = {'fat_loss': 40, 'muscle_gain': 20, 'general': 30}
+
+MEALS = {
+    'fat_loss': {
+        'breakfast': ('Egg-white omelette with spinach', 'Greek yogurt with berries', 'Oats with whey and cinnamon'),
+        'lunch': ('Grilled chicken salad', 'Tuna and bean salad', 'Turkey and vegetable wrap'),
+        'dinner': ('Baked fish with steamed vegetables', 'Chicken stir-fry (light oil)', 'Lentil soup and side salad'),
+        'snacks': ('Apple and a handful of almonds', 'Cottage cheese', 'Carrot sticks and hummus'),
+    },
+    'muscle_gain': {
+        'breakfast': ('Oats, whole eggs and banana', 'Peanut butter toast and a protein shake', 'Greek yogurt, granola and honey'),
+        'lunch': ('Chicken, rice and vegetables', 'Beef burrito bowl', 'Salmon with quinoa'),
+        'dinner': ('Lean steak with potatoes', 'Pasta with turkey mince', 'Tofu, noodles and vegetables'),
+        'snacks': ('Protein shake and a banana', 'Trail mix', 'Milk and peanut butter sandwich'),
+    },
+    'general': {
+        'breakfast': ('Oats with fruit', 'Eggs and wholegrain toast', 'Yogurt with nuts'),
+        'lunch': ('Chicken, rice and salad', 'Lentil and vegetable bowl', 'Whole-wheat sandwich with lean protein'),
+        'dinner': ('Fish, potatoes and greens', 'Vegetable curry with rice', 'Chicken and roasted vegetables'),
+        'snacks': ('Fruit', 'Nuts', 'Yogurt'),
+    },
+}
+
+
+def _normalize_goal(goal):
+    g = (goal or '').lower()
+    if 'loss' in g or 'fat' in g:
+        return 'fat_loss'
+    if 'gain' in g or 'muscle' in g:
+        return 'muscle_gain'
+    return 'general'
+
+
+def _normalize_level(level):
+    lv = (level or '').lower()
+    if lv.startswith('adv') or lv == 'pro':
+        return 'advanced'
+    if lv.startswith('inter'):
+        return 'intermediate'
+    return 'beginner'
+
+
+def _normalize_equipment(equipment):
+    eq = (equipment or '').lower()
+    return eq if eq in EQUIPMENT else 'gym'
+
+
+def _strength_day(session, goal, level, equipment, variant, senior):
+    sets, reps = VOLUME[(goal, level)]
+    note = 'controlled tempo, stop 2-3 reps short of failure' if senior else ''
+    return [
+        {
+            'name': EXERCISES[equipment][pattern][variant],
+            'sets': sets,
+            'reps': '30-45 sec' if pattern == 'core' else reps,
+            'notes': note,
+            'muscle_group': MUSCLE_GROUPS[pattern],
+        }
+        for pattern in SESSIONS[session]
+    ]
+
+
+def _workout(kind, goal, level, equipment, variant, senior):
+    if kind in SESSIONS:
+        return _strength_day(kind, goal, level, equipment, variant, senior)
+    if kind == 'cardio':
+        name = 'Brisk walk or cycling' if senior or equipment == 'none' else 'Treadmill incline walk or bike'
+        return [{'name': name, 'sets': 1, 'reps': f"{CARDIO_MINUTES[goal]} min",
+                 'notes': 'conversational pace', 'muscle_group': 'cardio'}]
+    if kind == 'conditioning':
+        if senior:
+            return [{'name': 'Low-impact intervals (bike or elliptical)', 'sets': 8, 'reps': '30 sec on / 60 sec off',
+                     'notes': '', 'muscle_group': 'cardio'}]
+        return [{'name': 'HIIT intervals', 'sets': 10, 'reps': '30 sec on / 30 sec off',
+                 'notes': 'burpees, squat jumps or bike sprints', 'muscle_group': 'cardio'}]
+    if kind == 'mobility':
+        return [{'name': 'Mobility flow', 'sets': 1, 'reps': '20 min', 'notes': 'hips, thoracic spine, shoulders',
+                 'muscle_group': 'mobility'},
+                {'name': 'Foam rolling', 'sets': 1, 'reps': '10 min', 'notes': '', 'muscle_group': 'mobility'}]
+    return [{'name': 'Rest day', 'sets': None, 'reps': '', 'notes': 'light walk and stretching',
+             'muscle_group': 'rest'}]
+
+
+def _render(goal, level, equipment, variant, senior):
+    plan = []
+    for index, kind in enumerate(SPLITS[level]):
+        day = index + 1
+        meals = MEALS[goal]
+        diet = {slot: options[(index + variant) % len(options)] for slot, options in meals.items()}
+        plan.append({
+            'day': day,
+            'workout': _workout(kind, goal, level, equipment, variant, senior),
+            'diet': diet,
+        })
+    return json.dumps(plan)
+
+
+# every (goal, experience, equipment, variant, senior) combination, pre-rendered
+_PLANS = {
+    key: _render(*key)
+    for key in product(GOALS, LEVELS, EQUIPMENT, VARIANTS, (False, True))
+}
+
+
+def synthesize_plan(profile):
+    """
+    Personalized 7-day plan for a MemberProfile in the save_json_plan schema.
+    """
+    key = (
+        _normalize_goal(profile.goal),
+        _normalize_level(profile.experience_level),
+        _normalize_equipment(getattr(profile, 'equipment', '')),
+        (profile.id or 0) % len(VARIANTS),  # alternate exercise variants between members
+        bool(profile.age and profile.age >= 50),
+    )
+    return {
+        'member': {
+            'age': profile.age,
+            'height_cm': profile.height_cm,
+            'weight_kg': profile.weight_kg,
+            'goal': profile.goal or 'General Fitness',
+        },
+        'plan': json.loads(_PLANS[key]),
+    }
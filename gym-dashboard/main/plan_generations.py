@@ -0,0 +1,42 @@
+# main/plan_generations.py
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PlanGeneration
+from .member_stats import plan_promoted
+from .achievements import member_event
+from . import dashboard_cache
+
+
+def start_generation(profile, source=''):
+    """
+    Create a 'building' generation. Its rows stay invisible on the dashboard until promote_generation().
+    """
+    return PlanGeneration.objects.create(member=profile, source=source)
+
+
+def promote_generation(generation):
+    """
+    Make `generation` the member's current plan and supersede the previous one.
+    Must run inside the same transaction that writes the generation's rows.
+    """
+    now = timezone.now()
+    (PlanGeneration.objects
+        .filter(member_id=generation.member_id, status=PlanGeneration.STATUS_CURRENT)
+        .exclude(id=generation.id)
+        .update(status=PlanGeneration.STATUS_SUPERSEDED, superseded_at=now))
+    generation.status = PlanGeneration.STATUS_CURRENT
+    generation.save(update_fields=['status'])
+    plan_promoted(generation.member_id)
+    member_event(generation.member_id, 'plans')
+    # plan rows are bulk-created (no signals), so invalidate the plans fragment here
+    dashboard_cache.bump(generation.member_id, 'plans')
+    return generation
+
+
+def discard_generation(generation):
+    """
+    Drop a generation that never became current (e.g. a stream that failed midway), with its rows.
+    """
+    with transaction.atomic():
+        PlanGeneration.objects.filter(id=generation.id, status=PlanGeneration.STATUS_BUILDING).delete()
@@ -0,0 +1,224 @@
+# main/plan_jobs.py
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import PlanJob, WorkoutPlan
+from .ai_utils import generate_plans, stream_plans
+from .ai_json_parser import save_json_plan, save_plan_day, finish_streamed_plan
+from .plan_generations import start_generation, promote_generation, discard_generation
+
+logger = logging.getLogger(__name__)
+
+
+ACTIVE_STATUSES = (PlanJob.STATUS_QUEUED, PlanJob.STATUS_RUNNING)
+
+
+def active_job(profile):
+    return PlanJob.objects.filter(member=profile, status__in=ACTIVE_STATUSES).order_by('-id').first()
+
+
+def enqueue_plan_job(profile):
+    """
+    Queue a plan generation for the member and return the PlanJob.
+    If the member already has a queued/running job (double-click, refresh),
+    that job is returned instead, so concurrent requests share one generation.
+    With settings.PLAN_JOBS_EAGER the job runs inline (handy for dev/tests).
+    """
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                job = PlanJob.objects.create(member=profile)
+            break
+        except IntegrityError:
+            # planjob_one_active_per_member: someone else queued first
+            job = active_job(profile)
+            if job is not None:
+                return job
+    else:
+        raise RuntimeError(f"Could not queue a plan job for member {profile.id}")
+    if getattr(settings, 'PLAN_JOBS_EAGER', False):
+        job = claim_job(job.id) or job
+        if job.status == PlanJob.STATUS_RUNNING:
+            run_job(job)
+    return job
+
+
+def claim_job(job_id):
+    """
+    Atomically move a queued job to running. Returns the job or None if
+    another worker got there first. A conditional UPDATE works on every
+    backend (sqlite has no SELECT ... FOR UPDATE SKIP LOCKED).
+    """
+    claimed = PlanJob.objects.filter(id=job_id, status=PlanJob.STATUS_QUEUED).update(
+        status=PlanJob.STATUS_RUNNING,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return None
+    return PlanJob.objects.select_related('member__user').get(id=job_id)
+
+
+def enqueue_batch(batch, profiles):
+    """
+    Queue one job per member for a named bulk run. Members that already have a
+    job in this batch are skipped, so re-running a batch resumes it; members
+    with another job in flight are skipped too (it already regenerates them).
+    Returns number of jobs created.
+    """
+    in_batch = PlanJob.objects.filter(batch=batch)
+    before = in_batch.count()
+    already = set(in_batch.values_list('member_id', flat=True))
+    jobs = [PlanJob(member=p, batch=batch) for p in profiles if p.id not in already]
+    PlanJob.objects.bulk_create(jobs, batch_size=500, ignore_conflicts=True)
+    return in_batch.count() - before
+
+
+def claim_next_job(batch=None):
+    """
+    Claim the oldest queued job (optionally only from one batch), retrying if
+    we lose a race. Returns None when the queue is empty.
+    """
+    queued = PlanJob.objects.filter(status=PlanJob.STATUS_QUEUED)
+    if batch is not None:
+        queued = queued.filter(batch=batch)
+    while True:
+        job_id = (
+            queued
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        job = claim_job(job_id)
+        if job is not None:
+            return job
+
+
+def _claimed(job):
+    """
+    The job's row while it is still running under this claim. requeue_stale_jobs()
+    may have put it back and another worker claimed it since (new started_at).
+    """
+    return PlanJob.objects.filter(id=job.id, status=PlanJob.STATUS_RUNNING, started_at=job.started_at)
+
+
+def requeue_stale_jobs(older_than, batch=None):
+    """
+    Put 'running' jobs whose worker died (started longer than `older_than` seconds ago) back in the queue.
+    The 'building' generation a streaming run had started goes with it, rows and all.
+    Returns number of jobs requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    running = PlanJob.objects.filter(status=PlanJob.STATUS_RUNNING, started_at__lt=cutoff)
+    if batch is not None:
+        running = running.filter(batch=batch)
+    requeued = 0
+    for job in running.select_related('generation'):
+        with transaction.atomic():
+            if not _claimed(job).update(status=PlanJob.STATUS_QUEUED, started_at=None, generation=None,
+                                        days_completed=0):
+                continue   # finished (or requeued elsewhere) since we looked
+            if job.generation is not None:
+                discard_generation(job.generation)
+        requeued += 1
+    return requeued
+
+
+def save_plan_response(profile, resp):
+    """
+    Persist a generate_plans() response.
+    Returns (created_workouts, message).
+    """
+    if resp.get('type') == 'json':
+        source = 'cached' if resp.get('cached') else resp.get('source', 'llm')
+        created = save_json_plan(profile, resp.get('data'), source=source)
+        if resp.get('source') == 'rules':
+            return created, f"Plan generated and saved ({len(created)} workout entries)."
+        if resp.get('source') == 'fallback':
+            return created, f"AI unavailable — saved a rule-based plan ({len(created)} workout entries)."
+        if resp.get('repaired'):
+            return created, f"AI plan was cut off — saved the {len(created)} complete day(s)."
+        return created, f"AI JSON plan generated and saved ({len(created)} workout entries)."
+    # Unknown response shape
+    with transaction.atomic():
+        generation = start_generation(profile, source='unknown')
+        wp = WorkoutPlan.objects.create(member=profile, generation=generation,
+                                        title='AI Plan (unknown)', content=str(resp))
+        promote_generation(generation)
+    return [wp], "AI returned unexpected format — saved raw response."
+
+
+def _generate_and_save(job, attempt):
+    """
+    Returns (created_workouts, message); attempt['resp'] keeps the raw response
+    for error reporting. When settings.PLAN_STREAMING is on, each day's
+    WorkoutPlan is saved into a 'building' generation as soon as it arrives and
+    job.days_completed is bumped so the SSE endpoint can push it to the
+    dashboard; the generation only becomes current once the stream is done.
+    """
+    profile = job.member
+    if not getattr(settings, 'PLAN_STREAMING', False):
+        resp = attempt['resp'] = generate_plans(profile)
+        return save_plan_response(profile, resp)
+
+    saved = []
+
+    def on_day(item):
+        if attempt.get('generation') is None:
+            attempt['generation'] = start_generation(profile, source='llm')
+            # linked right away, so requeue_stale_jobs() can discard it if this worker dies
+            if not _claimed(job).update(generation=attempt['generation']):
+                raise RuntimeError("Plan job was requeued while streaming")
+        saved.append(save_plan_day(profile, item, len(saved) + 1, attempt['generation']))
+        if not _claimed(job).update(days_completed=len(saved)):
+            raise RuntimeError("Plan job was requeued while streaming")
+
+    resp = attempt['resp'] = stream_plans(profile, on_day)
+    if resp.get('type') == 'json' and saved:
+        finish_streamed_plan(profile, attempt['generation'], resp['data'].get('plan') or [])
+        if resp.get('repaired'):
+            return saved, f"AI plan was cut off — saved the {len(saved)} complete day(s)."
+        return saved, f"AI JSON plan generated and saved ({len(saved)} workout entries)."
+    return save_plan_response(profile, resp)
+
+
+def run_job(job):
+    """
+    Generate and save the plan for a claimed job, recording the outcome on the job row.
+    A failed job leaves the member's current plan untouched.
+    """
+    attempt = {'resp': {}, 'generation': None}
+    try:
+        created, message = _generate_and_save(job, attempt)
+    except Exception as e:
+        logger.exception("Plan job %s failed", job.id)
+        if attempt['generation'] is not None:
+            # don't leave a partial week behind
+            discard_generation(attempt['generation'])
+        job.status = PlanJob.STATUS_FAILED
+        job.error = str(e)
+        job.message = "Failed to generate/save plan."
+        job.generation = None
+    else:
+        job.status = PlanJob.STATUS_DONE
+        job.tokens = attempt['resp'].get('tokens') or 0
+        job.created_count = len(created)
+        job.days_completed = len(created)
+        job.generation = created[0].generation if created else None
+        job.message = message
+    job.finished_at = timezone.now()
+    fields = ['status', 'error', 'message', 'created_count', 'days_completed', 'tokens', 'generation', 'finished_at']
+    # compare-and-set like claim_job(): a worker whose job was requeued must not overwrite the new run
+    if not _claimed(job).update(**{field: getattr(job, field) for field in fields}):
+        logger.warning("Plan job %s was requeued while this worker ran it; dropping its result", job.id)
+        if job.generation is not None:
+            discard_generation(job.generation)   # only removes it if it never became current
+        job.refresh_from_db()
+    return job
@@ -0,0 +1,41 @@
+# main/plan_queries.py
+"""
+Queries over the structured plan tables (PlanDay / ExerciseEntry / MealEntry).
+Only each member's current PlanGeneration counts as "programmed". Served to
+admins by views.plan_report (ops/plan-report/).
+"""
+from django.db.models import Sum
+
+from .models import Exercise, ExerciseEntry, MemberProfile, PlanGeneration
+
+
+def members_programmed(exercise):
+    """
+    Members whose current plan contains an exercise matching `exercise`
+    ('squat' matches Back Squat, Goblet Squat, ...).
+    """
+    exercise_ids = Exercise.objects.filter(name__icontains=exercise).values('id')
+    return MemberProfile.objects.filter(
+        plan_days__generation__status=PlanGeneration.STATUS_CURRENT,
+        plan_days__exercises__exercise__in=exercise_ids,
+    ).distinct()
+
+
+def weekly_sets_by_muscle_group(member=None):
+    """
+    {muscle_group: total sets} over the current plans (one plan = one week),
+    for one member or for everyone.
+    """
+    entries = ExerciseEntry.objects.filter(
+        plan_day__generation__status=PlanGeneration.STATUS_CURRENT,
+        sets__isnull=False,
+    )
+    if member is not None:
+        entries = entries.filter(plan_day__member=member)
+    rows = (
+        entries
+        .values('exercise__muscle_group')
+        .annotate(total_sets=Sum('sets'))
+        .order_by('exercise__muscle_group')
+    )
+    return {row['exercise__muscle_group'] or 'other': row['total_sets'] for row in rows}
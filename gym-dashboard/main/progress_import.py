@@ -0,0 +1,169 @@
+# main/progress_import.py
+"""
+Bulk import of a member's progress history from CSV or NDJSON.
+
+The file is parsed as a stream and written in chunks, so memory stays
+bounded by the chunk size whatever the file size. Rows are validated with
+the fields of ProgressEnteryForm (the add_progress rules) and upserted on
+(member, date) with bulk_create(update_conflicts=True). As in add_progress,
+blank values keep what is stored for that day, and a later row for the same
+date wins. Each chunk commits on its own, so an interrupted import can be
+re-run safely.
+
+CSV needs a header row naming the columns: date, weight_kg, body_fat_pct,
+notes. NDJSON is one JSON object per line with the same keys.
+"""
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import date
+
+from django import forms
+from django.db import transaction
+
+from .forms import ProgressEnteryForm
+from .member_stats import rebuild_member_stats
+from .models import Progress
+
+FORMATS = ('csv', 'ndjson')
+CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+@dataclass
+class ImportResult:
+    rows_read: int = 0
+    rows_written: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)   # (line, message), first MAX_REPORTED_ERRORS only
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self):
+        return {
+            'rows_read': self.rows_read,
+            'rows_written': self.rows_written,
+            'error_count': self.error_count,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+        }
+
+
+def _text(stream):
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    # utf-8-sig drops the BOM spreadsheet exports like to add
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def detect_format(name):
+    return 'ndjson' if name.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def iter_rows(stream, fmt='csv'):
+    """
+    Yields (line_number, dict_or_error_message) from a CSV or NDJSON stream.
+    """
+    text = _text(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:
+            return
+        missing = {'date'} - {name.strip() for name in reader.fieldnames}
+        if missing:
+            raise ValueError("CSV header must include a 'date' column")
+        for row in reader:
+            yield reader.line_num, {(k or '').strip(): v for k, v in row.items()}
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"invalid JSON: {e}"
+                continue
+            yield line_number, row if isinstance(row, dict) else "expected a JSON object"
+    else:
+        raise ValueError(f"unknown format {fmt!r}; expected one of: {', '.join(FORMATS)}")
+
+
+def clean_row(row, form_fields=ProgressEnteryForm.base_fields):
+    """
+    (date, {field: value}) for the non-blank values of one row, cleaned by
+    the add_progress form's fields. Raises forms.ValidationError.
+    """
+    cleaned = {}
+    for name, form_field in form_fields.items():
+        value = row.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        if name == 'date' and isinstance(value, str) and ISO_DATE.fullmatch(value):
+            # the form's first input format, minus its per-row locale lookup;
+            # impossible dates fall through to the form field for its message
+            try:
+                value = date.fromisoformat(value)
+            except ValueError:
+                pass
+        try:
+            value = form_field.clean(value)
+        except forms.ValidationError as e:
+            raise forms.ValidationError(f"{name}: {' '.join(e.messages)}")
+        if value not in (None, ''):
+            cleaned[name] = value
+    return cleaned.pop('date'), cleaned
+
+
+def _write_chunk(member_id, chunk):
+    """
+    Upsert one chunk ({date: values}). Rows are grouped by which fields they
+    set, so blank values never overwrite stored ones.
+    """
+    groups = {}
+    for day, values in chunk.items():
+        groups.setdefault(tuple(sorted(values)), []).append(
+            Progress(member_id=member_id, date=day, **values))
+    with transaction.atomic():
+        for present, rows in groups.items():
+            Progress.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['member', 'date'],
+                update_fields=[*present, 'updated_at'],
+            )
+    return len(chunk)
+
+
+def import_progress(member_id, stream, fmt='csv', chunk_size=CHUNK_SIZE):
+    """
+    Import a CSV/NDJSON stream into a member's Progress. Returns an ImportResult.
+    Raises ValueError when the file itself is unusable (unknown format, no date column).
+    """
+    result = ImportResult()
+    chunk = {}
+    for line_number, row in iter_rows(stream, fmt):
+        result.rows_read += 1
+        if isinstance(row, str):
+            result.add_error(line_number, row)
+            continue
+        try:
+            day, values = clean_row(row)
+        except forms.ValidationError as e:
+            result.add_error(line_number, ' '.join(e.messages))
+            continue
+        # a later row for the same day wins, and blank values leave earlier ones alone
+        chunk[day] = dict(chunk.get(day, {}), **values)
+        if len(chunk) >= chunk_size:
+            result.rows_written += _write_chunk(member_id, chunk)
+            chunk = {}
+    if chunk:
+        result.rows_written += _write_chunk(member_id, chunk)
+    if result.rows_written:
+        # bulk writes skip the signals; bring the snapshot, badges and caches up to date
+        rebuild_member_stats([member_id])
+    return result
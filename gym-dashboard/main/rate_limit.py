@@ -0,0 +1,96 @@
+# main/rate_limit.py
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class RateLimiter:
+    """
+    Requests-per-minute / tokens-per-minute limiter (two token buckets refilled
+    continuously). A limit of 0 or None means unlimited.
+
+    The buckets live in a Django cache, like main.resilience.CircuitBreaker, so
+    every process using the same limiter name and a shared cache backend draws
+    on one budget; with a local-memory cache each process has its own.
+    """
+    STATE_TIMEOUT = 120   # an idle minute refills both buckets anyway
+    LOCK_TIMEOUT = 5      # a holder that died mid-update can't block the others for longer
+
+    def __init__(self, name, rpm=None, tpm=None, cache_alias=None):
+        self.name = name
+        self._rpm = rpm
+        self._tpm = tpm
+        self._cache_alias = cache_alias
+        self.key = f'ratelimit:{name}'
+        self.lock_key = f'ratelimit:{name}:lock'
+
+    @property
+    def rpm(self):
+        return (self._rpm if self._rpm is not None else getattr(settings, 'LLM_RPM', 0)) or 0
+
+    @property
+    def tpm(self):
+        return (self._tpm if self._tpm is not None else getattr(settings, 'LLM_TPM', 0)) or 0
+
+    @property
+    def cache_alias(self):
+        return self._cache_alias or getattr(settings, 'LLM_RATE_LIMIT_CACHE_ALIAS', 'default')
+
+    @property
+    def _cache(self):
+        return caches[self.cache_alias]
+
+    @contextmanager
+    def _locked(self):
+        # add() is atomic on every backend, so it doubles as a cross-process mutex
+        while not self._cache.add(self.lock_key, 1, timeout=self.LOCK_TIMEOUT):
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self._cache.delete(self.lock_key)
+
+    def _refill(self, state, now, rpm, tpm):
+        elapsed = max(0.0, now - state['updated'])
+        state['updated'] = now
+        if rpm:
+            state['requests'] = min(rpm, state['requests'] + elapsed * rpm / 60.0)
+        if tpm:
+            state['tokens'] = min(tpm, state['tokens'] + elapsed * tpm / 60.0)
+        return state
+
+    def acquire(self, tokens=0):
+        """
+        Block until one request and `tokens` tokens fit in the budget.
+        Returns the number of seconds spent waiting.
+        """
+        rpm, tpm = self.rpm, self.tpm
+        if not rpm and not tpm:
+            return 0.0
+        # a single request larger than the whole budget would never fit
+        tokens = min(tokens, tpm) if tpm else 0
+        waited = 0.0
+        while True:
+            with self._locked():
+                now = time.time()
+                state = self._cache.get(self.key) or {'requests': float(rpm), 'tokens': float(tpm), 'updated': now}
+                state = self._refill(state, now, rpm, tpm)
+                wait = 0.0
+                if rpm and state['requests'] < 1:
+                    wait = max(wait, (1 - state['requests']) * 60.0 / rpm)
+                if tpm and state['tokens'] < tokens:
+                    wait = max(wait, (tokens - state['tokens']) * 60.0 / tpm)
+                if wait == 0.0:
+                    if rpm:
+                        state['requests'] -= 1
+                    if tpm:
+                        state['tokens'] -= tokens
+                    self._cache.set(self.key, state, timeout=self.STATE_TIMEOUT)
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+    def reset(self):
+        self._cache.delete_many([self.key, self.lock_key])
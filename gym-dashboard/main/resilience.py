@@ -0,0 +1,124 @@
+# main/resilience.py
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# backends whose entries only the current process can see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_scope(alias):
+    """
+    'process' if state kept in cache `alias` is private to this process, else 'shared'.
+    """
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    return 'process' if backend in PROCESS_LOCAL_CACHES else 'shared'
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker whose state lives in a Django cache, so web and worker
+    processes share it when the cache backend is shared (file/DB/redis).
+
+    closed    -> calls go through; `failure_threshold` consecutive failures open it
+    open      -> calls are refused until `reset_timeout` seconds have passed
+    half_open -> exactly one probe call is let through; success closes the
+                 circuit, failure opens it again
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None, cache_alias=None):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._cache_alias = cache_alias
+        self.key = f'circuit:{name}'
+        self.probe_key = f'circuit:{name}:probe'
+
+    @property
+    def failure_threshold(self):
+        return self._failure_threshold or getattr(settings, 'LLM_BREAKER_FAILURES', 5)
+
+    @property
+    def reset_timeout(self):
+        return self._reset_timeout or getattr(settings, 'LLM_BREAKER_RESET_TIMEOUT', 30)
+
+    @property
+    def cache_alias(self):
+        return self._cache_alias or getattr(settings, 'LLM_BREAKER_CACHE_ALIAS', 'default')
+
+    @property
+    def _cache(self):
+        return caches[self.cache_alias]
+
+    def _load(self):
+        return self._cache.get(self.key) or {'state': self.CLOSED, 'failures': 0, 'opened_at': None}
+
+    def _store(self, data):
+        self._cache.set(self.key, data, timeout=None)
+
+    def allow(self):
+        """
+        True if the caller may make the protected call now.
+        """
+        data = self._load()
+        if data['state'] == self.CLOSED:
+            return True
+        if data['state'] == self.OPEN and time.time() - data['opened_at'] < self.reset_timeout:
+            return False
+        # open long enough (or already half-open): let exactly one probe through
+        if not self._cache.add(self.probe_key, 1, timeout=self.reset_timeout):
+            return False
+        if data['state'] != self.HALF_OPEN:
+            logger.warning("Circuit %s half-open, probing", self.name)
+            self._store(dict(data, state=self.HALF_OPEN))
+        return True
+
+    def record_success(self):
+        data = self._load()
+        if data['state'] != self.CLOSED or data['failures']:
+            if data['state'] != self.CLOSED:
+                logger.warning("Circuit %s closed", self.name)
+            self._store({'state': self.CLOSED, 'failures': 0, 'opened_at': None})
+            self._cache.delete(self.probe_key)
+
+    def record_failure(self):
+        data = self._load()
+        failures = data['failures'] + 1
+        if data['state'] == self.HALF_OPEN or failures >= self.failure_threshold:
+            if data['state'] != self.OPEN:
+                logger.warning("Circuit %s opened after %s failure(s)", self.name, failures)
+            self._store({'state': self.OPEN, 'failures': failures, 'opened_at': time.time()})
+            self._cache.delete(self.probe_key)
+        else:
+            self._store(dict(data, failures=failures))
+
+    def snapshot(self):
+        """
+        Current state for monitoring: {"name", "state", "failures", "retry_in",
+        "scope"}; scope 'process' means this is only the current process's breaker.
+        """
+        data = self._load()
+        retry_in = None
+        if data['state'] == self.OPEN:
+            retry_in = max(0.0, round(data['opened_at'] + self.reset_timeout - time.time(), 1))
+        return {
+            'name': self.name,
+            'state': data['state'],
+            'failures': data['failures'],
+            'failure_threshold': self.failure_threshold,
+            'retry_in': retry_in,
+            'scope': cache_scope(self.cache_alias),
+        }
+
+    def reset(self):
+        self._cache.delete_many([self.key, self.probe_key])
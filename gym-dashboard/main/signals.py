@@ -1,7 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import MemberProfile
+from .models import DietPlan, MemberProfile, MemberStats, PlanGeneration, Progress, ProgressPhoto, WorkoutPlan
+from . import achievements, dashboard_cache, member_stats, photo_store
 
 @receiver(post_save, sender=User)
 def create_member_profile(sender, instance, created, **kwargs):
@@ -15,3 +17,67 @@ def save_member_profile(sender, instance, **kwargs):
         instance.memberprofile.save()
     except MemberProfile.DoesNotExist:
         MemberProfile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=MemberProfile)
+def update_stats_for_profile(sender, instance, created, **kwargs):
+    if created:
+        MemberStats.objects.get_or_create(member=instance)
+    else:
+        achievements.evaluate(member_stats.profile_changed(instance), 'profile')
+
+@receiver(post_save, sender=Progress)
+def update_stats_for_progress_save(sender, instance, created, **kwargs):
+    member_stats.progress_changed([instance.member_id])
+    if created:
+        stats = member_stats.progress_added(instance)
+    else:
+        stats = member_stats.refresh_member_stats(instance.member_id)
+    achievements.evaluate(stats, 'progress')
+
+@receiver(post_delete, sender=Progress)
+def update_stats_for_progress_delete(sender, instance, origin=None, **kwargs):
+    # cascades from a deleted member/user take the MemberStats row with them
+    if isinstance(origin, (Progress, QuerySet)) and getattr(origin, 'model', Progress) is Progress:
+        member_stats.progress_changed([instance.member_id])
+        achievements.evaluate(member_stats.refresh_member_stats(instance.member_id), 'progress')
+
+@receiver(post_save, sender=WorkoutPlan)
+def update_stats_for_plan_save(sender, instance, created, **kwargs):
+    # plans are usually bulk-created into a generation; promote_generation() covers those
+    if instance.generation_id and instance.generation.status == PlanGeneration.STATUS_CURRENT:
+        member_stats.plan_promoted(instance.member_id)
+        achievements.member_event(instance.member_id, 'plans')
+
+@receiver(post_delete, sender=WorkoutPlan)
+def update_stats_for_plan_delete(sender, instance, **kwargs):
+    member_stats.plans_changed(instance.member_id)
+    achievements.member_event(instance.member_id, 'plans')
+
+@receiver(pre_save, sender=ProgressPhoto)
+def store_photo_by_content(sender, instance, **kwargs):
+    # duplicate uploads share one file (main/photo_store.py)
+    photo_store.store_photo_image(instance)
+
+@receiver(post_delete, sender=ProgressPhoto)
+def release_photo_files(sender, instance, **kwargs):
+    photo_store.photo_deleted(instance)
+
+
+# dashboard fragment versions (main/dashboard_cache.py)
+@receiver([post_save, post_delete], sender=Progress)
+def bump_progress_fragments(sender, instance, **kwargs):
+    dashboard_cache.bump(instance.member_id, 'progress')
+
+@receiver([post_save, post_delete], sender=WorkoutPlan)
+@receiver([post_save, post_delete], sender=DietPlan)
+def bump_plan_fragments(sender, instance, **kwargs):
+    dashboard_cache.bump(instance.member_id, 'plans')
+
+@receiver([post_save, post_delete], sender=ProgressPhoto)
+def bump_photo_fragments(sender, instance, **kwargs):
+    dashboard_cache.bump(instance.member_id, 'photos')
+
+@receiver([post_save, post_delete], sender=MemberProfile)
+def bump_profile_fragments(sender, instance, **kwargs):
+    dashboard_cache.bump(instance.pk, 'profile')
@@ -0,0 +1,72 @@
+# main/stream_parser.py
+import json
+import re
+
+PLAN_KEY_REGEX = re.compile(r'"plan"\s*:\s*$')
+
+
+class PlanStreamParser:
+    """
+    Incremental scanner for a streamed plan JSON document.
+
+    feed() takes the next chunk of model output and returns the `plan[i]` day
+    objects that were completed by it, so each day can be saved as soon as its
+    closing brace arrives instead of waiting for the whole document.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._plan_depth = None   # stack depth of the "plan" array once opened
+        self._day_start = None
+        self.days = []
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                if ch == '[' and self._stack == ['{'] and self._plan_depth is None \
+                        and PLAN_KEY_REGEX.search(text, 0, i):
+                    self._plan_depth = 2
+                if ch == '{' and self._plan_depth is not None and len(self._stack) == self._plan_depth:
+                    self._day_start = i
+                self._stack.append(ch)
+            elif ch in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if ch == '}' and self._day_start is not None and len(self._stack) == self._plan_depth:
+                    day = self._decode(text[self._day_start:i + 1])
+                    self._day_start = None
+                    if day is not None:
+                        completed.append(day)
+                elif ch == ']' and self._plan_depth is not None and len(self._stack) < self._plan_depth:
+                    # plan array closed; ignore any later arrays
+                    self._plan_depth = -1
+        self._pos = len(text)
+        self.days.extend(completed)
+        return completed
+
+    @staticmethod
+    def _decode(snippet):
+        try:
+            day = json.loads(snippet)
+        except json.JSONDecodeError:
+            return None
+        return day if isinstance(day, dict) else None
@@ -1,3 +1,1894 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from unittest.mock import patch
+from urllib.parse import unquote, urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .dashboard_cache import dashboard_cache_stats
+from .achievements import reevaluate_achievements
+from .json_repair import parse_plan_output
+from .member_stats import rebuild_member_stats
+from .models import (MemberAchievement, MemberProfile, MemberStats, Payment, PhotoBlob, PhotoUpload, PlanDay,
+                     PlanGeneration, PlanJob, Progress, ProgressPhoto, WorkoutPlan)
+from . import llm, plan_cache
+from .ai_json_parser import save_json_plan, validate_plan_json
+from .ai_utils import build_plan_messages, generate_plans
+from .plan_engine import EXERCISES, synthesize_plan
+from .plan_generations import promote_generation, start_generation
+from .plan_jobs import claim_job, claim_next_job, enqueue_plan_job, requeue_stale_jobs, run_job
+from .progress_import import import_progress
+from .rate_limit import RateLimiter
+from .resilience import CircuitBreaker
+from .stream_parser import PlanStreamParser
+from .chunked_uploads import UploadError, part_path, start_upload, write_chunk
+from .photo_renditions import process_photo
+
+from PIL import Image
+
+
+class DashboardQueryBudgetTests(TestCase):
+    """
+    The dashboard must cost the same number of queries (and stay fast) no
+    matter how much progress history a member has.
+    """
+    QUERY_BUDGET = 7       # session, user, profile+aggregates, plans, last 7 days, photos, badges
+    MAX_SECONDS = 1.0
+    HISTORY_DAYS = 10000   # ~27 years of daily logs
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        cls.heavy = User.objects.create_user('heavy', password='pw')
+        profile = cls.heavy.memberprofile
+        profile.height_cm = 180
+        profile.weight_kg = 90
+        profile.goal = 'Fat Loss'
+        profile.save()
+        Progress.objects.bulk_create(
+            [Progress(member=profile, date=today - timedelta(days=i), weight_kg=80 + i * 0.001)
+             for i in range(cls.HISTORY_DAYS)],
+            batch_size=1000,
+        )
+
+        cls.light = User.objects.create_user('light', password='pw')
+        Progress.objects.bulk_create(
+            [Progress(member=cls.light.memberprofile, date=today - timedelta(days=i), weight_kg=70)
+             for i in range(3)],
+        )
+        # bulk_create skips the signals that maintain MemberStats
+        rebuild_member_stats()
+
+    def setUp(self):
+        cache.clear()
+
+    def _get_dashboard(self, user):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.get(reverse('dashboard'))
+            elapsed = time.perf_counter() - start
+        self.assertEqual(response.status_code, 200)
+        return response, queries, elapsed
+
+    def test_query_budget(self):
+        _, queries, _ = self._get_dashboard(self.heavy)  # cold fragment cache
+        self.assertLessEqual(len(queries), self.QUERY_BUDGET,
+                             "\n".join(q['sql'] for q in queries.captured_queries))
+
+    def test_query_count_independent_of_history(self):
+        _, heavy_queries, _ = self._get_dashboard(self.heavy)
+        _, light_queries, _ = self._get_dashboard(self.light)
+        self.assertEqual(len(heavy_queries), len(light_queries))
+
+    def test_no_query_reads_whole_history(self):
+        _, queries, _ = self._get_dashboard(self.heavy)
+        for q in queries.captured_queries:
+            sql = q['sql']
+            if 'FROM "main_progress"' in sql and 'LIMIT' not in sql and 'COUNT(' not in sql:
+                self.assertIn('BETWEEN', sql, f"unbounded progress query: {sql}")
+
+    def test_response_time_ceiling(self):
+        self._get_dashboard(self.heavy)  # warm template/url caches
+        _, _, elapsed = self._get_dashboard(self.heavy)
+        self.assertLess(elapsed, self.MAX_SECONDS)
+
+    def test_aggregates(self):
+        response, _, _ = self._get_dashboard(self.heavy)
+        ctx = response.context
+        self.assertAlmostEqual(ctx['start_weight'], 80 + (self.HISTORY_DAYS - 1) * 0.001)
+        self.assertEqual(ctx['current_weight'], 80)
+        self.assertAlmostEqual(ctx['weight_change'], -(self.HISTORY_DAYS - 1) * 0.001)
+        self.assertTrue(all(day['active'] for day in ctx['weekly_activity']))
+        self.assertContains(response, "Committed: 30+ progress logs")
+
+
+class MemberStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('member', password='pw')
+        self.profile = self.user.memberprofile
+        self.profile.height_cm = 200
+        self.profile.save()
+        self.today = timezone.now().date()
+
+    def log(self, days_ago, weight):
+        return Progress.objects.create(member=self.profile, date=self.today - timedelta(days=days_ago),
+                                       weight_kg=weight)
+
+    def stats(self):
+        return MemberStats.objects.get(pk=self.profile.pk)
+
+    def assertMatchesRebuild(self):
+        incremental = self.stats()
+        rebuild_member_stats([self.profile.pk])
+        rebuilt = self.stats()
+        fields = ['entry_count', 'first_entry_date', 'first_weight_kg', 'last_entry_date', 'last_weight_kg',
+                  'current_streak', 'bmi', 'has_plan']
+        self.assertEqual([getattr(incremental, f) for f in fields], [getattr(rebuilt, f) for f in fields])
+
+    def test_appends_are_incremental(self):
+        self.log(2, 100)
+        self.log(1, 99)
+        self.log(0, 98)
+        stats = self.stats()
+        self.assertEqual((stats.entry_count, stats.first_weight_kg, stats.last_weight_kg), (3, 100, 98))
+        self.assertEqual(stats.current_streak, 3)
+        self.assertEqual(stats.bmi, 24.5)
+        self.assertMatchesRebuild()
+
+    def test_backdated_edited_and_deleted_entries(self):
+        self.log(0, 98)
+        self.log(3, 101)
+        middle = self.log(1, 99)
+        self.assertEqual(self.stats().current_streak, 2)
+        self.log(2, 100)
+        self.assertEqual(self.stats().current_streak, 4)
+        middle.weight_kg = 95
+        middle.save()
+        middle.delete()
+        stats = self.stats()
+        self.assertEqual((stats.entry_count, stats.current_streak), (3, 1))
+        self.assertMatchesRebuild()
+
+    def test_profile_height_moves_bmi(self):
+        self.log(0, 100)
+        self.profile.height_cm = 100
+        self.profile.save()
+        self.assertEqual(self.stats().bmi, 100.0)
+
+    def test_deleting_member_removes_stats(self):
+        self.log(0, 100)
+        self.user.delete()
+        self.assertFalse(MemberStats.objects.exists())
+
+
+class ProgressUpsertTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('upsert', password='pw')
+        self.profile = self.user.memberprofile
+        self.client.force_login(self.user)
+        self.today = timezone.now().date()
+
+    def post(self, **data):
+        return self.client.post(reverse('add_progress'), dict({'date': self.today.isoformat()}, **data))
+
+    def test_same_day_updates_the_entry(self):
+        self.post(weight_kg=80, body_fat_pct=20)
+        self.post(weight_kg=79.5)
+        entry = Progress.objects.get(member=self.profile)
+        self.assertEqual((entry.weight_kg, entry.body_fat_pct), (79.5, 20))
+        stats = MemberStats.objects.get(pk=self.profile.pk)
+        self.assertEqual((stats.entry_count, stats.last_weight_kg), (1, 79.5))
+
+    def test_duplicate_day_is_rejected_by_the_database(self):
+        Progress.objects.create(member=self.profile, date=self.today, weight_kg=80)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Progress.objects.create(member=self.profile, date=self.today, weight_kg=81)
+
+
+class ProgressImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('importer', password='pw')
+        self.profile = self.user.memberprofile
+        self.client.force_login(self.user)
+
+    def upload(self, name, content, **data):
+        return self.client.post(reverse('api_progress_import'),
+                                dict(data, file=SimpleUploadedFile(name, content.encode('utf-8'))))
+
+    def test_csv_upserts_and_reports_row_errors(self):
+        Progress.objects.create(member=self.profile, date=date(2024, 1, 2), weight_kg=90, body_fat_pct=25)
+        response = self.upload('history.csv', "\ufeffdate,weight_kg,body_fat_pct,notes\n"
+                                              "2024-01-01,91,,first\n"
+                                              "2024-01-02,89.5,,\n"
+                                              "01/03/2024,89,24,\n"
+                                              "2024-02-30,88,,\n"
+                                              "2024-01-04,heavy,,\n")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['rows_read'], body['rows_written'], body['error_count']), (5, 3, 2))
+        self.assertEqual([e['line'] for e in body['errors']], [5, 6])
+        self.assertTrue(body['errors'][0]['message'].startswith('date:'))
+        rows = list(Progress.objects.filter(member=self.profile).order_by('date')
+                    .values_list('date', 'weight_kg', 'body_fat_pct'))
+        # the blank body fat on 2024-01-02 keeps the stored 25
+        self.assertEqual(rows, [(date(2024, 1, 1), 91, None), (date(2024, 1, 2), 89.5, 25),
+                                (date(2024, 1, 3), 89, 24)])
+        stats = MemberStats.objects.get(pk=self.profile.pk)
+        self.assertEqual((stats.entry_count, stats.last_weight_kg), (3, 89))
+
+    def test_ndjson_in_small_chunks(self):
+        lines = [json.dumps({'date': (date(2024, 1, 1) + timedelta(days=i)).isoformat(), 'weight_kg': 80 + i})
+                 for i in range(25)]
+        lines.insert(3, '{not json')
+        lines.append(json.dumps({'date': '2024-01-01', 'weight_kg': 70}))   # later row for the same day wins
+        result = import_progress(self.profile.pk, io.BytesIO('\n'.join(lines).encode()), 'ndjson', chunk_size=4)
+        self.assertEqual((result.rows_written, result.error_count), (26, 1))
+        self.assertEqual(Progress.objects.filter(member=self.profile).count(), 25)
+        self.assertEqual(Progress.objects.get(member=self.profile, date=date(2024, 1, 1)).weight_kg, 70)
+
+    def test_unusable_files(self):
+        self.assertEqual(self.upload('history.csv', "day,weight\n2024-01-01,80\n").status_code, 400)
+        self.assertEqual(self.upload('history.txt', "", format='xml').status_code, 400)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user('exporter', password='pw')
+        cls.other = User.objects.create_user('other', password='pw')
+        cls.admin = User.objects.create_superuser('boss', password='pw')
+        day = date(2024, 1, 1)
+        Progress.objects.bulk_create(
+            [Progress(member=cls.member.memberprofile, date=day + timedelta(days=i), weight_kg=80,
+                      notes='line one\nline "two"') for i in range(1200)]
+            + [Progress(member=cls.other.memberprofile, date=day, weight_kg=60)]
+        )
+
+    def download(self, user, dataset='progress', **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse('export_data', args=[dataset]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_member_csv_contains_only_own_rows(self):
+        rows = list(csv.reader(io.StringIO(self.download(self.member).decode('utf-8'))))
+        self.assertEqual(rows[0][:4], ['id', 'member_id', 'username', 'date'])
+        self.assertEqual(len(rows), 1201)
+        self.assertEqual({row[2] for row in rows[1:]}, {'exporter'})
+        self.assertEqual(rows[1][6], 'line one\nline "two"')
+
+    def test_admin_gzipped_ndjson_covers_everyone(self):
+        body = gzip.decompress(self.download(self.admin, format='ndjson', gzip='1'))
+        lines = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        self.assertEqual(len(lines), 1201)
+        self.assertEqual({line['username'] for line in lines}, {'exporter', 'other'})
+        self.assertEqual(lines[0]['date'], '2024-01-01')
+
+    def test_unknown_dataset_or_format(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(reverse('export_data', args=['users'])).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_data', args=['payments']), {'format': 'xml'}).status_code, 400)
+
+    def test_command_streams_to_a_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'progress.csv.gz')
+            call_command('export_data', 'progress', '--gzip', '--member', self.other.memberprofile.pk,
+                         '-o', path, stdout=io.StringIO())
+            with gzip.open(path, 'rt') as f:
+                self.assertEqual(len(f.read().splitlines()), 2)
+
+
+def make_jpeg(width, height):
+    """A noisy (so barely compressible) JPEG, roughly the size of a phone photo."""
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 64).convert('RGB').save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+class PhotoRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, PHOTO_RENDITIONS_EAGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('snapper', password='pw')
+        self.client.force_login(self.user)
+
+    def upload(self, width=3000, height=2000):
+        data = make_jpeg(width, height)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('upload_progress_photo'),
+                                        {'image': SimpleUploadedFile('me.jpg', data, 'image/jpeg')})
+        self.assertEqual(response.status_code, 302)
+        return ProgressPhoto.objects.get(member=self.user.memberprofile), len(data)
+
+    def test_upload_renders_small_renditions(self):
+        photo, original_size = self.upload()
+        self.assertEqual(photo.renditions_status, ProgressPhoto.RENDITIONS_READY)
+        for field, edge in (('thumb', 320), ('thumb_webp', 320), ('medium', 960), ('medium_webp', 960)):
+            with Image.open(getattr(photo, field).path) as image:
+                self.assertEqual(max(image.size), edge)
+        self.assertEqual((photo.thumb_width, photo.thumb_height), (320, 213))
+        self.assertLess(photo.thumb.size + photo.thumb_webp.size, original_size / 20)
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, reverse('photo_file', args=[photo.pk, 'medium', photo.medium.name]) + ' 960w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_without_eager_the_original_is_served_until_the_worker_runs(self):
+        with override_settings(PHOTO_RENDITIONS_EAGER=False):
+            photo, _ = self.upload(800, 600)
+        self.assertEqual(photo.renditions_status, ProgressPhoto.RENDITIONS_PENDING)
+        self.assertContains(self.client.get(reverse('dashboard')),
+                            reverse('photo_file', args=[photo.pk, 'original', photo.image.name]))
+
+        call_command('run_photo_workers', '--once', stdout=io.StringIO())
+        photo.refresh_from_db()
+        self.assertEqual(photo.renditions_status, ProgressPhoto.RENDITIONS_READY)
+        self.assertContains(self.client.get(reverse('dashboard')),
+                            reverse('photo_file', args=[photo.pk, 'thumb_webp', photo.thumb_webp.name]))
+
+    def test_worker_requeues_photos_a_dead_worker_left_processing(self):
+        member = self.user.memberprofile
+        crashed = ProgressPhoto.objects.create(member=member, image=SimpleUploadedFile('a.jpg', make_jpeg(400, 400)))
+        busy = ProgressPhoto.objects.create(member=member, image=SimpleUploadedFile('b.jpg', make_jpeg(400, 400)))
+        ProgressPhoto.objects.filter(id__in=[crashed.id, busy.id]).update(
+            renditions_status=ProgressPhoto.RENDITIONS_PROCESSING, renditions_started_at=timezone.now())
+        ProgressPhoto.objects.filter(id=crashed.id).update(renditions_started_at=timezone.now() - timedelta(hours=1))
+
+        out = io.StringIO()
+        call_command('run_photo_workers', '--once', '--stale-after', '300', stdout=out)
+        self.assertIn('Requeued 1 stale photo(s).', out.getvalue())
+        crashed.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual(crashed.renditions_status, ProgressPhoto.RENDITIONS_READY)
+        # still within its window: another worker may be rendering it right now
+        self.assertEqual(busy.renditions_status, ProgressPhoto.RENDITIONS_PROCESSING)
+
+    def test_backfill_retries_failed_photos(self):
+        member = self.user.memberprofile
+        good = ProgressPhoto.objects.create(member=member, image=SimpleUploadedFile('a.jpg', make_jpeg(400, 400)))
+        broken = ProgressPhoto.objects.create(member=member, image=SimpleUploadedFile('b.jpg', b'not an image'))
+        out = io.StringIO()
+        with self.assertLogs('main.photo_renditions', 'ERROR'):
+            call_command('backfill_photo_renditions', stdout=out)
+        self.assertIn('1 photo(s) rendered, 1 failed', out.getvalue())
+        broken.refresh_from_db()
+        self.assertEqual(broken.renditions_status, ProgressPhoto.RENDITIONS_FAILED)
+
+        with self.assertLogs('main.photo_renditions', 'ERROR'):
+            call_command('backfill_photo_renditions', '--retry-failed', stdout=out)
+        self.assertIn('0 photo(s) rendered, 1 failed', out.getvalue())
+        good.refresh_from_db()
+        self.assertEqual(good.renditions_status, ProgressPhoto.RENDITIONS_READY)
+
+
+class ChunkedPhotoUploadTests(TestCase):
+    CHUNK = 64 * 1024
+
+    def setUp(self):
+        media, parts = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(parts.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, PHOTO_UPLOAD_DIR=parts.name,
+                                              PHOTO_UPLOAD_CHUNK_BYTES=self.CHUNK)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('uploader', password='pw')
+        self.client.force_login(self.user)
+        self.data = make_jpeg(600, 400)
+        self.assertGreater(len(self.data), 2 * self.CHUNK)
+
+    def start(self, sha256=None):
+        response = self.client.post(reverse('api_photo_upload_start'), {
+            'filename': 'front.jpg', 'size': len(self.data), 'caption': 'week 4',
+            'sha256': sha256 or hashlib.sha256(self.data).hexdigest(),
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, upload, offset, size=None):
+        chunk = self.data[offset:offset + (size or self.CHUNK)]
+        return self.client.put(upload['url'], chunk, content_type='application/offset+octet-stream',
+                               headers={'Upload-Offset': str(offset),
+                                        'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest()})
+
+    def complete(self, upload):
+        return self.client.post(reverse('api_photo_upload_complete', args=[upload['id']]))
+
+    def test_interrupted_chunk_resumes_from_last_acknowledged_offset(self):
+        upload = self.start()
+        self.assertEqual(self.put(upload, 0).json()['offset'], self.CHUNK)
+
+        # the connection drops halfway through the second chunk
+        session = PhotoUpload.objects.get(pk=upload['id'])
+        half = io.BytesIO(self.data[self.CHUNK:self.CHUNK + 1000])
+        with self.assertRaises(UploadError) as cm:
+            write_chunk(session, self.CHUNK, half, self.CHUNK)
+        self.assertEqual(cm.exception.offset, self.CHUNK)
+        self.assertEqual(os.path.getsize(part_path(session)), self.CHUNK)
+
+        offset = self.client.get(upload['url']).json()['offset']
+        self.assertEqual(offset, self.CHUNK)
+        while offset < len(self.data):
+            response = self.put(upload, offset)
+            self.assertEqual(response.status_code, 200)
+            offset = int(response['Upload-Offset'])
+
+        response = self.complete(upload)
+        self.assertEqual(response.status_code, 201)
+        photo = ProgressPhoto.objects.get(pk=response.json()['photo_id'])
+        self.assertEqual(photo.member, self.user.memberprofile)
+        self.assertEqual(photo.caption, 'week 4')
+        with photo.image.open('rb') as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(photo.blob.sha256, hashlib.sha256(self.data).hexdigest())
+        self.assertFalse(os.path.exists(part_path(session)))
+        # a retried complete (lost response) returns the same photo
+        self.assertEqual(self.complete(upload).json()['photo_id'], photo.pk)
+        self.assertEqual(ProgressPhoto.objects.count(), 1)
+
+    def test_out_of_order_or_oversized_chunks_are_rejected(self):
+        upload = self.start()
+        response = self.put(upload, self.CHUNK)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.assertEqual(self.put(upload, 0, size=self.CHUNK + 1).status_code, 413)
+        self.assertEqual(self.complete(upload).status_code, 409)
+
+    def test_checksum_mismatch_fails_the_upload(self):
+        upload = self.start(sha256='0' * 64)
+        offset = 0
+        while offset < len(self.data):
+            offset = self.put(upload, offset).json()['offset']
+        response = self.complete(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(PhotoUpload.objects.get(pk=upload['id']).status, PhotoUpload.STATUS_FAILED)
+        self.assertFalse(ProgressPhoto.objects.exists())
+
+    def test_other_members_cannot_see_the_upload(self):
+        upload = self.start()
+        self.client.force_login(User.objects.create_user('nosy', password='pw'))
+        self.assertEqual(self.client.get(upload['url']).status_code, 404)
+        self.assertEqual(self.put(upload, 0).status_code, 404)
+
+    def test_gc_removes_abandoned_sessions(self):
+        upload = self.start()
+        self.put(upload, 0)
+        session = PhotoUpload.objects.get(pk=upload['id'])
+        PhotoUpload.objects.filter(pk=session.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        fresh = self.start()
+
+        out = io.StringIO()
+        call_command('gc_photo_uploads', stdout=out)
+        self.assertIn('Removed 1 upload session(s)', out.getvalue())
+        self.assertFalse(os.path.exists(part_path(session)))
+        self.assertEqual([str(pk) for pk in PhotoUpload.objects.values_list('pk', flat=True)], [fresh['id']])
+
+
+class PhotoStoreTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('twice', password='pw')
+        self.data = make_jpeg(300, 200)
+
+    def stored_files(self):
+        return sorted(os.path.relpath(os.path.join(root, name), self.media)
+                      for root, _, names in os.walk(self.media) for name in names)
+
+    def upload(self, user, name):
+        self.client.force_login(user)
+        self.client.post(reverse('upload_progress_photo'),
+                         {'image': SimpleUploadedFile(name, self.data, 'image/jpeg')})
+        return ProgressPhoto.objects.filter(member=user.memberprofile).latest('id')
+
+    def test_duplicate_uploads_share_one_file_until_the_last_delete(self):
+        first = self.upload(self.user, 'phone.jpg')
+        second = self.upload(User.objects.create_user('tablet', password='pw'), 'TABLET.JPG')
+        blob = PhotoBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual((first.blob, second.blob), (blob, blob))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.stored_files(), [blob.file.name])
+        self.assertIn(hashlib.sha256(self.data).hexdigest(), blob.file.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertEqual(self.stored_files(), [blob.file.name])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(PhotoBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_dedup_command_merges_existing_copies(self):
+        storage = ProgressPhoto._meta.get_field('image').storage
+        names = [storage.save(f'progress_photos/{name}', io.BytesIO(data))
+                 for name, data in (('a.jpg', self.data), ('b.jpg', self.data), ('c.jpg', make_jpeg(50, 50)))]
+        ProgressPhoto.objects.bulk_create([ProgressPhoto(member=self.user.memberprofile, image=name) for name in names])
+
+        out = io.StringIO()
+        call_command('dedup_photos', '--dry-run', stdout=out)
+        self.assertIn('2 unique, 1 duplicate(s). Would reclaim', out.getvalue())
+        self.assertEqual(len(self.stored_files()), 3)
+
+        call_command('dedup_photos', stdout=out)
+        self.assertIn('(1 file(s))', out.getvalue())
+        self.assertEqual(self.stored_files(), [names[0], names[2]])
+        self.assertEqual(sorted(PhotoBlob.objects.values_list('ref_count', flat=True)), [1, 2])
+        self.assertEqual(set(ProgressPhoto.objects.values_list('image', flat=True)), {names[0], names[2]})
+        self.assertFalse(ProgressPhoto.objects.filter(blob__isnull=True).exists())
+
+
+class FrontProxy:
+    """
+    Test double for the nginx in front of Django: passes a request to the
+    test client and, when Django answers with X-Accel-Redirect, serves the
+    file from MEDIA_ROOT the way the `internal` location would.
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, url):
+        response = self.client.get(url)
+        target = response.get('X-Accel-Redirect')
+        if target is None:
+            return response, None
+        assert response.content == b'', "Django must not send the body itself"
+        prefix = settings.FILE_SERVING_ACCEL_PREFIX.rstrip('/') + '/'
+        assert target.startswith(prefix), target
+        with open(os.path.join(settings.MEDIA_ROOT, unquote(target[len(prefix):])), 'rb') as f:
+            return response, f.read()
+
+
+class PhotoTimelineTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, FILE_SERVING_BACKEND='nginx')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('album', password='pw')
+        self.client.force_login(self.user)
+        member = self.user.memberprofile
+        self.photos = [ProgressPhoto.objects.create(member=member, caption=f'#{i}',
+                                                    image=SimpleUploadedFile(f'{i}.jpg', make_jpeg(40 + i, 30)))
+                       for i in range(5)]
+        # two photos share a timestamp: the id breaks the tie
+        start = timezone.now() - timedelta(days=10)
+        for i, photo in enumerate(self.photos):
+            ProgressPhoto.objects.filter(pk=photo.pk).update(created_at=start + timedelta(days=min(i, 3)))
+        stranger = User.objects.create_user('stranger', password='pw')
+        ProgressPhoto.objects.create(member=stranger.memberprofile, image=SimpleUploadedFile('s.jpg', make_jpeg(9, 9)))
+
+    def test_timeline_pages_in_created_order(self):
+        url, seen = reverse('api_photo_list') + '?limit=2', []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['caption'] for row in response.json()]
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+        self.assertEqual(seen, ['#0', '#1', '#2', '#3', '#4'])
+        self.assertEqual(self.client.get(reverse('api_photo_list'), {'cursor': 'nope'}).status_code, 400)
+
+    def test_files_are_handed_to_the_front_proxy(self):
+        process_photo(self.photos[0].pk)
+        row = self.client.get(reverse('api_photo_list'), {'limit': 1}).json()[0]
+        proxy = FrontProxy(self.client)
+        for variant in ('original', 'thumb_webp'):
+            response, body = proxy.get(urlsplit(row['urls'][variant]).path)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('max-age=31536000', response['Cache-Control'])
+            self.assertIn('private', response['Cache-Control'])
+            field = 'image' if variant == 'original' else variant
+            photo = ProgressPhoto.objects.get(pk=row['id'])
+            with getattr(photo, field).open('rb') as f:
+                self.assertEqual(body, f.read())
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+        with override_settings(FILE_SERVING_BACKEND='xsendfile'):
+            response = self.client.get(urlsplit(row['urls']['original']).path)
+        self.assertEqual(response['X-Sendfile'], photo.image.path)
+        with override_settings(FILE_SERVING_BACKEND='django'):
+            response = self.client.get(urlsplit(row['urls']['original']).path)
+        with photo.image.open('rb') as f:
+            self.assertEqual(b''.join(response.streaming_content), f.read())
+
+    def test_access_is_checked_before_the_hand_off(self):
+        photo = self.photos[0]
+        url = reverse('photo_file', args=[photo.pk, 'original', photo.image.name])
+        stale = reverse('photo_file', args=[photo.pk, 'original', 'progress_photos/old.jpg'])
+        self.assertEqual(self.client.get(stale).status_code, 404)
+        self.assertEqual(self.client.get(reverse('photo_file', args=[photo.pk, 'thumb', 'x.jpg'])).status_code, 404)
+
+        self.client.force_login(User.objects.get(username='stranger'))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.client.force_login(User.objects.create_superuser('coach', password='pw'))
+        self.assertIn('X-Accel-Redirect', self.client.get(url))
+
+
+class PaymentAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('owner', password='pw')
+        members = [User.objects.create_user(f'payer{i}', password='pw').memberprofile for i in range(10)]
+        Payment.objects.bulk_create([Payment(member=members[i % 10], amount=30) for i in range(60)])
+        Payment.objects.filter(member=members[0]).update(status='Approved')
+        members[0].is_payment_approved = True
+        members[0].save()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def approve(self, payments):
+        return self.client.post(reverse('admin:main_payment_changelist'), {
+            'action': 'approve_payments',
+            '_selected_action': [p.pk for p in payments],
+        })
+
+    def test_approval_is_set_based_and_logged(self):
+        few = list(Payment.objects.filter(member__user__username__in=['payer0', 'payer1']))
+        many = list(Payment.objects.exclude(pk__in=[p.pk for p in few]))
+        ContentType.objects.get_for_model(Payment)   # warm the cache the log entries use
+        with CaptureQueriesContext(connection) as small:
+            self.approve(few)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.approve(many).status_code, 302)
+        self.assertEqual(len(large), len(small))   # no per-row queries
+
+        self.assertFalse(Payment.objects.exclude(status='Approved').exists())
+        self.assertEqual(User.objects.filter(memberprofile__is_payment_approved=True, is_superuser=False).count(), 10)
+        entries = LogEntry.objects.filter(action_flag=CHANGE)
+        # payer0's payments were approved already: no history for them
+        self.assertEqual(entries.count(), 54)
+        self.assertIn('Approved', entries.first().object_repr)
+
+    def test_change_lists_do_not_query_per_row(self):
+        for name in ('payment', 'memberprofile', 'memberstats'):
+            url = reverse(f'admin:main_{name}_changelist')
+            with CaptureQueriesContext(connection) as one_page:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            with CaptureQueriesContext(connection) as filtered:
+                self.client.get(url, {'q': 'payer'})
+            self.assertLess(len(one_page), 15, name)
+            self.assertLessEqual(len(filtered), len(one_page), name)
+
+
+class DashboardFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cached', password='pw')
+        self.profile = self.user.memberprofile
+        self.client.force_login(self.user)
+        self.today = timezone.now().date()
+
+    def get(self, name='dashboard'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return response, [q['sql'] for q in queries.captured_queries]
+
+    def test_warm_dashboard_skips_section_queries(self):
+        self.get()
+        response, queries = self.get()
+        self.assertFalse([q for q in queries if 'main_workoutplan' in q or 'main_progressphoto' in q
+                          or 'FROM "main_progress"' in q])
+        # cached fragments are still rendered as HTML, not escaped text
+        self.assertContains(response, '<h6 class="mb-2">Weekly Activity</h6>', html=False)
+        self.assertEqual(dashboard_cache_stats()['plans'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_writes_invalidate_their_sections(self):
+        self.get()
+        Progress.objects.create(member=self.profile, date=self.today, weight_kg=80)
+        response, queries = self.get()
+        self.assertContains(response, 'First Step: Logged your progress')
+        self.assertFalse([q for q in queries if 'main_workoutplan' in q])  # plans fragment still cached
+
+        generation = PlanGeneration.objects.create(member=self.profile, status=PlanGeneration.STATUS_CURRENT)
+        WorkoutPlan.objects.create(member=self.profile, generation=generation, title='Day 1', content='Squat')
+        response, _ = self.get()
+        self.assertContains(response, 'Day 1')
+
+    def test_write_from_another_process_reaches_next_render(self):
+        self.get()
+        # a plan worker has its own local-memory cache; only the database is shared
+        worker_caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                     'LOCATION': 'plan-worker'}}
+        with override_settings(CACHES=worker_caches):
+            with transaction.atomic():
+                generation = start_generation(self.profile, source='worker')
+                WorkoutPlan.objects.bulk_create([
+                    WorkoutPlan(member=self.profile, generation=generation, title='Worker day', content='Deadlift'),
+                ])
+                promote_generation(generation)
+        response, _ = self.get()
+        self.assertContains(response, 'Worker day')
+
+    def test_progress_data_is_cached_per_version(self):
+        Progress.objects.create(member=self.profile, date=self.today, weight_kg=80)
+        self.get('progress_data')
+        response, queries = self.get('progress_data')
+        self.assertFalse([q for q in queries if 'FROM "main_progress"' in q])
+        Progress.objects.create(member=self.profile, date=self.today - timedelta(days=1), weight_kg=81)
+        response, _ = self.get('progress_data')
+        self.assertEqual(len(response.json()), 2)
+
+
+class ProgressConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('poller', password='pw')
+        self.profile = self.user.memberprofile
+        self.client.force_login(self.user)
+        self.today = timezone.now().date()
+        Progress.objects.create(member=self.profile, date=self.today, weight_kg=80)
+
+    def get(self, name, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name), headers=headers)
+        return response, [q['sql'] for q in queries.captured_queries]
+
+    def assertRevalidates(self, name):
+        first, _ = self.get(name)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('no-cache', first['Cache-Control'])
+
+        response, queries = self.get(name, if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if 'FROM "main_progress"' in q], queries)
+
+        response, _ = self.get(name, if_modified_since=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        Progress.objects.create(member=self.profile, date=self.today - timedelta(days=1), weight_kg=81)
+        response, _ = self.get(name, if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_progress_data(self):
+        self.assertRevalidates('progress_data')
+
+    def test_api_progress_list(self):
+        self.assertRevalidates('api_progress_list')
+
+    def test_deletes_change_the_etag(self):
+        first, _ = self.get('api_progress_list')
+        Progress.objects.filter(member=self.profile).first().delete()
+        response, _ = self.get('api_progress_list', if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+
+class ProgressQueryOptionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('paged', password='pw')
+        cls.start = timezone.now().date() - timedelta(days=249)
+        Progress.objects.bulk_create(
+            [Progress(member=cls.user.memberprofile, date=cls.start + timedelta(days=i), weight_kg=100 - i * 0.1)
+             for i in range(250)]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_cursor_walk_matches_full_history(self):
+        full = self.client.get(reverse('api_progress_list')).json()
+        self.assertEqual(len(full), 250)
+        seen, url = [], reverse('api_progress_list') + '?limit=7&fields=id,date'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                seen.extend(response.json())
+                link = response.headers.get('Link')
+                url = link[1:link.index('>')] if link else None
+        self.assertEqual([row['id'] for row in seen], [row['id'] for row in full])
+        self.assertEqual(set(seen[0]), {'id', 'date'})
+        self.assertFalse([q['sql'] for q in queries.captured_queries if 'OFFSET' in q['sql']])
+
+    def test_date_range(self):
+        frm = (self.start + timedelta(days=10)).isoformat()
+        to = (self.start + timedelta(days=19)).isoformat()
+        rows = self.client.get(reverse('progress_data'), {'from': frm, 'to': to}).json()
+        self.assertEqual([row['date'] for row in rows][0::9], [frm, to])
+        self.assertEqual(set(rows[0]), {'date', 'weight_kg'})
+
+    def test_points_downsamples_and_keeps_endpoints(self):
+        rows = self.client.get(reverse('progress_data'), {'points': 50}).json()
+        self.assertEqual(len(rows), 50)
+        self.assertEqual(rows[0]['date'], self.start.isoformat())
+        self.assertEqual(rows[-1]['date'], timezone.now().date().isoformat())
+
+    def test_bad_parameters(self):
+        for params in ({'from': 'yesterday'}, {'fields': 'password'}, {'limit': 'ten'}, {'cursor': '???'}):
+            self.assertEqual(self.client.get(reverse('api_progress_list'), params).status_code, 400, params)
+            self.assertEqual(self.client.get(reverse('progress_data'), params).status_code, 400, params)
+
+
+class AchievementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('badges', password='pw')
+        self.profile = self.user.memberprofile
+        self.profile.height_cm = 200
+        self.profile.save()
+        self.today = timezone.now().date()
+
+    def codes(self):
+        return set(MemberAchievement.objects.filter(member=self.profile).values_list('code', flat=True))
+
+    def log(self, days_ago, weight=90):
+        return Progress.objects.create(member=self.profile, date=self.today - timedelta(days=days_ago),
+                                       weight_kg=weight)
+
+    def test_events_award_and_revoke(self):
+        self.log(0)
+        self.assertEqual(self.codes(), {'first_step', 'healthy_bmi'})
+        self.profile.height_cm = 150   # BMI 40: the state badge goes, the milestone stays
+        self.profile.save()
+        self.assertEqual(self.codes(), {'first_step'})
+        promote_generation(start_generation(self.profile))
+        self.assertEqual(self.codes(), {'first_step', 'ai_explorer'})
+        for i in range(1, 7):
+            self.log(i)
+        self.assertIn('consistency_7', self.codes())
+
+    def test_dashboard_reads_stored_badges(self):
+        self.log(0)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'First Step: Logged your progress')
+        self.assertContains(response, 'Healthy BMI Range')
+        badge_reads = [q['sql'] for q in queries.captured_queries if 'main_memberachievement' in q['sql']]
+        self.assertEqual(len(badge_reads), 1)
+
+        # unchanged badges keep the fragment cached across progress writes
+        self.log(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('dashboard'))
+        self.assertFalse([q for q in queries.captured_queries if 'main_memberachievement' in q['sql']])
+
+    def test_bulk_reevaluation(self):
+        Progress.objects.bulk_create([Progress(member=self.profile, date=self.today - timedelta(days=i),
+                                               weight_kg=90) for i in range(30)])
+        self.assertEqual(self.codes(), set())   # bulk_create sends no signals
+        MemberStats.objects.filter(pk=self.profile.pk).update(entry_count=30)
+        MemberAchievement.objects.create(member=self.profile, code='retired_rule')
+        self.assertEqual(reevaluate_achievements(prune=True), (3, 1))
+        self.assertEqual(self.codes(), {'first_step', 'consistency_7', 'committed_30'})
+        self.assertEqual(reevaluate_achievements(), (0, 0))
+
+
+class ProgressAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('trend', password='pw')
+        self.profile = self.user.memberprofile
+        self.profile.goal = 'Fat Loss'
+        self.profile.save()
+        self.client.force_login(self.user)
+        self.today = timezone.now().date()
+        # losing 0.1 kg/day for 60 days
+        Progress.objects.bulk_create(
+            [Progress(member=self.profile, date=self.today - timedelta(days=59 - i), weight_kg=96 - i * 0.1,
+                      body_fat_pct=25.0)
+             for i in range(60)]
+        )
+
+    def get(self, **params):
+        return self.client.get(reverse('api_progress_analytics'), params)
+
+    def test_trend_and_goal_date(self):
+        data = self.get(target=85).json()
+        self.assertEqual(data['points'], 60)
+        self.assertEqual(data['last'], {'date': self.today.isoformat(), 'value': 90.1})
+        self.assertAlmostEqual(data['trend']['slope_per_week'], -0.7, places=1)
+        eta = date.fromisoformat(data['projected_goal_date']) - self.today
+        self.assertTrue(timedelta(days=49) <= eta <= timedelta(days=52), eta)
+
+    def test_rollups_and_rolling_mean(self):
+        data = self.get(window=7).json()
+        self.assertEqual(sum(week['count'] for week in data['weekly']), 60)
+        self.assertEqual(sum(month['count'] for month in data['monthly']), 60)
+        self.assertTrue(all(date.fromisoformat(week['start']).weekday() == 0 for week in data['weekly']))
+        rolling = data['rolling']['series']
+        self.assertEqual(len(rolling), 60)
+        self.assertAlmostEqual(rolling[-1]['value'], sum(96 - i * 0.1 for i in range(53, 60)) / 7, 1)
+
+    def test_body_fat_without_a_trend_has_no_goal_date(self):
+        data = self.get(metric='body_fat').json()
+        self.assertEqual(data['target'], 20.0)
+        self.assertEqual(data['trend']['slope_per_week'], 0)
+        self.assertIsNone(data['projected_goal_date'])
+
+    def test_bad_parameters(self):
+        for params in ({'metric': 'height'}, {'target': 'thin'}, {'window': 'week'}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+    def test_non_finite_targets_are_rejected(self):
+        for target in ('nan', 'NaN', 'inf', '-Infinity', '1e400', '85kg'):
+            response = self.get(target=target)
+            self.assertEqual(response.status_code, 400, target)
+            self.assertIn("'target' must be a number", response.json()['detail'])
+
+
+@override_settings(PLAN_JOBS_EAGER=False, PLAN_STREAMING=False, PLAN_ENGINE='rules')
+class PlanJobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('queued', password='pw')
+        self.profile = self.user.memberprofile
+        self.profile.age, self.profile.height_cm, self.profile.weight_kg = 30, 180, 85
+        self.profile.goal, self.profile.experience_level = 'Fat Loss', 'Beginner'
+        self.profile.save()
+
+    def test_enqueue_returns_the_active_job(self):
+        job = enqueue_plan_job(self.profile)
+        self.assertEqual(enqueue_plan_job(self.profile).id, job.id)
+        claim_job(job.id)
+        self.assertEqual(enqueue_plan_job(self.profile).id, job.id)   # running jobs are shared too
+        self.assertEqual(PlanJob.objects.count(), 1)
+
+    def test_claim_with_nothing_queued(self):
+        self.assertIsNone(claim_next_job())
+        job = enqueue_plan_job(self.profile)
+        self.assertEqual(claim_next_job().id, job.id)
+        self.assertIsNone(claim_next_job())
+        self.assertIsNone(claim_job(job.id))   # already running
+
+    def test_run_to_success(self):
+        job = claim_job(enqueue_plan_job(self.profile).id)
+        self.assertEqual((job.status, job.attempts), (PlanJob.STATUS_RUNNING, 1))
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, PlanJob.STATUS_DONE)
+        self.assertEqual(job.created_count, 7)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.generation.status, PlanGeneration.STATUS_CURRENT)
+        self.assertEqual(WorkoutPlan.objects.filter(generation=job.generation).count(), 7)
+
+    def test_failure_is_recorded_and_the_member_can_retry(self):
+        job = claim_job(enqueue_plan_job(self.profile).id)
+        with patch('main.plan_jobs.generate_plans', side_effect=RuntimeError('provider exploded')), \
+                self.assertLogs('main.plan_jobs', 'ERROR'):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.attempts), (PlanJob.STATUS_FAILED, 'provider exploded', 1))
+        self.assertIsNone(job.generation)
+        self.assertFalse(WorkoutPlan.objects.exists())
+
+        # a failed job is no longer active, so the next request queues a fresh one
+        retry = enqueue_plan_job(self.profile)
+        self.assertNotEqual(retry.id, job.id)
+        run_job(claim_job(retry.id))
+        retry.refresh_from_db()
+        self.assertEqual(retry.status, PlanJob.STATUS_DONE)
+
+    def test_stale_running_job_is_requeued_and_reclaimed(self):
+        job = claim_job(enqueue_plan_job(self.profile).id)
+        self.assertEqual(requeue_stale_jobs(older_than=600), 0)   # still fresh
+        PlanJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(minutes=30))
+        self.assertEqual(requeue_stale_jobs(older_than=600), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.started_at), (PlanJob.STATUS_QUEUED, None))
+        job = claim_next_job()
+        self.assertEqual((job.status, job.attempts), (PlanJob.STATUS_RUNNING, 2))
+
+    def test_worker_that_lost_its_claim_does_not_overwrite_the_new_run(self):
+        slow = claim_job(enqueue_plan_job(self.profile).id)
+        slow.started_at = timezone.now() - timedelta(minutes=30)
+        PlanJob.objects.filter(id=slow.id).update(started_at=slow.started_at)
+        requeue_stale_jobs(older_than=600)
+        current = claim_next_job()
+
+        with self.assertLogs('main.plan_jobs', 'WARNING') as logs:
+            slow = run_job(slow)
+        self.assertIn('dropping its result', logs.output[0])
+        self.assertEqual((slow.status, slow.started_at), (PlanJob.STATUS_RUNNING, current.started_at))
+        self.assertIsNone(slow.generation)
+
+        current = run_job(current)
+        self.assertEqual(current.status, PlanJob.STATUS_DONE)
+        self.assertEqual(PlanJob.objects.get(id=current.id).generation, current.generation)
+
+    def test_status_endpoint(self):
+        job = enqueue_plan_job(self.profile)
+        url = reverse('plan_job_status', args=[job.id])
+        self.client.force_login(User.objects.create_user('nosy', password='pw'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).json(), {
+            'ok': True, 'job_id': job.id, 'status': 'queued', 'message': '', 'created_count': 0,
+        })
+        run_job(claim_job(job.id))
+        data = self.client.get(url).json()
+        self.assertEqual((data['ok'], data['status'], data['created_count']), (True, 'done', 7))
+
+        self.client.force_login(User.objects.create_superuser('staff', password='pw'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(reverse('plan_job_status', args=[job.id + 1])).status_code, 404)
+
+
+@override_settings(PLAN_CACHE_TTL=60)
+class PlanCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.PLAN_CACHE_ALIAS].clear()
+        self.plan = synthesize_plan(self.member())
+
+    def member(self, **fields):
+        return MemberProfile(**dict({'age': 31, 'height_cm': 178, 'weight_kg': 82.0, 'goal': 'Fat Loss',
+                                     'experience_level': 'Beginner'}, **fields))
+
+    def test_miss_then_hit_with_the_members_own_details(self):
+        self.assertIsNone(plan_cache.get_plan(self.member()))
+        plan_cache.store_plan(self.member(), self.plan)
+        hit = plan_cache.get_plan(self.member(weight_kg=84.5))
+        self.assertEqual(hit['plan'], self.plan['plan'])
+        self.assertEqual(hit['member']['weight_kg'], 84.5)
+        self.assertEqual(plan_cache.plan_cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_buckets(self):
+        plan_cache.store_plan(self.member(), self.plan)
+        same_bucket = [self.member(age=34), self.member(height_cm=179), self.member(weight_kg=80.1),
+                       self.member(goal='  fat-LOSS '), self.member(experience_level='beginner')]
+        for profile in same_bucket:
+            self.assertEqual(plan_cache.cache_key(profile), plan_cache.cache_key(self.member()))
+            self.assertIsNotNone(plan_cache.get_plan(profile))
+        other_bucket = [self.member(age=36), self.member(height_cm=183), self.member(weight_kg=87.0),
+                        self.member(goal='Muscle Gain'), self.member(experience_level='Advanced')]
+        for profile in other_bucket:
+            self.assertIsNone(plan_cache.get_plan(profile))
+        self.assertEqual(plan_cache.plan_cache_stats()['hits'], len(same_bucket))
+        self.assertEqual(plan_cache.plan_cache_stats()['misses'], len(other_bucket))
+
+    def test_equipment_is_part_of_the_key(self):
+        plan_cache.store_plan(self.member(equipment='home'), self.plan)
+        self.assertIsNone(plan_cache.get_plan(self.member(equipment='gym')))
+        self.assertIsNone(plan_cache.get_plan(self.member(equipment='none')))
+        self.assertIsNotNone(plan_cache.get_plan(self.member(equipment='home')))
+        # blank is the model default
+        self.assertEqual(plan_cache.cache_key(self.member(equipment='')), plan_cache.cache_key(self.member()))
+
+    def test_entries_expire_after_the_ttl_unless_used(self):
+        start = time.time()
+        with patch('time.time', return_value=start):
+            plan_cache.store_plan(self.member(), self.plan)
+        with patch('time.time', return_value=start + 50):
+            self.assertIsNotNone(plan_cache.get_plan(self.member()))   # sliding: now good until +110
+        with patch('time.time', return_value=start + 100):
+            self.assertIsNotNone(plan_cache.get_plan(self.member()))
+        with patch('time.time', return_value=start + 161):
+            self.assertIsNone(plan_cache.get_plan(self.member()))
+
+    def test_disabled_or_invalid(self):
+        with override_settings(PLAN_CACHE_TTL=0):
+            plan_cache.store_plan(self.member(), self.plan)
+            self.assertIsNone(plan_cache.get_plan(self.member()))
+        self.assertIsNone(plan_cache.get_plan(self.member()))   # nothing was stored
+        plan_cache.store_plan(self.member(), {'member': {}, 'plan': 'not a list'})
+        self.assertIsNone(plan_cache.get_plan(self.member()))
+        # a disabled cache doesn't count lookups
+        self.assertEqual(plan_cache.plan_cache_stats(), {'hits': 0, 'misses': 2, 'hit_rate': 0.0})
+
+
+@override_settings(PLAN_ENGINE='llm', PLAN_CACHE_TTL=0)
+class LLMBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()   # circuit breaker state
+        self.profile = MemberProfile(id=1, age=40, height_cm=170, weight_kg=72.5, goal='Muscle Gain',
+                                     experience_level='Intermediate')
+
+    def test_backend_selected_from_settings(self):
+        with override_settings(LLM_BACKEND='local', LLM_LOCAL_LATENCY=0):
+            self.assertIsInstance(llm.get_client(), llm.LocalBackend)
+        with override_settings(LLM_BACKEND='openai', OPENAI_API_KEY=''):
+            self.assertIsNone(llm.get_client())
+        try:
+            import openai  # noqa: F401
+        except ImportError:
+            self.skipTest("openai is not installed")
+        with override_settings(LLM_BACKEND='openai', OPENAI_API_KEY='sk-test', LLM_MODEL='gpt-test'):
+            client = llm.get_client()
+            self.assertIsInstance(client, llm.OpenAIBackend)
+            self.assertEqual(client.model, 'gpt-test')
+
+    def test_local_backend_plan(self):
+        messages = build_plan_messages(self.profile)
+        backend = llm.LocalBackend()
+        completion = backend.complete(messages, max_tokens=1200, temperature=0.2)
+        data = json.loads(completion.text)
+        self.assertEqual(data['member'], {'age': 40, 'height_cm': 170, 'weight_kg': 72.5, 'goal': 'Muscle Gain'})
+        self.assertEqual([day['day'] for day in data['plan']], list(range(1, 8)))
+        for day in data['plan']:
+            self.assertEqual(len(day['workout']), 4)
+            self.assertEqual(set(day['diet']), {'breakfast', 'lunch', 'dinner', 'snacks'})
+        self.assertGreater(completion.total_tokens, 0)
+        # deterministic per prompt, and streaming yields the same text
+        self.assertEqual(backend.complete(messages, 1200, 0.2).text, completion.text)
+        self.assertEqual(''.join(backend.stream(messages, 1200, 0.2)), completion.text)
+        other = build_plan_messages(MemberProfile(id=2, age=22, goal='Fat Loss'))
+        self.assertNotEqual(backend.complete(other, 1200, 0.2).text, completion.text)
+
+    def test_misconfigured_provider(self):
+        with self.assertRaisesMessage(ValueError, "Unknown LLM_BACKEND: 'gpt'"):
+            with override_settings(LLM_BACKEND='gpt'):
+                pass
+        # no API key: members get the rule-based plan instead of an error
+        with override_settings(LLM_BACKEND='openai', OPENAI_API_KEY=''):
+            resp = generate_plans(self.profile)
+        self.assertEqual((resp['type'], resp['source']), ('json', 'fallback'))
+        self.assertEqual(len(resp['data']['plan']), 7)
+
+    def test_provider_errors_fall_back_and_count_against_the_breaker(self):
+        with override_settings(LLM_BACKEND='local', LLM_LOCAL_LATENCY=0), \
+                patch.object(llm.LocalBackend, 'complete', side_effect=ConnectionError('connection refused')):
+            resp = generate_plans(self.profile)
+        self.assertEqual(resp['source'], 'fallback')
+        self.assertIn('connection refused', resp['error'])
+        self.assertEqual(llm.breaker.snapshot()['failures'], 1)
+
+
+class PlanStreamParserTests(TestCase):
+    DOC = {
+        'member': {'age': 30, 'goal': 'Fat Loss', 'tags': ['a', 'b']},
+        'plan': [
+            {'day': 1, 'workout': [{'name': 'Squat', 'sets': 3, 'reps': '8-12', 'notes': 'brace } and { here'}],
+             'diet': {'breakfast': 'Oats', 'lunch': 'say "plan": [ now', 'dinner': 'Fish', 'snacks': 'quote \\" }'}},
+            {'day': 2, 'workout': [], 'diet': {'breakfast': '[[{{', 'lunch': '', 'dinner': '', 'snacks': ''}},
+            {'day': 3, 'workout': [{'name': 'Plank', 'sets': 3, 'reps': '45 sec', 'notes': ''}], 'diet': {}},
+        ],
+        'extra': [{'day': 99}],
+    }
+
+    def feed_all(self, text, size):
+        parser = PlanStreamParser()
+        per_chunk = [parser.feed(text[i:i + size]) for i in range(0, len(text), size)]
+        return parser, per_chunk
+
+    def test_any_chunking_yields_the_same_days(self):
+        text = json.dumps(self.DOC)
+        for size in (1, 2, 3, 7, 64, len(text)):
+            parser, _ = self.feed_all(text, size)
+            self.assertEqual(parser.days, self.DOC['plan'], size)
+
+    def test_braces_and_quotes_inside_strings(self):
+        parser, _ = self.feed_all(json.dumps(self.DOC), 5)
+        self.assertEqual(parser.days[0]['workout'][0]['notes'], 'brace } and { here')
+        self.assertEqual(parser.days[0]['diet']['snacks'], 'quote \\" }')
+        self.assertEqual(parser.days[1]['diet']['breakfast'], '[[{{')
+        self.assertNotIn({'day': 99}, parser.days)   # arrays after "plan" are not days
+
+    def test_pretty_printed_input(self):
+        parser, _ = self.feed_all(json.dumps(self.DOC, indent=2), 11)
+        self.assertEqual(parser.days, self.DOC['plan'])
+
+    def test_each_day_is_returned_by_the_chunk_that_closes_it(self):
+        text = json.dumps(self.DOC)
+        first_day_end = text.index('}}, {"day": 2') + 2
+        parser = PlanStreamParser()
+        self.assertEqual(parser.feed(text[:first_day_end - 1]), [])
+        self.assertEqual(parser.feed(text[first_day_end - 1:first_day_end]), [self.DOC['plan'][0]])
+        # a truncated stream keeps the days it completed
+        parser.feed(text[first_day_end:first_day_end + 20])
+        self.assertEqual(parser.days, [self.DOC['plan'][0]])
+
+
+class PlanJobEventsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('streamer', password='pw')
+        self.profile = self.user.memberprofile
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def events(self, job):
+        return async_to_sync(self.aevents)(job)
+
+    async def aevents(self, job):
+        response = await self.async_client.get(reverse('plan_job_events', args=[job.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode('utf-8')
+        self.assertTrue(body.startswith('retry: 2000\n\n'))
+        frames = []
+        for block in body.split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            if 'event' in lines:
+                frames.append((lines['event'], json.loads(lines['data'])))
+        return frames
+
+    def test_days_then_done(self):
+        generation = start_generation(self.profile, source='llm')
+        WorkoutPlan.objects.create(member=self.profile, generation=generation, title='Day 1', content='Squat')
+        WorkoutPlan.objects.create(member=self.profile, generation=generation, title='Day 2', content='Row')
+        job = PlanJob.objects.create(member=self.profile, status=PlanJob.STATUS_DONE, generation=generation,
+                                     created_count=2, message='saved')
+        frames = self.events(job)
+        self.assertEqual([(event, data.get('title')) for event, data in frames[:2]],
+                         [('day', 'Day 1'), ('day', 'Day 2')])
+        self.assertEqual(frames[2:], [('status', {'status': 'done', 'message': 'saved', 'created_count': 2})])
+
+    def test_failed_job_ends_with_an_error_status(self):
+        job = PlanJob.objects.create(member=self.profile, status=PlanJob.STATUS_FAILED,
+                                     message='Failed to generate/save plan.')
+        self.assertEqual(self.events(job), [('status', {
+            'status': 'failed', 'message': 'Failed to generate/save plan.', 'created_count': 0})])
+
+    def test_unfinished_job_times_out(self):
+        job = PlanJob.objects.create(member=self.profile)
+        with patch('main.views.PLAN_EVENTS_TIMEOUT', 0):
+            frames = self.events(job)
+        self.assertEqual([event for event, _ in frames], ['status'])
+        self.assertEqual(frames[0][1]['status'], 'timeout')
+
+    async def test_only_the_owner_may_listen(self):
+        job = await PlanJob.objects.acreate(member=self.profile)
+        await self.async_client.aforce_login(await User.objects.acreate_user('other', password='pw'))
+        response = await self.async_client.get(reverse('plan_job_events', args=[job.id]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_wsgi_requests_are_sent_back_to_polling(self):
+        job = PlanJob.objects.create(member=self.profile)
+        response = self.client.get(reverse('plan_job_events', args=[job.id]))
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(PLAN_EVENTS_MAX_STREAMS=1)
+    async def test_a_disconnected_stream_frees_its_slot(self):
+        job = await PlanJob.objects.acreate(member=self.profile)
+        url = reverse('plan_job_events', args=[job.id])
+        first = await self.async_client.get(url)
+        waiting = asyncio.Event()
+
+        async def listen():
+            async for chunk in first.streaming_content:
+                if chunk.startswith(b': waiting'):
+                    waiting.set()
+
+        listener = asyncio.create_task(listen())
+        await waiting.wait()
+        self.assertEqual((await self.async_client.get(url)).status_code, 429)
+
+        listener.cancel()   # what the ASGI handler does when the browser goes away
+        with self.assertRaises(asyncio.CancelledError):
+            await listener
+        self.assertEqual((await self.async_client.get(url)).status_code, 200)
+
+
+class FakeClock:
+    """Stands in for the `time` module: sleep() just moves monotonic() forward."""
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class RateLimiterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = FakeClock()
+        patcher = patch('main.rate_limit.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unlimited(self):
+        limiter = RateLimiter('test')
+        self.assertEqual(sum(limiter.acquire(10 ** 6) for _ in range(100)), 0.0)
+
+    def test_requests_per_minute(self):
+        limiter = RateLimiter('test', rpm=60)
+        self.assertEqual(sum(limiter.acquire() for _ in range(60)), 0.0)   # the full minute's burst
+        self.assertAlmostEqual(limiter.acquire(), 1.0)                      # then one per second
+        self.clock.now += 0.5
+        self.assertAlmostEqual(limiter.acquire(), 0.5)
+        # idle time refills the bucket, but never beyond one minute's worth
+        self.clock.now += 600
+        self.assertEqual(sum(limiter.acquire() for _ in range(60)), 0.0)
+        self.assertAlmostEqual(limiter.acquire(), 1.0)
+
+    def test_tokens_per_minute(self):
+        limiter = RateLimiter('test', tpm=1000)
+        self.assertEqual(limiter.acquire(600), 0.0)
+        self.assertAlmostEqual(limiter.acquire(600), 12.0)    # 200 tokens short at 1000/min
+        self.assertAlmostEqual(limiter.acquire(5000), 60.0)   # larger than the budget: waits for a full bucket
+
+    def test_both_limits_wait_for_the_slower(self):
+        limiter = RateLimiter('test', rpm=6, tpm=600)
+        limiter.acquire(100)
+        self.clock.now += 10   # tpm back to full
+        self.assertEqual(limiter.acquire(600), 0.0)
+        self.assertAlmostEqual(limiter.acquire(300), 30.0)    # tpm: 300 short at 10/s; rpm alone would allow it
+        self.assertEqual(self.clock.slept, [30.0])
+
+    def test_processes_share_one_budget(self):
+        # two limiters with the same name stand in for the batch command and the worker daemon
+        batch, daemon = RateLimiter('llm', rpm=60), RateLimiter('llm', rpm=60)
+        self.assertEqual(sum(batch.acquire() for _ in range(60)), 0.0)
+        self.assertAlmostEqual(daemon.acquire(), 1.0)
+        self.assertEqual(RateLimiter('other', rpm=60).acquire(), 0.0)
+
+    @override_settings(LLM_RPM=60, LLM_TPM=3000)
+    def test_limits_come_from_settings(self):
+        limiter = RateLimiter('test')
+        self.assertEqual((limiter.rpm, limiter.tpm), (60, 3000))
+        self.assertEqual(limiter.acquire(3000), 0.0)
+        self.assertAlmostEqual(limiter.acquire(1500), 30.0)
+
+    @override_settings(PLAN_ENGINE='llm', LLM_BACKEND='local', LLM_LOCAL_LATENCY=0)
+    def test_only_provider_calls_are_charged(self):
+        profile = MemberProfile(id=1, age=30, height_cm=180, weight_kg=80, goal='Fat Loss')
+        caches[settings.PLAN_CACHE_ALIAS].clear()
+        with patch.object(llm.limiter, 'acquire') as acquire:
+            generate_plans(profile)                          # local backend: no provider behind it
+            generate_plans(profile)                          # plan cache hit
+            with override_settings(PLAN_ENGINE='rules'):
+                generate_plans(profile)
+        acquire.assert_not_called()
+
+        try:
+            import openai  # noqa: F401
+        except ImportError:
+            self.skipTest("openai is not installed")
+        with override_settings(LLM_BACKEND='openai', OPENAI_API_KEY='sk-test'):
+            backend = llm.get_client()
+            messages = build_plan_messages(profile)
+            with patch.object(llm.limiter, 'acquire') as acquire, \
+                    patch.object(backend._client.chat.completions, 'create', side_effect=ConnectionError('down')):
+                with self.assertRaises(ConnectionError):
+                    backend.complete(messages, max_tokens=1200, temperature=0.2)
+        acquire.assert_called_once_with(llm.estimated_tokens(messages, 1200))
+        self.assertGreater(llm.estimated_tokens(messages, 1200), 1200)
+
+
+@override_settings(PLAN_JOBS_EAGER=False, PLAN_STREAMING=False, PLAN_ENGINE='rules')
+class GenerateAllPlansTests(TransactionTestCase):
+    # the command works the queue from its own threads, which need committed rows
+    def setUp(self):
+        for i in range(3):
+            profile = User.objects.create_user(f'bulk{i}', password='pw').memberprofile
+            profile.is_payment_approved = True
+            profile.save()
+        User.objects.create_user('unpaid', password='pw')
+
+    def generate(self):
+        out = io.StringIO()
+        call_command('generate_all_plans', batch='2026-10', workers=1, stdout=out)
+        return out.getvalue()
+
+    def test_interrupted_run_resumes_without_requeueing(self):
+        calls = []
+
+        def dies_on_second_job(job):
+            if calls:
+                raise RuntimeError('worker killed')
+            calls.append(job.id)
+            return run_job(job)
+
+        with patch('main.management.commands.generate_all_plans.run_job', dies_on_second_job):
+            with self.assertRaisesMessage(RuntimeError, 'worker killed'):
+                self.generate()
+        statuses = sorted(PlanJob.objects.values_list('status', flat=True))
+        self.assertEqual(statuses, ['done', 'queued', 'running'])
+        finished = PlanJob.objects.get(status='done')
+
+        # a running job may still be in flight on another process: left alone until it is stale
+        output = self.generate()
+        self.assertIn('Batch 2026-10: 0 new job(s), 0 resumed, 1 to run.', output)
+        self.assertIn('Processed 1 member(s)', output)
+        interrupted = PlanJob.objects.get(status='running')
+
+        PlanJob.objects.filter(pk=interrupted.pk).update(started_at=timezone.now() - timedelta(minutes=30))
+        output = self.generate()
+        self.assertIn('Batch 2026-10: 0 new job(s), 1 resumed, 1 to run.', output)
+        self.assertIn('Processed 1 member(s)', output)
+        self.assertEqual(PlanJob.objects.count(), 3)
+        self.assertFalse(PlanJob.objects.exclude(status='done').exists())
+        self.assertEqual(PlanJob.objects.get(pk=finished.pk).finished_at, finished.finished_at)
+
+        self.assertIn('0 new job(s), 0 resumed, 0 to run.', self.generate())
+
+    def test_admin_regenerate_counts_busy_and_unapproved_members_separately(self):
+        busy = MemberProfile.objects.get(user__username='bulk0')
+        enqueue_plan_job(busy)
+        self.client.force_login(User.objects.create_superuser('boss', password='pw'))
+        response = self.client.post(reverse('admin:main_memberprofile_changelist'), {
+            'action': 'regenerate_plans',
+            '_selected_action': list(MemberProfile.objects.filter(user__is_superuser=False)
+                                     .values_list('pk', flat=True)),
+        }, follow=True)
+        message = str(list(response.context['messages'])[0])
+        self.assertRegex(message, r'^2 plan job\(s\) queued in batch admin-\d{8}-\d{6}; skipped 1 member\(s\) with '
+                                  r'a plan job already in progress and 1 unapproved member\(s\)\.$')
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.clock = FakeClock()
+        patcher = patch('main.resilience.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=30)
+
+    def state(self):
+        return self.breaker.snapshot()['state']
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()   # not consecutive any more
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual((self.state(), self.breaker.allow()), (CircuitBreaker.CLOSED, True))
+        with self.assertLogs('main.resilience', 'WARNING'):
+            self.breaker.record_failure()
+        self.assertEqual(self.state(), CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 10
+        self.assertEqual(self.breaker.snapshot()['retry_in'], 20.0)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_lets_one_probe_through(self):
+        with self.assertLogs('main.resilience', 'WARNING'):
+            for _ in range(3):
+                self.breaker.record_failure()
+            self.clock.now += 30
+            self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.state(), CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())   # the probe is still out
+
+        # failed probe: open again for another reset_timeout
+        with self.assertLogs('main.resilience', 'WARNING'):
+            self.breaker.record_failure()
+        self.assertEqual(self.state(), CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        # successful probe: closed, and every call goes through again
+        self.clock.now += 30
+        with self.assertLogs('main.resilience', 'WARNING') as logs:
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_success()
+        self.assertIn('closed', logs.output[-1])
+        self.assertEqual(self.breaker.snapshot()['failures'], 0)
+        self.assertTrue(all(self.breaker.allow() for _ in range(5)))
+
+    def test_state_scope_is_reported(self):
+        self.assertEqual(self.breaker.snapshot()['scope'], 'process')
+        with tempfile.TemporaryDirectory() as location:
+            shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            with override_settings(CACHES=dict(settings.CACHES, shared=shared), LLM_BREAKER_CACHE_ALIAS='shared'):
+                self.assertEqual(self.breaker.snapshot()['scope'], 'shared')
+
+    def test_llm_status_says_counters_are_per_process(self):
+        self.client.force_login(User.objects.create_superuser('ops', password='pw'))
+        data = self.client.get(reverse('llm_status')).json()
+        self.assertEqual(data['circuit']['scope'], 'process')
+        self.assertEqual(data['plan_cache']['scope'], 'process')
+        self.assertEqual(data['dashboard_cache_scope'], 'process')
+        self.assertEqual(data['queue'], {'queued': 0, 'running': 0})
+
+
+class PlanJobCoalescingTests(TestCase):
+    def setUp(self):
+        self.profile = User.objects.create_user('clicker', password='pw').memberprofile
+
+    def test_one_active_job_per_member_is_enforced_by_the_database(self):
+        PlanJob.objects.create(member=self.profile)
+        for status in (PlanJob.STATUS_QUEUED, PlanJob.STATUS_RUNNING):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                PlanJob.objects.create(member=self.profile, status=status)
+        # finished jobs don't count
+        PlanJob.objects.update(status=PlanJob.STATUS_DONE)
+        PlanJob.objects.create(member=self.profile, status=PlanJob.STATUS_FAILED)
+        PlanJob.objects.create(member=self.profile)
+
+    @override_settings(PLAN_JOBS_EAGER=False)
+    def test_concurrent_requests_share_the_job(self):
+        first = PlanJob.objects.create(member=self.profile)
+        # the other request's insert hits planjob_one_active_per_member and picks up the winner's job
+        self.assertEqual(enqueue_plan_job(self.profile).id, first.id)
+        claim_job(first.id)
+        self.assertEqual(enqueue_plan_job(self.profile).id, first.id)
+        self.assertEqual(PlanJob.objects.count(), 1)
+
+
+class PlanSchemaTests(TestCase):
+    DIET_SLOTS = {'breakfast', 'lunch', 'dinner', 'snacks'}
+
+    def profile(self, **fields):
+        return MemberProfile(**dict({'id': 7, 'age': 35, 'height_cm': 175, 'weight_kg': 80.0, 'goal': 'Fat Loss',
+                                     'experience_level': 'Beginner', 'equipment': 'gym'}, **fields))
+
+    def test_synthesized_plans_match_the_schema(self):
+        for goal in ('Fat Loss', 'Muscle Gain', 'Stay active'):
+            for level in ('Beginner', 'Intermediate', 'Advanced'):
+                for equipment in ('gym', 'home', 'none', ''):
+                    for age in (30, 60):
+                        profile = self.profile(goal=goal, experience_level=level, equipment=equipment, age=age)
+                        data = synthesize_plan(profile)
+                        self.assertEqual(validate_plan_json(data), (True, 'ok'))
+                        self.assertEqual(data['member'], {'age': age, 'height_cm': 175, 'weight_kg': 80.0,
+                                                          'goal': goal})
+                        self.assertEqual([day['day'] for day in data['plan']], list(range(1, 8)))
+                        for day in data['plan']:
+                            self.assertEqual(set(day['diet']), self.DIET_SLOTS)
+                            self.assertTrue(all(isinstance(meal, str) and meal for meal in day['diet'].values()))
+                            self.assertTrue(day['workout'])
+                            for exercise in day['workout']:
+                                self.assertEqual(set(exercise), {'name', 'sets', 'reps', 'notes', 'muscle_group'})
+                                self.assertIsInstance(exercise['name'], str)
+                                self.assertIsInstance(exercise['reps'], str)
+                                self.assertTrue(exercise['sets'] is None or isinstance(exercise['sets'], int))
+
+    def test_equipment_decides_the_exercises(self):
+        allowed = {name for variants in EXERCISES['none'].values() for name in variants}
+        gym_only = {name for variants in EXERCISES['gym'].values() for name in variants} - allowed
+        names = {exercise['name'] for day in synthesize_plan(self.profile(equipment='none'))['plan']
+                 for exercise in day['workout'] if exercise['muscle_group'] not in ('cardio', 'mobility', 'rest')}
+        self.assertTrue(names)
+        self.assertLessEqual(names, allowed)
+        self.assertFalse(names & gym_only)
+
+    def test_plan_messages(self):
+        messages = build_plan_messages(self.profile(equipment='home'))
+        self.assertEqual([m['role'] for m in messages], ['system', 'user'])
+        system, prompt = messages[0]['content'], messages[1]['content']
+        self.assertIn('"member": {"age": int', system)
+        self.assertIn('"plan": [', system)
+        for line in ('Age: 35', 'Height_cm: 175', 'Weight_kg: 80.0', 'Goal: Fat Loss', 'Experience: Beginner',
+                     'Equipment: Home (dumbbells/bands)'):
+            self.assertIn(f'\n{line}\n', prompt)
+        self.assertIn('Equipment: Full gym', build_plan_messages(self.profile(equipment=''))[1]['content'])
+        self.assertNotEqual(build_plan_messages(self.profile(equipment='none')), messages)
+
+
+@override_settings(PLAN_JOBS_EAGER=False, PLAN_STREAMING=True, PLAN_ENGINE='rules')
+class PlanGenerationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('regen', password='pw')
+        self.profile = self.user.memberprofile
+
+    def generate(self):
+        return run_job(claim_job(enqueue_plan_job(self.profile).id))
+
+    def current(self):
+        return PlanGeneration.objects.get(member=self.profile, status=PlanGeneration.STATUS_CURRENT)
+
+    def test_failed_generation_leaves_the_previous_plan_active(self):
+        self.assertEqual(self.generate().status, PlanJob.STATUS_DONE)
+        previous = self.current()
+        days = synthesize_plan(self.profile)['plan']
+
+        def dies_after_two_days(profile, on_day):
+            on_day(days[0])
+            on_day(days[1])
+            raise RuntimeError('stream reset')
+
+        with patch('main.plan_jobs.stream_plans', dies_after_two_days), self.assertLogs('main.plan_jobs', 'ERROR'):
+            job = self.generate()
+        self.assertEqual(job.status, PlanJob.STATUS_FAILED)
+        self.assertEqual(self.current(), previous)
+        # the two streamed days went with their building generation
+        self.assertEqual(PlanGeneration.objects.filter(member=self.profile).count(), 1)
+        self.assertEqual(WorkoutPlan.objects.filter(member=self.profile).count(),
+                         WorkoutPlan.objects.filter(generation=previous).count())
+        self.assertTrue(MemberStats.objects.get(pk=self.profile.pk).has_plan)
+
+    def test_requeueing_a_crashed_stream_discards_its_partial_generation(self):
+        self.assertEqual(self.generate().status, PlanJob.STATUS_DONE)
+        previous = self.current()
+        day = synthesize_plan(self.profile)['plan'][0]
+
+        def worker_dies_after_one_day(profile, on_day):
+            on_day(day)
+            raise SystemExit   # the process goes away: run_job's error handling never runs
+
+        job = claim_job(enqueue_plan_job(self.profile).id)
+        with patch('main.plan_jobs.stream_plans', worker_dies_after_one_day), self.assertRaises(SystemExit):
+            run_job(job)
+        job.refresh_from_db()
+        orphan = job.generation
+        self.assertEqual((job.status, job.days_completed, orphan.status),
+                         (PlanJob.STATUS_RUNNING, 1, PlanGeneration.STATUS_BUILDING))
+        self.assertTrue(PlanDay.objects.filter(generation=orphan).exists())
+
+        PlanJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(minutes=30))
+        self.assertEqual(requeue_stale_jobs(older_than=600), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.generation, job.days_completed), (PlanJob.STATUS_QUEUED, None, 0))
+        self.assertFalse(PlanGeneration.objects.filter(id=orphan.id).exists())
+        self.assertFalse(PlanDay.objects.filter(generation_id=orphan.id).exists())
+        self.assertFalse(WorkoutPlan.objects.filter(generation_id=orphan.id).exists())
+        self.assertEqual(self.current(), previous)
+
+        self.assertEqual(run_job(claim_next_job()).status, PlanJob.STATUS_DONE)
+        self.assertEqual(PlanGeneration.objects.filter(member=self.profile).exclude(
+            status=PlanGeneration.STATUS_SUPERSEDED).count(), 1)
+
+    def test_promotion_supersedes_exactly_the_previous_generation(self):
+        first = start_generation(self.profile)
+        promote_generation(first)
+        second = start_generation(self.profile)
+        promote_generation(second)
+        first.refresh_from_db()
+        superseded_at = first.superseded_at
+        self.assertEqual(first.status, PlanGeneration.STATUS_SUPERSEDED)
+        self.assertIsNotNone(superseded_at)
+
+        building = start_generation(self.profile)
+        third = start_generation(self.profile)
+        promote_generation(third)
+        statuses = dict(PlanGeneration.objects.filter(member=self.profile).values_list('id', 'status'))
+        self.assertEqual(statuses, {
+            first.id: PlanGeneration.STATUS_SUPERSEDED,
+            second.id: PlanGeneration.STATUS_SUPERSEDED,
+            building.id: PlanGeneration.STATUS_BUILDING,   # other builds are not touched
+            third.id: PlanGeneration.STATUS_CURRENT,
+        })
+        first.refresh_from_db()
+        self.assertEqual(first.superseded_at, superseded_at)
+        # another member's plan is not superseded either
+        other = start_generation(User.objects.create_user('neighbour', password='pw').memberprofile)
+        promote_generation(other)
+        self.assertEqual(self.current(), third)
+
+    def test_concurrent_promotions_cannot_both_become_current(self):
+        old = start_generation(self.profile)
+        promote_generation(old)
+        winner = start_generation(self.profile)
+        loser = start_generation(self.profile)
+
+        # the loser supersedes what it sees as current, then the winner commits
+        # its whole promotion before the loser marks itself current
+        def save_after_winner(*args, **kwargs):
+            promote_generation(winner)
+            with transaction.atomic():
+                PlanGeneration.save(loser, *args, **kwargs)
+
+        loser.save = save_after_winner
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            try:
+                promote_generation(loser)
+            finally:
+                current = PlanGeneration.objects.filter(member=self.profile, status=PlanGeneration.STATUS_CURRENT)
+                self.assertEqual(list(current), [winner])
+        # the loser's transaction rolls back as a whole (here the winner's too, as they share one connection)
+        self.assertEqual(self.current(), old)
+
+
+class PlanReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.squatter = User.objects.create_user('squatter', password='pw').memberprofile
+        cls.puller = User.objects.create_user('puller', password='pw').memberprofile
+        # superseded plan: its curls no longer count
+        save_json_plan(cls.squatter, {'member': {}, 'plan': [
+            {'day': 1, 'workout': [{'name': 'Barbell Curl', 'sets': 5, 'reps': '10'}], 'diet': {}},
+        ]})
+        save_json_plan(cls.squatter, {'member': {}, 'plan': [
+            {'day': 1, 'workout': [{'name': 'Back Squat', 'sets': 4, 'reps': '5'},
+                                   {'name': 'Bench Press', 'sets': 3, 'reps': '8'}], 'diet': {'lunch': 'Rice'}},
+            {'day': 2, 'workout': [{'name': 'Goblet Squat', 'sets': 3, 'reps': '12'},
+                                   {'name': 'Plank', 'sets': 3, 'reps': '45 sec'}], 'diet': {}},
+            {'day': 3, 'workout': [{'name': 'Rest day', 'sets': None, 'reps': ''}], 'diet': {}},
+        ]})
+        save_json_plan(cls.puller, {'member': {}, 'plan': [
+            {'day': 1, 'workout': [{'name': 'Deadlift', 'sets': 5, 'reps': '3'},
+                                   {'name': 'Back Squat', 'sets': 2, 'reps': '5'}], 'diet': {}},
+        ]})
+        cls.admin = User.objects.create_superuser('ops', password='pw')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def report(self, **params):
+        response = self.client.get(reverse('plan_report'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_members_programmed_an_exercise(self):
+        data = self.report(exercise='squat')
+        self.assertEqual([m['username'] for m in data['members_programmed']], ['squatter', 'puller'])
+        self.assertEqual(data['members_programmed_count'], 2)
+        self.assertEqual(self.report(exercise='deadlift')['members_programmed'],
+                         [{'id': self.puller.pk, 'username': 'puller'}])
+        self.assertEqual(self.report(exercise='curl')['members_programmed_count'], 0)
+        self.assertNotIn('members_programmed', self.report())
+
+    def test_weekly_sets_by_muscle_group(self):
+        self.assertEqual(self.report(member=self.squatter.pk)['weekly_sets_by_muscle_group'],
+                         {'quads': 7, 'chest': 3, 'core': 3})
+        self.assertEqual(self.report()['weekly_sets_by_muscle_group'],
+                         {'quads': 9, 'chest': 3, 'core': 3, 'hamstrings': 5})
+
+    def test_admins_only_and_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse('plan_report'), {'member': 'me'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('plan_report'), {'member': 10 ** 6}).status_code, 404)
+        self.client.force_login(self.squatter.user)
+        self.assertEqual(self.client.get(reverse('plan_report')).status_code, 302)
+
+
+class JsonRepairTests(TestCase):
+    DAY1 = {'day': 1, 'workout': [{'name': 'Squat', 'sets': 3, 'reps': '8-12'}], 'diet': {'lunch': 'Rice'}}
+    DAY2 = {'day': 2, 'workout': [{'name': 'Row', 'sets': 4, 'reps': '10'}], 'diet': {'dinner': 'Fish'}}
+
+    def document(self, **kwargs):
+        return json.dumps({'member': {'age': 30}, 'plan': [self.DAY1, self.DAY2]}, **kwargs)
+
+    def test_complete_output(self):
+        result = parse_plan_output(self.document())
+        self.assertEqual((result.ok, result.truncated, result.recovered_days), (True, False, [1, 2]))
+        self.assertEqual(result.data['plan'], [self.DAY1, self.DAY2])
+
+    def test_truncated_objects_and_arrays(self):
+        text = self.document()
+        cuts = {
+            'inside the second day': text.index('"Row"') + 3,
+            'inside its workout array': text.index('{"name": "Row"'),
+            'after a number': text.index('4, "reps": "10"') + 1,
+            'between the days': text.index(', {"day": 2') + 1,
+            'before the plan array closes': len(text) - 2,
+        }
+        for where, cut in cuts.items():
+            result = parse_plan_output(text[:cut])
+            self.assertTrue(result.ok, where)
+            self.assertTrue(result.truncated, where)
+            self.assertEqual(result.data['member'], {'age': 30}, where)
+            if where == 'before the plan array closes':
+                self.assertEqual(result.recovered_days, [1, 2], where)
+                continue
+            self.assertEqual(result.data['plan'], [self.DAY1], where)
+            if where != 'between the days':
+                self.assertEqual(result.dropped_days, [(2, 'truncated')], where)
+
+    def test_truncated_inside_a_string_or_escape(self):
+        text = json.dumps({'member': {'age': 30}, 'plan': [self.DAY1, dict(self.DAY2, notes='Row \u00e9 "slow"')]})
+        for cut in (text.index('\\u00e9') + 4, text.index('\\"slow') + 1, text.index('slow') + 2):
+            result = parse_plan_output(text[:cut])
+            self.assertTrue(result.ok, cut)
+            self.assertEqual(result.data['plan'], [self.DAY1], cut)
+            self.assertEqual(result.dropped_days, [(2, 'truncated')], cut)
+
+    def test_trailing_commas(self):
+        text = ('{"member": {"age": 30,}, "plan": [' + json.dumps(self.DAY1)[:-1] + ',},'
+                + json.dumps(dict(self.DAY2, notes='keep ,] and ,} here')) + ',\n  ],}')
+        result = parse_plan_output(text)
+        self.assertTrue(result.ok, result.error)
+        self.assertFalse(result.truncated)
+        self.assertEqual(result.data['member'], {'age': 30})
+        self.assertEqual(result.data['plan'][0], self.DAY1)
+        self.assertEqual(result.data['plan'][1]['notes'], 'keep ,] and ,} here')
+        # trailing comma and a cut in the same output
+        result = parse_plan_output('{"member": {}, "plan": [' + json.dumps(self.DAY1)[:-1] + ',}, {"day": 2')
+        self.assertEqual((result.truncated, result.recovered_days), (True, [1]))
+
+    def test_code_fenced_output(self):
+        for raw in ('```json\n' + self.document(indent=2) + '\n```',
+                    "Here is your plan:\n```\n" + self.document() + "\n```\nStay consistent!"):
+            result = parse_plan_output(raw)
+            self.assertTrue(result.ok)
+            self.assertFalse(result.truncated)
+            self.assertEqual(result.recovered_days, [1, 2])
+        result = parse_plan_output('```json\n' + self.document()[:-30])
+        self.assertEqual((result.ok, result.truncated), (True, True))
+
+    def test_unrepairable_output(self):
+        cases = {
+            'Sorry, I cannot help with that.': 'no JSON object in output',
+            '': 'no JSON object in output',
+            '{]': 'unrepairable JSON',
+            '{"member": {}, "plan": "coming soon"}': 'plan: Input should be a valid list',
+            '{"plan": []}': 'member: Field required',
+            '{"member": {}, "plan": [{"day": 1, "workout": "run"}]}': 'no valid days in plan',
+        }
+        for raw, error in cases.items():
+            result = parse_plan_output(raw)
+            self.assertFalse(result.ok, raw)
+            self.assertIsNone(result.data)
+            self.assertIn(error, result.error, raw)
+
+
+class ConcurrentChunkWriteTests(TransactionTestCase):
+    CHUNK = 256 * 1024
+
+    def setUp(self):
+        parts = tempfile.TemporaryDirectory()
+        self.addCleanup(parts.cleanup)
+        settings_override = override_settings(PHOTO_UPLOAD_DIR=parts.name, PHOTO_UPLOAD_CHUNK_BYTES=self.CHUNK)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        member = User.objects.create_user('uploader', password='pw').memberprofile
+        self.upload = start_upload(member, 'front.jpg', 2 * self.CHUNK, 'a' * 64)
+
+    def test_overlapping_writes_at_same_offset_are_serialized(self):
+        first, second = b'A' * self.CHUNK, b'B' * self.CHUNK
+        released = threading.Event()
+
+        class StalledStream:
+            """Hands out one block, then waits until the test lets it go on."""
+            def __init__(self, data):
+                self.data = io.BytesIO(data)
+                self.reads = 0
+
+            def read(self, size):
+                self.reads += 1
+                if self.reads == 2:
+                    released.wait(5)
+                return self.data.read(size)
+
+        outcomes = {}
+
+        def writer(name, data, stream):
+            try:
+                session = PhotoUpload.objects.get(pk=self.upload.pk)
+                outcomes[name] = write_chunk(session, 0, stream, len(data), hashlib.sha256(data).hexdigest())
+            except UploadError as e:
+                outcomes[name] = e
+            finally:
+                connection.close()
+
+        a = threading.Thread(target=writer, args=('a', first, StalledStream(first)))
+        a.start()
+        time.sleep(0.2)   # a holds the part file, mid-chunk
+        b = threading.Thread(target=writer, args=('b', second, io.BytesIO(second)))
+        b.start()
+        b.join(0.5)
+        self.assertTrue(b.is_alive(), "second writer went ahead while the first was mid-chunk")
+        released.set()
+        a.join(5)
+        b.join(5)
+
+        self.assertEqual(outcomes['a'], self.CHUNK)
+        self.assertIsInstance(outcomes['b'], UploadError)
+        self.assertEqual((outcomes['b'].status, outcomes['b'].offset), (409, self.CHUNK))
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.received, self.CHUNK)
+        with open(part_path(self.upload), 'rb') as f:
+            self.assertEqual(f.read(), first)
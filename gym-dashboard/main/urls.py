@@ -9,16 +9,29 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('make-payment/', views.make_payment, name='make_payment'),
     path('admin/payments/', views.admin_payments, name='admin_payments'),
+    path('ops/llm-status/', views.llm_status, name='llm_status'),
+    path('ops/plan-report/', views.plan_report, name='plan_report'),
     path('generate-plan/', views.generate_plan, name='generate_plan'),
     path('generate-plan/<int:member_id>/', views.generate_plan, name='generate_plan_member'),
     path('api/progress-data/', views.progress_data, name='progress_data'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
 path('progress/add/', views.add_progress, name='add_progress'),
 path('api/v1/progress/', views.api_progress_list, name='api_progress_list'),
+path('api/v1/progress/analytics/', views.api_progress_analytics, name='api_progress_analytics'),
+path('api/v1/progress/import/', views.api_progress_import, name='api_progress_import'),
+path('export/<slug:dataset>/', views.export_data, name='export_data'),
 path('plan/delete/<int:id>/', views.delete_plan, name='delete_plan'),
 path('ajax/generate-plan/', views.generate_plan_ajax, name='generate_plan_ajax'),
+path('ajax/plan-jobs/<int:job_id>/', views.plan_job_status, name='plan_job_status'),
+path('ajax/plan-jobs/<int:job_id>/events/', views.plan_job_events, name='plan_job_events'),
 path('ajax/delete-plan/<int:plan_id>/', views.delete_plan_ajax, name='delete_plan_ajax'),
 path('progress/photos/upload/', views.upload_progress_photo, name='upload_progress_photo'),
+path('progress/photos/<int:photo_id>/<slug:variant>/<path:name>', views.photo_file, name='photo_file'),
+path('api/v1/photos/', views.api_photo_list, name='api_photo_list'),
+path('api/v1/photos/uploads/', views.api_photo_upload_start, name='api_photo_upload_start'),
+path('api/v1/photos/uploads/<uuid:upload_id>/', views.api_photo_upload, name='api_photo_upload'),
+path('api/v1/photos/uploads/<uuid:upload_id>/complete/', views.api_photo_upload_complete,
+     name='api_photo_upload_complete'),
 path('ajax/ai-coach/', views.ai_coach_ajax, name='ai_coach_ajax'),
 
 ]
@@ -12,58 +12,197 @@ from .forms import (
     ProgressPhotoForm,
 )
 
-from .models import MemberProfile, Payment, WorkoutPlan, DietPlan, Progress
-from .ai_utils import generate_plans
-from .ai_parser import save_parsed_plans
+from .models import (MemberProfile, MemberStats, Payment, WorkoutPlan, DietPlan, Progress, PlanJob, PlanGeneration,
+                     PhotoUpload)
+from .member_stats import refresh_member_stats, progress_marker
+from .pagination import keyset_page
+from .downsample import lttb
+from . import analytics
+from .achievements import badges_for
+from .progress_import import FORMATS as IMPORT_FORMATS, detect_format, import_progress
+from .exports import export_filename, stream_export
+from .photo_renditions import photo_uploaded
+from .chunked_uploads import UploadError, finish_upload, start_upload, write_chunk
+from .photo_renditions import RENDITION_FIELDS
+from .file_serving import send_file
+from . import dashboard_cache
+from .plan_jobs import enqueue_plan_job
+from .plan_cache import plan_cache_stats
+from .plan_queries import members_programmed, weekly_sets_by_muscle_group
+from .resilience import cache_scope
+from . import llm
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .serializers import ProgressSerializer
-from .ai_utils import generate_plans
-from .ai_json_parser import save_json_plan
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponseForbidden
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, condition
+from django.views.decorators.cache import cache_control
 from django.utils import timezone
-from datetime import timedelta
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count
+from datetime import date, timedelta
+import asyncio
+import json
+import math
+import time
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from .models import WorkoutPlan, Progress, ProgressPhoto
 from .forms import ProgressPhotoForm
 
+# how often / how long plan_job_events watches a job
+PLAN_EVENTS_POLL_INTERVAL = 0.5
+PLAN_EVENTS_TIMEOUT = 180
+
+# members listed by plan_report; members_programmed_count covers the rest
+PLAN_REPORT_MEMBERS = 500
+
+
 @require_POST
 @login_required
 def generate_plan_ajax(request):
     """
-    AJAX endpoint to generate plan for the logged-in user.
-    Returns JSON: {ok: true, message: "...", created_count: N}
+    AJAX endpoint to queue plan generation for the logged-in user.
+    Returns JSON right away: {ok: true, job_id: N, status: "queued", status_url: "..."}
+    The client polls status_url until the job is done/failed.
     """
     profile = request.user.memberprofile
     if not profile.is_payment_approved:
         return JsonResponse({'ok': False, 'message': 'Payment not approved.'}, status=403)
 
-    # call existing generate helper (which returns structured JSON or fallback)
-    from .ai_utils import generate_plans
-    from .ai_json_parser import save_json_plan
+    job = enqueue_plan_job(profile)
+    return JsonResponse({
+        'ok': True,
+        'message': 'Plan generation queued.',
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': reverse('plan_job_status', args=[job.id]),
+        'events_url': reverse('plan_job_events', args=[job.id]),
+    }, status=202)
+
+
+@login_required
+def plan_job_status(request, job_id):
+    """
+    Poll endpoint for a PlanJob (only owner or admin allowed).
+    Returns JSON: {ok: true, job_id: N, status: "queued|running|done|failed", message: "...", created_count: N}
+    """
+    job = get_object_or_404(PlanJob.objects.select_related('member__user'), id=job_id)
+    if not (request.user.is_superuser or job.member.user == request.user):
+        return HttpResponseForbidden("Not allowed")
 
-    resp = generate_plans(profile)
+    return JsonResponse({
+        'ok': job.status != PlanJob.STATUS_FAILED,
+        'job_id': job.id,
+        'status': job.status,
+        'message': job.message,
+        'created_count': job.created_count,
+    })
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _open_event_stream(user_id):
+    """
+    Count one more open plan_job_events stream for this user. Returns the
+    counter's cache key, or None if the user already has the maximum open.
+    """
+    key = f'plan-events:streams:{user_id}'
+    # expires on its own if a process dies without closing its streams
+    await cache.aadd(key, 0, timeout=PLAN_EVENTS_TIMEOUT + 60)
     try:
-        if resp.get('type') == 'json':
-            parsed = resp.get('data')
-            created = save_json_plan(profile, parsed)
-            return JsonResponse({'ok': True, 'message': 'AI JSON plan generated.', 'created_count': len(created)})
-        else:
-            # fallback: parse raw text (use existing parser to create at least one plan)
-            # save_parsed_plans is robust; use it
-            from .ai_parser import save_parsed_plans
-            text = resp.get('text') if isinstance(resp, dict) else str(resp)
-            created = save_parsed_plans(profile, text)
-            return JsonResponse({'ok': True, 'message': 'Fallback plan generated.', 'created_count': len(created)})
-    except Exception as e:
-        # on error return helpful message
-        return JsonResponse({'ok': False, 'message': f'Failed to generate/save plan: {str(e)}'}, status=500)
+        streams = await cache.aincr(key)
+    except ValueError:   # expired between add() and incr()
+        await cache.aset(key, 1, timeout=PLAN_EVENTS_TIMEOUT + 60)
+        streams = 1
+    if streams > settings.PLAN_EVENTS_MAX_STREAMS:
+        await _close_event_stream(key)
+        return None
+    return key
+
+
+async def _close_event_stream(key):
+    try:
+        await cache.adecr(key)
+    except ValueError:
+        pass
+
+
+@login_required
+async def plan_job_events(request, job_id):
+    """
+    Server-sent events for a PlanJob. Pushes each day's WorkoutPlan as soon as
+    the worker saves it ("day" events), then one "status" event when the job
+    finishes (done/failed). Only owner or admin allowed.
+
+    Async so that a waiting stream holds no worker thread; that only holds
+    when served through ASGI (gymapp.asgi). Under WSGI, and past
+    settings.PLAN_EVENTS_MAX_STREAMS open streams per user, the client is
+    turned away and falls back to polling plan_job_status.
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI would buffer the whole stream in one thread; 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    user = await request.auser()
+    try:
+        job = await PlanJob.objects.select_related('member').aget(id=job_id)
+    except PlanJob.DoesNotExist:
+        raise Http404("No PlanJob matches the given query.")
+    if not (user.is_superuser or job.member.user_id == user.id):
+        return HttpResponseForbidden("Not allowed")
+    stream_key = await _open_event_stream(user.id)
+    if stream_key is None:
+        return HttpResponse("Too many open event streams.", status=429)
+
+    async def events():
+        last_id = 0
+        deadline = time.monotonic() + PLAN_EVENTS_TIMEOUT
+        try:
+            yield "retry: 2000\n\n"
+            while time.monotonic() < deadline:
+                current = await (PlanJob.objects.filter(id=job.id)
+                                 .values('status', 'generation_id', 'message', 'created_count').afirst())
+                if current is None:
+                    yield _sse('status', {'status': PlanJob.STATUS_FAILED, 'message': 'Job deleted.'})
+                    return
+                if current['generation_id']:
+                    new_days = (
+                        WorkoutPlan.objects
+                        .filter(generation_id=current['generation_id'], id__gt=last_id)
+                        .order_by('id')
+                        .values('id', 'title', 'content')
+                    )
+                    async for day in new_days:
+                        last_id = day['id']
+                        yield _sse('day', day)
+                if current['status'] in (PlanJob.STATUS_DONE, PlanJob.STATUS_FAILED):
+                    yield _sse('status', {
+                        'status': current['status'],
+                        'message': current['message'],
+                        'created_count': current['created_count'],
+                    })
+                    return
+                # comment line doubles as a keep-alive for proxies
+                yield ": waiting\n\n"
+                await asyncio.sleep(PLAN_EVENTS_POLL_INTERVAL)
+            yield _sse('status', {'status': 'timeout', 'message': 'Still generating — check back shortly.'})
+        finally:
+            # also runs when the client disconnects: ASGI cancels the stream mid-sleep
+            await _close_event_stream(stream_key)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
 
 
 @require_POST
@@ -81,13 +220,271 @@ def delete_plan_ajax(request, plan_id):
 
 
 
+PROGRESS_FIELDS = tuple(ProgressSerializer.Meta.fields)
+PROGRESS_MAX_LIMIT = 1000
+PROGRESS_MAX_POINTS = 2000
+
+
+def _bounded_int(params, name, low, high):
+    try:
+        value = int(params[name])
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer")
+    return max(low, min(high, value))
+
+
+def _progress_rows(request, entries, default_fields):
+    """
+    Apply the progress API query options to a member's Progress queryset:
+      from, to        ISO dates, inclusive
+      fields          comma-separated subset of PROGRESS_FIELDS
+      limit, cursor   keyset pagination on (date, id) (main/pagination.py)
+      points          downsample the weight series to at most N points with
+                      LTTB (main/downsample.py); the whole range, no paging
+    Returns (rows, next_cursor). Raises ValueError for bad parameters.
+    """
+    params = request.GET
+    for name, lookup in (('from', 'date__gte'), ('to', 'date__lte')):
+        if params.get(name):
+            try:
+                entries = entries.filter(**{lookup: date.fromisoformat(params[name])})
+            except ValueError:
+                raise ValueError(f"'{name}' must be a YYYY-MM-DD date")
+    fields = [f.strip() for f in params['fields'].split(',') if f.strip()] if params.get('fields') else []
+    fields = fields or list(default_fields)
+    unknown = [f for f in fields if f not in PROGRESS_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown field(s): {', '.join(unknown)}")
+
+    next_cursor = None
+    if params.get('points'):
+        points = _bounded_int(params, 'points', 3, PROGRESS_MAX_POINTS)
+        rows = list(entries.exclude(weight_kg=None).order_by('date', 'id')
+                    .values(*set(fields) | {'date', 'weight_kg'}))
+        rows = [rows[i] for i in lttb([(r['date'].toordinal(), r['weight_kg']) for r in rows], points)]
+    elif params.get('limit') or params.get('cursor'):
+        limit = _bounded_int(params, 'limit', 1, PROGRESS_MAX_LIMIT) if params.get('limit') else PROGRESS_MAX_LIMIT
+        rows, next_cursor = keyset_page(entries.values(*set(fields) | {'date', 'id'}),
+                                        params.get('cursor'), limit)
+    else:
+        rows = entries.order_by('date', 'id').values(*fields)
+    return [{f: row[f] for f in fields} for row in rows], next_cursor
+
+
+def _next_link(request, next_cursor):
+    if not next_cursor:
+        return {}
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    return {'Link': f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'}
+
+
+def _progress_marker(request):
+    # etag/last_modified both need it; read MemberStats once per request
+    if not hasattr(request, '_progress_marker'):
+        request._progress_marker = progress_marker(request.user) if request.user.is_authenticated else None
+    return request._progress_marker
+
+
+def _progress_etag(name):
+    def etag(request, *args, **kwargs):
+        marker = _progress_marker(request)
+        return f'{name}-{marker[0]}-{marker[1]}' if marker else None
+    return etag
+
+
+def _progress_last_modified(request, *args, **kwargs):
+    marker = _progress_marker(request)
+    return marker[2] if marker else None
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_progress_etag('progress-list'), last_modified_func=_progress_last_modified)
 def api_progress_list(request):
+    """
+    The member's progress history, oldest first. Supports the options of
+    _progress_rows(); with limit/cursor the next page is in the Link header.
+    """
     profile = request.user.memberprofile
-    entries = profile.progress.order_by('date')
-    serializer = ProgressSerializer(entries, many=True)
-    return Response(serializer.data)
+    try:
+        rows, next_cursor = _progress_rows(request, profile.progress.all(), PROGRESS_FIELDS)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    return Response(rows, headers=_next_link(request, next_cursor))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_progress_import(request):
+    """
+    Upload a CSV or NDJSON progress history as multipart `file` (format from
+    the file name, or the `format` field). Rows are upserted by date; returns
+    counts and the first row errors (main/progress_import.py).
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'detail': "Upload the history as a 'file' field."}, status=400)
+    if upload.size > settings.PROGRESS_IMPORT_MAX_BYTES:
+        return Response({'detail': f"File is larger than {settings.PROGRESS_IMPORT_MAX_BYTES} bytes."}, status=413)
+    fmt = request.data.get('format') or detect_format(upload.name)
+    if fmt not in IMPORT_FORMATS:
+        return Response({'detail': f"'format' must be one of: {', '.join(IMPORT_FORMATS)}"}, status=400)
+    try:
+        result = import_progress(request.user.memberprofile.pk, upload.file, fmt)
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({'detail': str(e)}, status=400)
+    return Response(result.as_dict())
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cache_control(private=True, no_cache=True)
+def api_progress_analytics(request):
+    """
+    Weekly/monthly rollups, rolling average, trend and projected goal date
+    for ?metric=weight|body_fat (main/analytics.py). Optional ?target= and
+    ?window= (rolling window in days).
+    """
+    params = request.GET
+    metric = params.get('metric', 'weight')
+    if metric not in analytics.METRICS:
+        return Response({'detail': f"'metric' must be one of: {', '.join(analytics.METRICS)}"}, status=400)
+    try:
+        target = float(params['target']) if params.get('target') else None
+        if target is not None and not math.isfinite(target):
+            raise ValueError(target)   # nan / inf / 1e400 would break the goal projection
+        window = _bounded_int(params, 'window', 1, 365) if params.get('window') else 7
+    except ValueError:
+        return Response({'detail': "'target' must be a number and 'window' an integer"}, status=400)
+    profile = request.user.memberprofile
+    data = dashboard_cache.cached_value(
+        profile.pk, 'analytics',
+        lambda: analytics.summarize(profile, metric, target=target, window_days=window),
+        extra=f'{metric}:{target}:{window}',
+    )
+    return Response(data)
+
+def _upload_state(request, upload):
+    return {
+        'id': str(upload.pk),
+        'status': upload.status,
+        'offset': upload.received,
+        'size': upload.size,
+        'chunk_size': settings.PHOTO_UPLOAD_CHUNK_BYTES,
+        'url': request.build_absolute_uri(reverse('api_photo_upload', args=[upload.pk])),
+        'photo_id': upload.photo_id,
+    }
+
+
+def _upload_error(e):
+    data = {'detail': str(e)}
+    headers = {}
+    if e.offset is not None:
+        data['offset'] = e.offset
+        headers['Upload-Offset'] = str(e.offset)
+    return Response(data, status=e.status, headers=headers)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_photo_upload_start(request):
+    """
+    Start a chunked progress photo upload (main/chunked_uploads.py). Send
+    `filename`, `size`, `sha256` (hex, whole file) and optionally `caption`;
+    then PUT the bytes to the returned `url` and POST to its complete/.
+    """
+    data = request.data
+    try:
+        upload = start_upload(request.user.memberprofile, data.get('filename'), data.get('size'),
+                              data.get('sha256'), data.get('caption', ''))
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(_upload_state(request, upload), status=201)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+@cache_control(private=True, no_store=True)
+def api_photo_upload(request, upload_id):
+    """
+    GET: where to resume (`offset`). PUT: the next chunk as the raw body,
+    starting at the `Upload-Offset` header (or ?offset=). An optional
+    `X-Chunk-SHA256` header is checked before the chunk is acknowledged.
+    """
+    upload = get_object_or_404(PhotoUpload, pk=upload_id, member=request.user.memberprofile)
+    if request.method == 'GET':
+        return Response(_upload_state(request, upload), headers={'Upload-Offset': str(upload.received)})
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.GET.get('offset', '')))
+    except ValueError:
+        return Response({'detail': "Send the chunk's position as an Upload-Offset header."}, status=400)
+    length = request.META.get('CONTENT_LENGTH')
+    try:
+        # request.stream, not request.data: the body is copied to disk block by block
+        write_chunk(upload, offset, request.stream, int(length) if length else None,
+                    chunk_sha256=request.headers.get('X-Chunk-SHA256'))
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(_upload_state(request, upload), headers={'Upload-Offset': str(upload.received)})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_photo_upload_complete(request, upload_id):
+    """
+    Verify size and checksum and save the ProgressPhoto. Safe to retry.
+    """
+    upload = get_object_or_404(PhotoUpload, pk=upload_id, member=request.user.memberprofile)
+    try:
+        photo = finish_upload(upload)
+    except UploadError as e:
+        return _upload_error(e)
+    return Response(dict(_upload_state(request, upload), photo_id=photo.pk), status=201)
+
+
+PHOTO_PAGE_SIZE = 24
+PHOTO_MAX_LIMIT = 100
+# url variant -> ProgressPhoto file field
+PHOTO_VARIANTS = {'original': 'image', **{field: field for field in RENDITION_FIELDS}}
+
+
+def _photo_row(request, photo):
+    urls = {}
+    for variant, field in PHOTO_VARIANTS.items():
+        file = getattr(photo, field)
+        urls[variant] = (request.build_absolute_uri(reverse('photo_file', args=[photo.pk, variant, file.name]))
+                         if file else None)
+    return {
+        'id': photo.pk,
+        'created_at': photo.created_at,
+        'caption': photo.caption,
+        'renditions_status': photo.renditions_status,
+        'thumb_width': photo.thumb_width,
+        'thumb_height': photo.thumb_height,
+        'urls': urls,
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cache_control(private=True, no_cache=True)
+def api_photo_list(request):
+    """
+    The member's progress photos, oldest first, keyset-paginated on
+    (created_at, id): ?limit= (default 24, max 100) and ?cursor=, with the
+    next page in the Link header. Rendition URLs are null until rendered.
+    """
+    params = request.GET
+    try:
+        limit = _bounded_int(params, 'limit', 1, PHOTO_MAX_LIMIT) if params.get('limit') else PHOTO_PAGE_SIZE
+        photos, next_cursor = keyset_page(request.user.memberprofile.photos.all(), params.get('cursor'),
+                                          limit, key='created_at')
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    return Response([_photo_row(request, photo) for photo in photos], headers=_next_link(request, next_cursor))
+
 
 def home(request):
     return render(request, 'main/home.html')
@@ -114,6 +511,7 @@ def register(request):
             profile.gender = profile_data.get('gender') or profile.gender
             profile.goal = profile_data.get('goal') or profile.goal
             profile.experience_level = profile_data.get('experience_level') or profile.experience_level
+            profile.equipment = profile_data.get('equipment') or profile.equipment
             profile.save()
 
             messages.success(request, "Registration successful. Please login.")
@@ -175,10 +573,14 @@ def add_progress(request):
     if request.method == 'POST':
         form = ProgressEnteryForm(request.POST)   # ← correct name here
         if form.is_valid():
-            pe = form.save(commit=False)
-            pe.member = profile
-            pe.save()
-            messages.success(request, "Progress entry added.")
+            # one entry per day: logging a date again updates it; blank fields keep their value
+            data = form.cleaned_data
+            values = {f: data[f] for f in ('weight_kg', 'body_fat_pct', 'notes') if data[f] not in (None, '')}
+            _, created = Progress.objects.update_or_create(member=profile, date=data['date'], defaults=values)
+            if created:
+                messages.success(request, "Progress entry added.")
+            else:
+                messages.success(request, f"Progress entry for {data['date']:%d %b %Y} updated.")
             return redirect('dashboard')
     else:
         form = ProgressEnteryForm()
@@ -187,41 +589,46 @@ def add_progress(request):
 
 @login_required
 def dashboard(request):
-    profile = request.user.memberprofile
-
-    workouts = profile.workouts.order_by('-created_at')[:10]
-    diets = profile.diets.order_by('-created_at')[:5]
-    progress_qs = profile.progress.order_by('date')  # oldest → newest
+    # the analytics below read only the MemberStats snapshot (joined by primary key)
+    profile = MemberProfile.objects.select_related('stats').get(user=request.user)
+    try:
+        stats = profile.stats
+    except MemberStats.DoesNotExist:
+        # member predates MemberStats and `manage.py rebuild_member_stats` hasn't run yet
+        stats = refresh_member_stats(profile.pk)
+
+    # only the current plan generation; superseded ones stay in the DB as history
+    # (querysets below are only evaluated when their fragment isn't cached)
+    workouts = WorkoutPlan.objects.filter(
+        generation__member=profile, generation__status=PlanGeneration.STATUS_CURRENT,
+    ).order_by('id')
+    diets = DietPlan.objects.filter(
+        generation__member=profile, generation__status=PlanGeneration.STATUS_CURRENT,
+    ).order_by('id')
     progress_recent = profile.progress.order_by('-date')[:20]
     photos = profile.photos.order_by('-created_at')[:6]
 
     # --- ANALYTICS: BMI, weight change, goal progress ---
-    bmi = None
+    bmi = stats.bmi
     bmi_status = None
-    start_weight = None
-    current_weight = None
+    start_weight = stats.first_weight_kg
+    current_weight = stats.last_weight_kg
     weight_change = None
-    progress_count = progress_qs.count()
+    progress_count = stats.entry_count
 
     if progress_count > 0:
-        start_weight = progress_qs.first().weight_kg
-        current_weight = progress_qs.last().weight_kg
         if start_weight and current_weight:
             weight_change = current_weight - start_weight  # positive = gain, negative = loss
 
-    if profile.height_cm and (profile.weight_kg or current_weight):
-        h_m = profile.height_cm / 100.0
-        w = current_weight or profile.weight_kg
-        if h_m > 0 and w:
-            bmi = round(w / (h_m * h_m), 1)
-            if bmi < 18.5:
-                bmi_status = "Underweight"
-            elif bmi < 25:
-                bmi_status = "Normal"
-            elif bmi < 30:
-                bmi_status = "Overweight"
-            else:
-                bmi_status = "Obese"
+    if bmi:
+        if bmi < 18.5:
+            bmi_status = "Underweight"
+        elif bmi < 25:
+            bmi_status = "Normal"
+        elif bmi < 30:
+            bmi_status = "Overweight"
+        else:
+            bmi_status = "Obese"
 
     # simple goal progress estimate based on weight change
     goal_progress_percent = 0
@@ -238,16 +645,23 @@ def dashboard(request):
 
     # --- WEEKLY ACTIVITY (last 7 days progress calendar) ---
     today = timezone.now().date()
-    last7 = []
-    progress_dates = set(p.date for p in progress_qs if p.date)
-    for i in range(6, -1, -1):
-        d = today - timedelta(days=i)
-        label = d.strftime('%a')  # Mon, Tue...
-        last7.append({
-            "label": label,
-            "date": d,
-            "active": d in progress_dates
-        })
+    # a streak is only "current" if it reaches today or yesterday
+    streak = stats.current_streak if stats.last_entry_date and stats.last_entry_date >= today - timedelta(days=1) else 0
+
+    def weekly_activity():
+        last7 = []
+        progress_dates = set(
+            profile.progress.filter(date__range=(today - timedelta(days=6), today)).values_list('date', flat=True)
+        )
+        for i in range(6, -1, -1):
+            d = today - timedelta(days=i)
+            label = d.strftime('%a')  # Mon, Tue...
+            last7.append({
+                "label": label,
+                "date": d,
+                "active": d in progress_dates
+            })
+        return last7
 
     # --- DIET MACROS (simple percentages based on goal) ---
     goal = (profile.goal or "").lower()
@@ -258,35 +672,34 @@ def dashboard(request):
     else:
         macros = {"protein": 30, "carbs": 45, "fat": 25}
 
-    # --- ACHIEVEMENTS / BADGES ---
-    achievements = []
-    if progress_count >= 1:
-        achievements.append("First Step: Logged your progress")
-    if progress_count >= 7:
-        achievements.append("Consistency: 7+ progress updates")
-    if progress_count >= 30:
-        achievements.append("Committed: 30+ progress logs")
-    if workouts.exists():
-        achievements.append("AI Explorer: Generated workout plan")
-    if bmi and 18.5 <= bmi <= 24.9:
-        achievements.append("Healthy BMI Range")
-
     photo_form = ProgressPhotoForm()
 
-    context = {
-        "profile": profile,
-        "workouts": workouts,
-        "diets": diets,
-        "progress": progress_recent,
+    metrics = {
         "bmi": bmi,
         "bmi_status": bmi_status,
         "start_weight": start_weight,
         "current_weight": current_weight,
         "weight_change": weight_change,
         "goal_progress_percent": goal_progress_percent,
-        "weekly_activity": last7,
+        "streak": streak,
+    }
+    # sections are served from main.dashboard_cache until the member's data changes
+    fragments = dashboard_cache.render_sections(request, profile.pk, {
+        "metrics": lambda: dict(metrics, weekly_activity=weekly_activity()),
+        # earned badges are stored by main.achievements when their events fire
+        "achievements": lambda: {"achievements": badges_for(profile.pk)},
+        "photos": lambda: {"photos": photos},
+        "plans": lambda: {"workouts": workouts},
+    }, extra={"metrics": today.isoformat()}, stats=stats)  # weekly strip and streak move with the date
+
+    context = {
+        "profile": profile,
+        "workouts": workouts,
+        "diets": diets,
+        "progress": progress_recent,
+        **metrics,
+        "fragments": fragments,
         "macros": macros,
-        "achievements": achievements,
         "photos": photos,
         "photo_form": photo_form,
     }
@@ -354,6 +767,56 @@ def admin_payments(request):
         return redirect('admin_payments')
     return render(request, 'main/admin_payments.html', {'payments': payments})
 
+@user_passes_test(lambda u: u.is_superuser)
+def llm_status(request):
+    """
+    Admin-only JSON snapshot of the plan generation path: circuit breaker
+    state, plan/dashboard cache hit/miss counters and job queue depth.
+    Breaker state and counters kept in a local-memory cache belong to the
+    process that answered; their "scope" is 'process' then, not 'shared'.
+    """
+    queue = dict(
+        PlanJob.objects.filter(status__in=[PlanJob.STATUS_QUEUED, PlanJob.STATUS_RUNNING])
+        .values_list('status').annotate(n=Count('id'))
+    )
+    client = llm.get_client()
+    return JsonResponse({
+        'backend': client.name if client else None,
+        'circuit': llm.breaker.snapshot(),
+        'plan_cache': dict(plan_cache_stats(), scope=cache_scope(settings.PLAN_CACHE_ALIAS)),
+        'dashboard_cache': dashboard_cache.dashboard_cache_stats(),
+        'dashboard_cache_scope': cache_scope(settings.DASHBOARD_CACHE_ALIAS),
+        'queue': {
+            'queued': queue.get(PlanJob.STATUS_QUEUED, 0),
+            'running': queue.get(PlanJob.STATUS_RUNNING, 0),
+        },
+    })
+
+@user_passes_test(lambda u: u.is_superuser)
+def plan_report(request):
+    """
+    Admin-only JSON report over the current plans (main/plan_queries.py):
+    weekly sets per muscle group, for everyone or ?member=<id>, and with
+    ?exercise=squat the members programmed that exercise.
+    """
+    member = None
+    if request.GET.get('member'):
+        try:
+            member = get_object_or_404(MemberProfile, pk=int(request.GET['member']))
+        except ValueError:
+            return JsonResponse({'detail': "'member' must be a member id"}, status=400)
+    data = {'weekly_sets_by_muscle_group': weekly_sets_by_muscle_group(member)}
+    exercise = request.GET.get('exercise', '').strip()
+    if exercise:
+        members = members_programmed(exercise).order_by('pk')
+        data['exercise'] = exercise
+        data['members_programmed'] = [
+            {'id': pk, 'username': username}
+            for pk, username in members.values_list('pk', 'user__username')[:PLAN_REPORT_MEMBERS]
+        ]
+        data['members_programmed_count'] = members.count()
+    return JsonResponse(data)
+
 @login_required
 def make_payment(request):
     # simple demo: create a Payment record (no real gateway)
@@ -386,33 +849,14 @@ def generate_plan(request, member_id=None):
         messages.error(request, "Payment not approved. Please make payment and wait for admin approval.")
         return redirect('dashboard')
 
-    resp = generate_plans(profile)  # new generate_plans returns dict with type
-
-    try:
-        if resp.get('type') == 'json':
-            parsed = resp.get('data')
-            # Save parsed JSON to DB using the parser
-            created = save_json_plan(profile, parsed)
-            messages.success(request, f"AI JSON plan generated and saved ({len(created)} workout entries).")
-        elif resp.get('type') == 'fallback':
-            # If fallback contains a plain text 'text', save a raw blob
-            text = resp.get('text') or resp.get('data') or "No plan returned"
-            WorkoutPlan.objects.create(member=profile, title='AI Plan (fallback)', content=text)
-            DietPlan.objects.create(member=profile, title='AI Diet (fallback)', content='Refer to AI Plan')
-            messages.warning(request, "AI JSON unavailable — saved fallback plan text.")
-        else:
-            # Unknown response shape
-            WorkoutPlan.objects.create(member=profile, title='AI Plan (unknown)', content=str(resp))
-            messages.warning(request, "AI returned unexpected format — saved raw response.")
-    except Exception as e:
-        # If saving/parsing failed, store raw text so user still gets something
-        try:
-            raw_text = resp.get('text') if isinstance(resp, dict) else str(resp)
-            WorkoutPlan.objects.create(member=profile, title='AI Plan (error)', content=raw_text)
-            DietPlan.objects.create(member=profile, title='AI Diet (error)', content='Refer to AI Plan (error)')
-        except Exception:
-            pass
-        messages.error(request, f"Failed to parse/save AI plan: {str(e)}")
+    # generation runs on the plan workers (manage.py run_plan_workers)
+    job = enqueue_plan_job(profile)
+    if job.status == PlanJob.STATUS_DONE:
+        messages.success(request, job.message)
+    elif job.status == PlanJob.STATUS_FAILED:
+        messages.error(request, f"Failed to parse/save AI plan: {job.error}")
+    else:
+        messages.info(request, "Plan generation queued. Your plan will appear on the dashboard shortly.")
 
     return redirect('dashboard')
 
@@ -426,6 +870,7 @@ def upload_progress_photo(request):
         photo = form.save(commit=False)
         photo.member = profile
         photo.save()
+        photo_uploaded(photo)  # renditions are made off the request path
         messages.success(request, "Progress photo uploaded successfully.")
 
         # If using AJAX, return JSON
@@ -452,7 +897,76 @@ def upload_progress_photo(request):
 
 
 @login_required
+def photo_file(request, photo_id, variant, name):
+    """
+    One file of a progress photo, for its owner or a superuser. Access is
+    checked here; the front proxy sends the bytes (main/file_serving.py).
+    The URL carries the stored name, which never gets new content, so
+    responses are cacheable for good.
+    """
+    field = PHOTO_VARIANTS.get(variant)
+    if field is None:
+        raise Http404("Unknown photo variant")
+    photos = ProgressPhoto.objects.only('id', field, 'thumb_width', 'thumb_height')  # thumb reads its dimensions
+    if not request.user.is_superuser:
+        photos = photos.filter(member__user=request.user)
+    file = getattr(get_object_or_404(photos, pk=photo_id), field)
+    if not file or file.name != name:
+        raise Http404("Photo file not found")
+    return send_file(file, immutable=True)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)  # always revalidate; unchanged history -> 304
+@condition(etag_func=_progress_etag('progress-data'), last_modified_func=_progress_last_modified)
 def progress_data(request):
+    """
+    Chart series (date, weight_kg); accepts the same options as api_progress_list,
+    e.g. ?points=400 for a downsampled series.
+    """
     profile = request.user.memberprofile
-    data = list(profile.progress.order_by('date').values('date','weight_kg'))
-    return JsonResponse(data, safe=False)
+    try:
+        data, next_cursor = dashboard_cache.cached_value(
+            profile.pk, 'progress_data',
+            lambda: _progress_rows(request, profile.progress.all(), ('date', 'weight_kg')),
+            extra=request.GET.urlencode(),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(data, safe=False, headers=_next_link(request, next_cursor))
+
+
+@login_required
+def export_data(request, dataset):
+    """
+    Streams a download of progress / plans / payments (main/exports.py).
+    Members get their own rows; superusers get the whole gym, or one member
+    with ?member=<id>. ?format=csv|ndjson, ?gzip=1 compresses on the fly.
+    """
+    fmt = request.GET.get('format', 'csv')
+    compress = request.GET.get('gzip') in ('1', 'true', 'yes')
+    if request.user.is_superuser:
+        try:
+            member_id = int(request.GET['member']) if request.GET.get('member') else None
+        except ValueError:
+            return JsonResponse({'error': "'member' must be an integer"}, status=400)
+        suffix = f'-member-{member_id}' if member_id else '-all'
+    else:
+        member_id = request.user.memberprofile.pk
+        suffix = ''
+    try:
+        stream = stream_export(dataset, fmt, member_id=member_id, compress=compress)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if compress:
+        content_type = 'application/gzip'
+    elif fmt == 'csv':
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        content_type = 'application/x-ndjson; charset=utf-8'
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(dataset, fmt, compress, suffix)}"'
+    response['Cache-Control'] = 'private, no-store'
+    response['X-Accel-Buffering'] = 'no'  # stream through nginx instead of spooling the whole file
+    return response